@@ -0,0 +1,146 @@
+# archive.py
+# Archivo columnar de velas: un .npy por columna, particionado por
+# símbolo / marco temporal / mes. Se lee con np.load(mmap_mode='r'), así que
+# cargar un rango solo toca las páginas de las columnas y meses pedidos.
+#
+#   <root>/DOGE-USDT/1m/2024-01/ts.npy, open.npy, ..., volume.npy
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from db_manager import DBManager, OHLCV_DTYPE
+from timeutils import to_epoch_ms
+from config import DB_NAME, SYMBOL, TIMEFRAME
+
+ARCHIVE_ROOT = 'ohlcv_archive'
+ARCHIVE_COLUMNS = OHLCV_DTYPE.names  # ('ts', 'open', ..., 'volume')
+
+
+def _symbol_dir(symbol):
+    return symbol.replace('/', '-')
+
+
+def _month_start(ts_ms):
+    return pd.Timestamp(int(ts_ms), unit='ms').to_period('M').to_timestamp()
+
+
+def _months(first_ms, last_ms):
+    """Inicios de mes (pd.Timestamp) que cubren [first_ms, last_ms]."""
+    return pd.date_range(_month_start(first_ms), _month_start(last_ms), freq='MS')
+
+
+class OHLCVArchive:
+    """
+    Lectura y escritura del archivo bajo `root`. Cada partición (mes) es un
+    directorio con un .npy por columna de ARCHIVE_COLUMNS, ordenado por ts.
+    """
+
+    def __init__(self, root=ARCHIVE_ROOT):
+        self.root = root
+
+    def partition_dir(self, symbol, timeframe, month):
+        return os.path.join(self.root, _symbol_dir(symbol), timeframe, month.strftime('%Y-%m'))
+
+    def partitions(self, symbol=SYMBOL, timeframe=TIMEFRAME):
+        """Meses archivados (pd.Timestamp del día 1), en orden."""
+        base = os.path.join(self.root, _symbol_dir(symbol), timeframe)
+        if not os.path.isdir(base):
+            return []
+        months = []
+        for name in sorted(os.listdir(base)):
+            path = os.path.join(base, name)
+            if os.path.isfile(os.path.join(path, 'ts.npy')):
+                months.append(pd.Timestamp(name + '-01'))
+        return months
+
+    def write_partition(self, symbol, timeframe, month, arrays):
+        """
+        Escribe (o reemplaza) un mes. Se escribe en un directorio temporal y
+        se renombra al final, para que un lector nunca vea columnas a medias.
+        """
+        final = self.partition_dir(symbol, timeframe, month)
+        tmp = final + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in ARCHIVE_COLUMNS:
+            np.save(os.path.join(tmp, name + '.npy'),
+                    np.ascontiguousarray(arrays[name], dtype=OHLCV_DTYPE[name]))
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+
+    def export(self, db=None, symbol=SYMBOL, timeframe=TIMEFRAME, start=None, end=None):
+        """
+        Copia la tabla ohlcv al archivo mes a mes (solo un mes en memoria).
+        Los meses de [start, end) se reescriben enteros, así que volver a
+        exportar el mes en curso lo completa. Devuelve {mes: filas}.
+        """
+        db = db if db is not None else DBManager(DB_NAME)
+        ts = db.fetch_ohlcv_timestamps(symbol, timeframe, start=start, end=end)
+        if len(ts) == 0:
+            return {}
+
+        written = {}
+        for month in _months(ts[0], ts[-1]):
+            arrays = db.fetch_ohlcv_range(symbol, timeframe, start=month,
+                                          end=month + pd.offsets.MonthBegin(1))
+            if len(arrays['ts']):
+                self.write_partition(symbol, timeframe, month, arrays)
+                written[month.strftime('%Y-%m')] = len(arrays['ts'])
+        return written
+
+    def _open(self, symbol, timeframe, month, name):
+        path = os.path.join(self.partition_dir(symbol, timeframe, month), name + '.npy')
+        return np.load(path, mmap_mode='r')
+
+    def load_range(self, symbol=SYMBOL, timeframe=TIMEFRAME, start=None, end=None,
+                   columns=ARCHIVE_COLUMNS):
+        """
+        Velas de [start, end) como dict de arrays (mismo formato que
+        DBManager.fetch_ohlcv_range, limitado a `columns`; 'ts' siempre se
+        incluye). Si el rango cae en un solo mes los arrays son vistas de
+        solo lectura sobre los ficheros mapeados, sin copia.
+        """
+        columns = ['ts'] + [c for c in columns if c != 'ts']
+        start_ms = to_epoch_ms(start) if start is not None else None
+        end_ms = to_epoch_ms(end) if end is not None else None
+
+        pieces = {name: [] for name in columns}
+        for month in self.partitions(symbol, timeframe):
+            month_end = to_epoch_ms(month + pd.offsets.MonthBegin(1))
+            if start_ms is not None and month_end <= start_ms:
+                continue
+            if end_ms is not None and to_epoch_ms(month) >= end_ms:
+                break
+            ts = self._open(symbol, timeframe, month, 'ts')
+            lo = int(np.searchsorted(ts, start_ms, side='left')) if start_ms is not None else 0
+            hi = int(np.searchsorted(ts, end_ms, side='left')) if end_ms is not None else len(ts)
+            if hi <= lo:
+                continue
+            for name in columns:
+                column = ts if name == 'ts' else self._open(symbol, timeframe, month, name)
+                pieces[name].append(column[lo:hi])
+
+        result = {}
+        for name in columns:
+            parts = pieces[name]
+            if not parts:
+                result[name] = np.empty(0, dtype=OHLCV_DTYPE[name])
+            elif len(parts) == 1:
+                result[name] = parts[0]
+            else:
+                result[name] = np.concatenate(parts)
+        return result
+
+    def load_frame(self, symbol=SYMBOL, timeframe=TIMEFRAME, start=None, end=None):
+        """[start, end) como DataFrame, igual que DBManager.fetch_ohlcv_data."""
+        arrays = self.load_range(symbol, timeframe, start=start, end=end)
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(arrays['ts'], unit='ms'),
+            'open': arrays['open'],
+            'high': arrays['high'],
+            'low': arrays['low'],
+            'close': arrays['close'],
+            'volume': arrays['volume'],
+        })
@@ -0,0 +1,134 @@
+# backfill.py
+# Descarga masiva de histórico OHLCV hacia la tabla ohlcv.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from db_manager import DBManager
+from timeutils import timeframe_to_ms, to_epoch_ms
+
+
+def missing_ranges(timestamps, start, end, step):
+    """
+    Rangos [desde, hasta) de [start, end) sin velas almacenadas, dados los
+    timestamps ya guardados (ordenados) y la duración de vela `step` en ms.
+    El tramo final empieza en la última vela guardada para volver a
+    descargarla, porque pudo guardarse aún abierta.
+    """
+    if len(timestamps) == 0:
+        return [(start, end)] if start < end else []
+
+    ranges = []
+    if timestamps[0] > start:
+        ranges.append((start, int(timestamps[0])))
+
+    holes = np.flatnonzero(np.diff(timestamps) > step)
+    for i in holes:
+        ranges.append((int(timestamps[i]) + step, int(timestamps[i + 1])))
+
+    last = int(timestamps[-1])
+    if last + step < end:
+        ranges.append((last, end))
+    return ranges
+
+
+class _RateLimiter:
+    """
+    Espacia las peticiones de todos los hilos al menos `interval` segundos.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time)
+            self.next_time = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Backfiller:
+    """
+    Rellena la tabla ohlcv paginando exchange.fetch_ohlcv con `since`.
+
+    exchange: cualquier objeto con fetch_ohlcv(symbol, timeframe, since, limit)
+    al estilo ccxt (por defecto ccxt.binance). Si expone `rateLimit` (ms entre
+    peticiones, como ccxt) se respeta entre todos los hilos.
+    """
+
+    def __init__(self, exchange=None, db=None, max_concurrency=4, page_limit=1000):
+        if exchange is None:
+            import ccxt
+            exchange = ccxt.binance({'enableRateLimit': True})
+        self.exchange = exchange
+        self.db = db if db is not None else DBManager()
+        self.max_concurrency = max_concurrency
+        self.page_limit = page_limit
+        self.rate_limiter = _RateLimiter(getattr(exchange, 'rateLimit', 0) / 1000.0)
+        # una conexión sqlite no admite escrituras concurrentes desde varios hilos
+        self.db_lock = threading.Lock()
+
+    def plan(self, symbols, timeframes, start, end):
+        """
+        Tareas (symbol, timeframe, desde, hasta) que faltan por descargar:
+        el tramo previo a lo guardado, los huecos y el tramo final (reanudación).
+        """
+        start, end = to_epoch_ms(start), to_epoch_ms(end)
+        tasks = []
+        for symbol in symbols:
+            for timeframe in timeframes:
+                step = timeframe_to_ms(timeframe)
+                with self.db_lock:
+                    stored = self.db.fetch_ohlcv_timestamps(symbol, timeframe, start, end)
+                for range_start, range_end in missing_ranges(stored, start, end, step):
+                    tasks.append((symbol, timeframe, range_start, range_end))
+        return tasks
+
+    def fetch_range(self, symbol, timeframe, start, end):
+        """
+        Descarga [start, end) página a página y la guarda con upserts.
+        Devuelve el número de velas escritas.
+        """
+        step = timeframe_to_ms(timeframe)
+        since = start
+        written = 0
+        while since < end:
+            self.rate_limiter.wait()
+            batch = self.exchange.fetch_ohlcv(symbol, timeframe=timeframe,
+                                              since=since, limit=self.page_limit)
+            rows = [row for row in batch if since <= row[0] < end]
+            if not rows:
+                break
+
+            with self.db_lock:
+                self.db.insert_ohlcv(rows, symbol=symbol, timeframe=timeframe)
+            written += len(rows)
+            since = rows[-1][0] + step
+        return written
+
+    def backfill(self, symbols, timeframes, start, end=None):
+        """
+        Descarga todo lo que falta de [start, end) para cada símbolo y marco
+        temporal, con hasta max_concurrency peticiones en paralelo.
+        Devuelve {(symbol, timeframe): velas escritas}.
+        """
+        if end is None:
+            end = int(time.time() * 1000)
+        tasks = self.plan(symbols, timeframes, start, end)
+        print(f"[INFO] Backfill: {len(tasks)} tramos pendientes.")
+
+        summary = {(symbol, timeframe): 0 for symbol in symbols for timeframe in timeframes}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = {pool.submit(self.fetch_range, *task): task for task in tasks}
+            for future, (symbol, timeframe, range_start, range_end) in futures.items():
+                try:
+                    summary[(symbol, timeframe)] += future.result()
+                except Exception as e:
+                    print(f"[ERROR] Backfill {symbol} {timeframe} [{range_start}, {range_end}): {e}")
+        return summary
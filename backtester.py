@@ -1,170 +1,386 @@
 # backtester.py
 import pandas as pd
+import numpy as np
 import time
-from db_manager import DBManager
+from db_manager import DBManager, TradeWriter
 from strategy import ScalpingStrategy
+from position_engine import PositionEngine, exit_levels
+from execution import ExecutionModel, touches, fill_price
+from resampler import resample_frame, align_to_base
+from metrics import TradeLedger, equity_curve, performance
+from timeutils import timeframe_to_ms
 from config import (
-    SYMBOL, 
+    SYMBOL, TIMEFRAME,
     INITIAL_CAPITAL, FEE_RATE,
     STOP_LOSS_PCT, TAKE_PROFIT_PCT,
     MAX_HOLD_MINUTES
 )
 
+def find_exit(is_long, open_index, stop_price, take_price, high, low, horizon, n):
+    """
+    Salida de una posición abierta en la vela open_index, buscada con una
+    sola operación sobre las `horizon` velas siguientes: (close_index,
+    reason), con reason None si la vela de salida toca SL y TP a la vez (la
+    resuelve el modelo de ejecución). Para salidas contra el close se pasa
+    high = low = close. Devuelve None si la posición sigue abierta al final
+    de los datos (n velas).
+    """
+    end = open_index + 1 + horizon
+    stop_hit, take_hit = touches(is_long, high[open_index + 1:end],
+                                 low[open_index + 1:end], stop_price, take_price)
+    hit = stop_hit | take_hit
+    if hit.any():
+        first = int(np.argmax(hit))
+        if stop_hit[first] and take_hit[first]:
+            return open_index + 1 + first, None
+        return open_index + 1 + first, "StopLoss" if stop_hit[first] else "TakeProfit"
+    if end - 1 < n:
+        return open_index + horizon, "TimeOut"
+    return None
+
+
 class Backtester:
-    def __init__(self, strategy=None):
-        self.db = DBManager()
+    def __init__(self, strategy=None, db=None, persist=True,
+                 stop_loss_pct=None, take_profit_pct=None,
+                 max_hold_bars=MAX_HOLD_MINUTES, execution=None, archive=None):
+        """
+        persist: si es True los trades se escriben por lotes con un
+        TradeWriter (una transacción por ejecución); si es False quedan solo en
+        memoria (trades_summary), útil para barridos.
+        stop_loss_pct / take_profit_pct: con None (por defecto) cada entrada
+        usa los niveles de su señal (ATR o respuesta del modelo), igual que
+        LiveTrader; un valor fija el mismo nivel para todas las entradas.
+        execution: ExecutionModel con el que se evalúan SL/TP (por defecto
+        contra el close).
+        archive: OHLCVArchive opcional; si se indica, las velas se leen de
+        él (mapeadas en memoria) en lugar de la tabla ohlcv.
+        """
+        self._db = db
+        self.archive = archive
+        self.persist = persist
         self.strategy = strategy if strategy else ScalpingStrategy()
         self.initial_capital = INITIAL_CAPITAL
         self.fee_rate = FEE_RATE
-        self.stop_loss_pct = STOP_LOSS_PCT
-        self.take_profit_pct = TAKE_PROFIT_PCT
-        self.max_hold_bars = MAX_HOLD_MINUTES  # si timeframe=1m, equivalen a 30 velas
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.max_hold_bars = max_hold_bars  # si timeframe=1m, equivalen a 30 velas
+        self.execution = execution if execution is not None else ExecutionModel()
+        self._higher = None
+        # de la última ejecución, para performance()
+        self.ledger = TradeLedger()
+        self.equity = np.empty(0)
+        self.in_market = np.empty(0, dtype=bool)
+
+    @property
+    def db(self):
+        # se abre bajo demanda: un backtest sobre datos en memoria no toca SQLite
+        if self._db is None:
+            self._db = DBManager()
+        return self._db
+
+    @db.setter
+    def db(self, value):
+        self._db = value
+
+    def run_backtest(self, engine='loop', df=None, indicator_cache=None,
+                     start=None, end=None, higher_timeframes=None):
+        """
+        Ejecuta el backtest sobre la tabla ohlcv o el archivo columnar (solo
+        [start, end) si se indican), o sobre `df` si se pasa.
+        engine: 'loop' recorre vela a vela (motor de referencia) y
+        'vectorized' calcula la columna de señales una sola vez y resuelve
+        las salidas con arrays de NumPy. Ambos devuelven (capital, trades_summary).
+        indicator_cache: dict opcional que se pasa a compute_indicators.
+        higher_timeframes: marcos mayores (p. ej. ('5m', '15m')) construidos a
+        partir de df; cada vela recibe la señal de
+        generate_signal_from_snapshots con la última vela cerrada de cada
+        marco. Por defecto se usan ('5m', '15m') si la estrategia consulta a
+        OpenAI, que decide con los tres marcos.
+        """
+        if higher_timeframes is None and getattr(self.strategy, 'use_openai', False):
+            higher_timeframes = ('5m', '15m')
 
-    def run_backtest(self):
-        df = self.db.fetch_ohlcv_data()  # leemos toda la tabla ohlcv
+        if df is None:
+            df = self.load_data(start=start, end=end)
+        self.ledger = TradeLedger()
+        self.equity = np.empty(0)
+        self.in_market = np.empty(0, dtype=bool)
         if df.empty:
             print("No hay datos en ohlcv.")
             return self.initial_capital, []
 
-        df = self.strategy.compute_indicators(df)
+        df = self.strategy.compute_indicators(df, cache=indicator_cache)
+        self._higher = self.higher_frames(df, higher_timeframes) if higher_timeframes else None
 
-        capital = self.initial_capital
-        position_open = False
-        side = None
-        open_price = 0
-        open_index = 0
-        quantity = 0
-        open_time_str = None
+        if engine not in ('loop', 'vectorized'):
+            raise ValueError(f"Motor de backtest inválido: {engine}")
 
-        trades_summary = []
+        # todos los trades de la ejecución se guardan en una sola transacción
+        with self._trade_writer() as writer:
+            if engine == 'vectorized':
+                capital, trades_summary = self._run_vectorized(df, writer)
+            else:
+                capital, trades_summary = self._run_loop(df, writer)
+        self.equity, self.in_market = equity_curve(df['close'].to_numpy(dtype=float),
+                                                   self.ledger, self.initial_capital)
+        return capital, trades_summary
+
+    def performance(self, bar_ms=None):
+        """
+        Métricas de la última ejecución (ver metrics.performance) sobre su
+        curva de capital marcada a mercado (self.equity).
+        """
+        return performance(self.equity, self.in_market, self.ledger,
+                           bar_ms or timeframe_to_ms(TIMEFRAME), self.initial_capital)
 
-        for i in range(len(df)):
-            if i < 1:
-                continue
+    def load_data(self, start=None, end=None):
+        """Velas de [start, end) del archivo columnar o, si no hay, de ohlcv."""
+        if self.archive is not None:
+            return self.archive.load_frame(SYMBOL, TIMEFRAME, start=start, end=end)
+        return self.db.fetch_ohlcv_data(start=start, end=end)
 
+    def _trade_writer(self):
+        if self.persist:
+            return self.db.trade_writer()
+        return TradeWriter(persist=False)
+
+    def _position_engine(self):
+        return PositionEngine(
+            fee_rate=self.fee_rate,
+            max_hold_bars=self.max_hold_bars,
+            capital=self.initial_capital,
+            execution=self.execution
+        )
+
+    def _levels(self, sl_pct, tp_pct):
+        """
+        (sl_pct, tp_pct) de una entrada: los fijos del backtester si se
+        indicaron; si no, los de la señal, y los de config si la estrategia
+        no los da (None o NaN).
+        """
+        if self.stop_loss_pct is not None:
+            sl_pct = self.stop_loss_pct
+        if self.take_profit_pct is not None:
+            tp_pct = self.take_profit_pct
+        sl_pct = STOP_LOSS_PCT if sl_pct is None or np.isnan(sl_pct) else float(sl_pct)
+        tp_pct = TAKE_PROFIT_PCT if tp_pct is None or np.isnan(tp_pct) else float(tp_pct)
+        return sl_pct, tp_pct
+
+    @staticmethod
+    def _record_trade(trade, writer, trades_summary):
+        writer.add(symbol=SYMBOL, strategy='Scalping_Breakout', **trade)
+        trades_summary.append({
+            'open_time': trade['open_time'],
+            'close_time': trade['close_time'],
+            'side': trade['side'],
+            'pnl': trade['pnl'],
+            'reason': trade['reason']
+        })
+
+    def _run_loop(self, df, writer):
+        """
+        Motor de referencia: recorre el DataFrame vela a vela alimentando el
+        PositionEngine.
+        """
+        engine = self._position_engine()
+        trades_summary = []
+
+        for i in range(1, len(df)):
             row = df.iloc[i]
             current_time = row['timestamp']
+            current_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
             current_price = row['close']
 
-            signal = self.strategy.generate_signal(df.iloc[:i+1])
+            signal, sl_pct, tp_pct = self._bar_signal(df, i)
 
-            if not position_open:
+            if not engine.is_open():
                 # Apertura
-                if signal == 1:
-                    side = 'long'
-                    open_price = current_price
-                    open_index = i
-                    quantity = (capital * 0.1) / current_price
-                    position_open = True
-                    open_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
-
-                elif signal == -1:
-                    side = 'short'
-                    open_price = current_price
-                    open_index = i
-                    quantity = (capital * 0.1) / current_price
-                    position_open = True
-                    open_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
+                if signal == 1 or signal == -1:
+                    side = 'long' if signal == 1 else 'short'
+                    quantity = (engine.capital * 0.1) / current_price
+                    sl_pct, tp_pct = self._levels(sl_pct, tp_pct)
+                    engine.open(side, current_price, quantity, time=current_time_str, index=i,
+                                stop_loss_pct=sl_pct, take_profit_pct=tp_pct)
+            else:
+                # SL, TP o max_hold_bars
+                open_index = engine.position.open_index
+                trade = engine.on_bar_ohlc(row['open'], row['high'], row['low'], current_price,
+                                           i, time=current_time_str, bar_time=current_time)
+                if trade is not None:
+                    self._record_trade(trade, writer, trades_summary)
+                    self.ledger.add(open_index, i, trade)
+
+        return engine.capital, trades_summary
 
+    def higher_frames(self, df, timeframes, base_timeframe=TIMEFRAME):
+        """
+        {timeframe: (indicadores, índices)}: velas de cada marco construidas
+        a partir de df, con sus indicadores, y para cada vela de df el índice
+        de la última vela de ese marco ya cerrada (-1 si aún no hay).
+        """
+        frames = {}
+        for tf in timeframes:
+            higher = self.strategy.compute_indicators(resample_frame(df, tf, base_timeframe))
+            frames[tf] = (higher, align_to_base(df, higher, tf, base_timeframe))
+        return frames
+
+    def _bar_signal(self, df, i):
+        """
+        Señal de la vela i usando solo los datos disponibles hasta ella:
+        (signal, sl_pct, tp_pct), con sl/tp None si la estrategia solo
+        devuelve la señal.
+        """
+        if self._higher is not None:
+            snapshots = [df.iloc[i].to_dict()]
+            for higher, index in self._higher.values():
+                if index[i] < 0:
+                    return 0, None, None
+                snapshots.append(higher.iloc[index[i]].to_dict())
+            signal = self.strategy.generate_signal_from_snapshots(*snapshots)
+        else:
+            signal = self.strategy.generate_signal(df.iloc[:i+1])
+        if isinstance(signal, tuple):  # (signal, sl_pct, tp_pct)
+            return signal
+        return signal, None, None
+
+    def _signal_column(self, df):
+        """
+        Columnas (signals, sl_pct, tp_pct) para todo el DataFrame. Si la
+        estrategia expone generate_signals(df) se calculan en una sola
+        llamada; si no, se evalúa generate_signal vela a vela como en el
+        motor de referencia (también cuando la señal combina marcos
+        mayores). sl_pct / tp_pct son None si la estrategia no los da.
+        """
+        if self._higher is None and hasattr(self.strategy, 'generate_signals'):
+            signals = self.strategy.generate_signals(df)
+            if isinstance(signals, tuple):  # (signals, sl_pct, tp_pct)
+                return np.asarray(signals[0]), signals[1], signals[2]
+            return np.asarray(signals), None, None
+
+        signals = np.zeros(len(df), dtype=np.int8)
+        sl_pct = np.full(len(df), np.nan)
+        tp_pct = np.full(len(df), np.nan)
+        given = False
+        for i in range(1, len(df)):
+            signal, sl, tp = self._bar_signal(df, i)
+            signals[i] = signal
+            if sl is not None:
+                sl_pct[i], tp_pct[i] = sl, tp
+                given = True
+        if not given:
+            return signals, None, None
+        return signals, sl_pct, tp_pct
+
+    def _run_vectorized(self, df, writer):
+        """
+        Motor vectorizado: mismas reglas que el loop (entrada en la vela de la
+        señal, salida por StopLoss/TakeProfit/TimeOut según el modelo de
+        ejecución), pero cada salida se busca con una sola operación sobre la
+        ventana de max_hold_bars velas siguientes a la entrada.
+
+        La vela de salida no depende del tamaño de la posición, así que
+        primero se localizan todas las salidas, después se resuelven juntas
+        las velas ambiguas (tocan SL y TP) y por último se liquidan los
+        trades en orden con el PositionEngine.
+        """
+        close = df['close'].to_numpy(dtype=float)
+        timestamps = df['timestamp']
+        signals, signal_sl, signal_tp = self._signal_column(df)
+        intrabar = self.execution.intrabar
+        if intrabar:
+            open_ = df['open'].to_numpy(dtype=float)
+            high = df['high'].to_numpy(dtype=float)
+            low = df['low'].to_numpy(dtype=float)
+        else:
+            high = low = close
+
+        n = len(close)
+        horizon = max(self.max_hold_bars, 1)
+        # el loop ignora la vela 0 y solo abre con 1 / -1
+        entries = np.flatnonzero((signals == 1) | (signals == -1))
+        entries = entries[entries >= 1]
+
+        engine = self._position_engine()
+        trades_summary = []
+
+        # (open_index, close_index, is_long, stop, take, sl_pct, tp_pct, reason);
+        # reason None = ambigua
+        exits = []
+        next_bar = 1
+        while True:
+            k = np.searchsorted(entries, next_bar)
+            if k >= len(entries):
+                break
+
+            open_index = entries[k]
+            is_long = signals[open_index] == 1
+            sl_pct, tp_pct = self._levels(
+                None if signal_sl is None else signal_sl[open_index],
+                None if signal_tp is None else signal_tp[open_index])
+            stop_price, take_price = exit_levels(is_long, close[open_index], sl_pct, tp_pct)
+
+            found = find_exit(is_long, open_index, stop_price, take_price,
+                              high, low, horizon, n)
+            if found is None:
+                # la posición sigue abierta al final de los datos
+                break
+            close_index, reason = found
+
+            exits.append((open_index, close_index, is_long, stop_price, take_price,
+                          sl_pct, tp_pct, reason))
+            next_bar = close_index + 1
+
+        if not exits:
+            return engine.capital, trades_summary
+
+        open_idx, close_idx, longs, stops, takes, sl_pcts, tp_pcts, reasons = zip(*exits)
+        open_idx = np.array(open_idx)
+        close_idx = np.array(close_idx)
+        longs = np.array(longs, dtype=bool)
+        stops = np.array(stops)
+        takes = np.array(takes)
+        timeout = np.array([r == "TimeOut" for r in reasons])
+        stop_first = np.array([r == "StopLoss" for r in reasons])
+        ambiguous = np.array([r is None for r in reasons])
+        if ambiguous.any() and not intrabar:
+            # contra el close solo hay empate si stop == take; como check_exit
+            # en el loop, gana el StopLoss
+            stop_first[ambiguous] = True
+        elif ambiguous.any():
+            idx = close_idx[ambiguous]
+            bar_ms = timestamps.to_numpy()[idx].astype('datetime64[ms]').astype(np.int64)
+            stop_first[ambiguous] = self.execution.resolve(
+                longs[ambiguous], open_[idx], stops[ambiguous], takes[ambiguous], bar_ms)
+
+        exit_price = close[close_idx]
+        if intrabar:
+            fills = np.where(longs,
+                             fill_price(True, stop_first, open_[close_idx], stops, takes),
+                             fill_price(False, stop_first, open_[close_idx], stops, takes))
+            exit_price = np.where(timeout, exit_price, fills)
+
+        for j in range(len(exits)):
+            open_index = open_idx[j]
+            open_price = close[open_index]
+            side = 'long' if longs[j] else 'short'
+            if timeout[j]:
+                reason = "TimeOut"
             else:
-                # Checkear SL, TP, o max_hold_bars
-                bars_held = i - open_index
-                stop_price = open_price * (1 - self.stop_loss_pct)
-                take_price = open_price * (1 + self.take_profit_pct)
-                close_position = False
-                reason = None
-
-                if side == 'long':
-                    # SL
-                    if current_price <= stop_price:
-                        reason = "StopLoss"
-                        close_position = True
-                    # TP
-                    elif current_price >= take_price:
-                        reason = "TakeProfit"
-                        close_position = True
-                    # max tiempo
-                    elif bars_held >= self.max_hold_bars:
-                        reason = "TimeOut"
-                        close_position = True
-
-                    if close_position:
-                        close_price = current_price
-                        pnl_gross = (close_price - open_price) * quantity
-                        fee = abs(pnl_gross) * self.fee_rate
-                        pnl_net = pnl_gross - fee
-                        capital += pnl_net
-
-                        close_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
-
-                        self.db.insert_trade(
-                            symbol=SYMBOL,
-                            strategy='Scalping_Breakout',
-                            side='long',
-                            quantity=quantity,
-                            open_time=open_time_str,
-                            open_price=open_price,
-                            close_time=close_time_str,
-                            close_price=close_price,
-                            fees=fee,
-                            pnl=pnl_net,
-                            reason=reason
-                        )
-
-                        trades_summary.append({
-                            'open_time': open_time_str,
-                            'close_time': close_time_str,
-                            'side': side,
-                            'pnl': pnl_net,
-                            'reason': reason
-                        })
-
-                        position_open = False
-
-                elif side == 'short':
-                    inv_stop = open_price * (1 + self.stop_loss_pct)
-                    inv_take = open_price * (1 - self.take_profit_pct)
-                    if current_price >= inv_stop:
-                        reason = "StopLoss"
-                        close_position = True
-                    elif current_price <= inv_take:
-                        reason = "TakeProfit"
-                        close_position = True
-                    elif bars_held >= self.max_hold_bars:
-                        reason = "TimeOut"
-                        close_position = True
-
-                    if close_position:
-                        close_price = current_price
-                        pnl_gross = (open_price - close_price) * quantity
-                        fee = abs(pnl_gross) * self.fee_rate
-                        pnl_net = pnl_gross - fee
-                        capital += pnl_net
-
-                        close_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
-
-                        self.db.insert_trade(
-                            symbol=SYMBOL,
-                            strategy='Scalping_Breakout',
-                            side='short',
-                            quantity=quantity,
-                            open_time=open_time_str,
-                            open_price=open_price,
-                            close_time=close_time_str,
-                            close_price=close_price,
-                            fees=fee,
-                            pnl=pnl_net,
-                            reason=reason
-                        )
-
-                        trades_summary.append({
-                            'open_time': open_time_str,
-                            'close_time': close_time_str,
-                            'side': side,
-                            'pnl': pnl_net,
-                            'reason': reason
-                        })
-
-                        position_open = False
+                reason = "StopLoss" if stop_first[j] else "TakeProfit"
+            quantity = (engine.capital * 0.1) / open_price
+            engine.open(
+                side, open_price, quantity,
+                time=timestamps.iloc[open_index].strftime('%Y-%m-%d %H:%M:%S'),
+                index=open_index,
+                stop_loss_pct=sl_pcts[j],
+                take_profit_pct=tp_pcts[j]
+            )
+            trade = engine.close(
+                exit_price[j],
+                timestamps.iloc[close_idx[j]].strftime('%Y-%m-%d %H:%M:%S'),
+                reason
+            )
+            self._record_trade(trade, writer, trades_summary)
+            self.ledger.add(open_index, close_idx[j], trade)
 
-        return capital, trades_summary
+        return engine.capital, trades_summary
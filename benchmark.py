@@ -0,0 +1,491 @@
+# benchmark.py
+# Benchmarks offline de los caminos críticos sobre datos OHLCV sintéticos.
+# Uso: python benchmark.py atr --rows 1000000
+#      python benchmark.py trades --rows 20000
+#      python benchmark.py exits --rows 1000000
+#      python benchmark.py imports
+#      python benchmark.py suite --baseline bench_baseline.json [--save-baseline]
+#
+# La referencia de la suite depende de la máquina, así que no se versiona:
+# si el fichero de --baseline no existe, la primera ejecución lo crea.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+from strategy import ScalpingStrategy
+from db_manager import DBManager
+from position_engine import PositionEngine, check_exit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def synthetic_ohlcv(rows, seed=0, start='2024-01-01'):
+    """
+    Velas de 1m sintéticas (paseo aleatorio log-normal) con las columnas de
+    fetch_ohlcv_data, reproducibles con `seed`. Los tests usan las mismas.
+    """
+    rng = np.random.default_rng(seed)
+    close = 0.1 * np.exp(np.cumsum(rng.normal(0, 0.002, rows)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.002, rows))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.002, rows))
+    volume = rng.uniform(100, 1000, rows)
+    timestamp = pd.date_range(start, periods=rows, freq='1min')
+    return pd.DataFrame({'timestamp': timestamp, 'open': open_, 'high': high,
+                         'low': low, 'close': close, 'volume': volume})
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_atr(rows):
+    df = synthetic_ohlcv(rows)
+    strat = ScalpingStrategy(use_openai=False)
+
+    t_sma, _ = timed(strat.compute_atr, df)
+    t_rma, _ = timed(strat.compute_atr, df, method='rma')
+    t_prev, _ = timed(strat.compute_atr, df, use_prev_close=True)
+
+    print(f"=== ATR ({rows} filas) ===")
+    print(f"arrays SMA:       {t_sma:.4f}s")
+    print(f"arrays RMA:       {t_rma:.4f}s")
+    print(f"SMA prev close:   {t_prev:.4f}s")
+
+
+def _trade_rows(rows):
+    return [('DOGE/USDT', 'Scalping_Breakout', 'long', 100.0,
+             '2024-01-01 00:00:00', 0.1, '2024-01-01 00:05:00', 0.1003,
+             0.0001, 0.03, 'TakeProfit', None)] * rows
+
+
+def bench_trades(rows):
+    """
+    trades/s con insert_trade (un commit por trade) frente a TradeWriter
+    (executemany y un commit por ejecución), sobre SQLite en disco.
+    """
+    trades = _trade_rows(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(os.path.join(tmp, 'bench_single.db'))
+        start = time.perf_counter()
+        for t in trades:
+            db.insert_trade(*t)
+        t_single = time.perf_counter() - start
+        db.close()
+
+        db = DBManager(os.path.join(tmp, 'bench_batch.db'))
+        start = time.perf_counter()
+        with db.trade_writer() as writer:
+            for t in trades:
+                writer.add(*t)
+        t_batch = time.perf_counter() - start
+        count = db.conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+        db.close()
+
+    assert count == rows
+    print(f"=== Trades ({rows} inserciones) ===")
+    print(f"insert_trade: {rows / t_single:,.0f} trades/s ({t_single:.3f}s)")
+    print(f"TradeWriter:  {rows / t_batch:,.0f} trades/s ({t_batch:.3f}s)")
+
+
+def bench_exits(rows):
+    """
+    Coste por vela de la comprobación de salida: check_exit directo y
+    PositionEngine.on_bar con una posición abierta (los cierres reabren).
+    """
+    close = synthetic_ohlcv(rows)['close'].tolist()
+
+    start = time.perf_counter()
+    for price in close:
+        check_exit(True, price, 0.09, 0.11, 0, 30)
+    t_check = time.perf_counter() - start
+
+    engine = PositionEngine()
+    engine.open('long', close[0], 1.0)
+    closed = 0
+    start = time.perf_counter()
+    for i, price in enumerate(close):
+        if engine.on_bar(price, i) is not None:
+            closed += 1
+            engine.open('long', price, 1.0, index=i)
+    t_engine = time.perf_counter() - start
+
+    print(f"=== Salidas ({rows} velas) ===")
+    print(f"check_exit: {t_check / rows * 1e9:.0f} ns/vela ({t_check:.3f}s)")
+    print(f"on_bar:     {t_engine / rows * 1e9:.0f} ns/vela ({t_engine:.3f}s, {closed} cierres)")
+
+
+# Módulos del camino de backtest / workers del barrido y paquetes que no
+# deben cargar (solo los necesita el modo live)
+IMPORT_TARGETS = ('backtester', 'sweep', 'main')
+LIVE_ONLY_PACKAGES = ('openai', 'ccxt', 'requests')
+
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ','.join(p for p in {packages!r} if p in sys.modules))
+"""
+
+
+def _child_env():
+    """
+    Entorno de los procesos hijos, con este directorio en PYTHONPATH para
+    que importen los módulos del proyecto aunque se lance desde otro.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (BENCH_DIR, env.get('PYTHONPATH')) if p)
+    return env
+
+
+def _import_time(module, repeats):
+    """(mejor tiempo de import en s, paquetes live cargados) en procesos nuevos."""
+    best = None
+    loaded = ''
+    code = IMPORT_PROBE.format(module=module, packages=LIVE_ONLY_PACKAGES)
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                             text=True, check=True, env=_child_env()).stdout.split()
+        elapsed = float(out[0])
+        loaded = out[1] if len(out) > 1 else ''
+        best = elapsed if best is None else min(best, elapsed)
+    return best, loaded
+
+
+def bench_imports(rows):
+    """
+    Tiempo de import (en un proceso nuevo, como un worker del barrido) de los
+    módulos del camino de backtest. Falla si alguno arrastra openai, ccxt o
+    requests. `rows` no se usa.
+    """
+    print("=== Imports (mejor de 5, proceso nuevo) ===")
+    failures = []
+    for module in IMPORT_TARGETS:
+        elapsed, loaded = _import_time(module, repeats=5)
+        print(f"{module:<12} {elapsed * 1000:8.1f} ms  {('carga ' + loaded) if loaded else ''}")
+        if loaded:
+            failures.append(f"{module}: {loaded}")
+    assert not failures, f"Imports del modo live en el camino de backtest: {failures}"
+
+
+class StubLLMClient:
+    """
+    Cliente con la interfaz de OpenAI (chat.completions.create) que no sale
+    a la red: alterna LONG, NO_OP, SHORT y NO_OP para recorrer las ramas de
+    apertura y cierre del loop en vivo.
+    """
+    ACTIONS = ('LONG', 'NO_OP', 'SHORT', 'NO_OP')
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model=None, messages=None, temperature=None):
+        action = self.ACTIONS[self.calls % len(self.ACTIONS)]
+        self.calls += 1
+        content = (f"Dirección inmediata: {action}\n"
+                   "STOP LOSS (%): 0.2%\nTAKE PROFIT (%): 0.3%")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+# Etapas de la suite: cada una prepara sus datos (sin medir) y devuelve la
+# función que se mide. El segundo valor es el máximo de filas con el que se
+# ejecuta (None = todos los tamaños), para las etapas de coste cuadrático o
+# limitadas por disco.
+def _stage_indicators(rows, tmp):
+    df = synthetic_ohlcv(rows)
+    strat = ScalpingStrategy(use_openai=False)
+    return lambda: strat.compute_indicators(df)
+
+
+def _stage_signals(rows, tmp):
+    df = ScalpingStrategy(use_openai=False).compute_indicators(synthetic_ohlcv(rows))
+    strat = ScalpingStrategy(use_openai=False)
+    return lambda: strat.generate_signals(df)
+
+
+def _backtest(rows, engine):
+    from backtester import Backtester
+    df = synthetic_ohlcv(rows)
+    def run():
+        backtester = Backtester(strategy=ScalpingStrategy(use_openai=False), persist=False)
+        backtester.run_backtest(engine=engine, df=df)
+        backtester.performance()
+    return run
+
+
+def _stage_backtest_vectorized(rows, tmp):
+    return _backtest(rows, 'vectorized')
+
+
+def _stage_backtest_loop(rows, tmp):
+    return _backtest(rows, 'loop')
+
+
+def _stage_insert_trade(rows, tmp):
+    db = DBManager(os.path.join(tmp, 'bench_trades.db'))
+    trades = _trade_rows(rows)
+    def run():
+        for t in trades:
+            db.insert_trade(*t)
+    return run
+
+
+def _stage_trade_writer(rows, tmp):
+    db = DBManager(os.path.join(tmp, 'bench_writer.db'))
+    trades = _trade_rows(rows)
+    def run():
+        with db.trade_writer() as writer:
+            for t in trades:
+                writer.add(*t)
+    return run
+
+
+def _ohlcv_db(rows, tmp):
+    db = DBManager(os.path.join(tmp, 'bench_ohlcv.db'))
+    db.insert_ohlcv(synthetic_ohlcv(rows).itertuples(index=False, name=None))
+    return db
+
+
+def _stage_fetch_ohlcv(rows, tmp):
+    db = _ohlcv_db(rows, tmp)
+    return lambda: db.fetch_ohlcv_data()
+
+
+def _stage_archive_load(rows, tmp):
+    from archive import OHLCVArchive
+    archive = OHLCVArchive(os.path.join(tmp, 'archive'))
+    archive.export(_ohlcv_db(rows, tmp))
+    return lambda: archive.load_frame()
+
+
+def _stage_live_tick(rows, tmp):
+    """`rows` velas de 1m por el loop en vivo (replay), con el modelo simulado."""
+    import replay
+    seed_bars = 1500
+    db = DBManager(os.path.join(tmp, 'bench_live.db'))
+    db.insert_ohlcv(synthetic_ohlcv(rows + seed_bars).itertuples(index=False, name=None))
+    def run():
+        strat = ScalpingStrategy(llm_client=StubLLMClient())
+        replay.replay(strat=strat, db=db, seed_bars=seed_bars)
+    return run
+
+
+SUITE_STAGES = {
+    'indicators': (_stage_indicators, None),
+    'signals': (_stage_signals, None),
+    'backtest_vectorized': (_stage_backtest_vectorized, None),
+    'backtest_loop': (_stage_backtest_loop, 10_000),
+    'insert_trade': (_stage_insert_trade, 10_000),
+    'trade_writer': (_stage_trade_writer, None),
+    'fetch_ohlcv': (_stage_fetch_ohlcv, None),
+    'archive_load': (_stage_archive_load, None),
+    'live_tick': (_stage_live_tick, 10_000),
+}
+SUITE_SIZES = (10_000, 100_000, 1_000_000)
+# las etapas rápidas se repiten al menos REPEAT_MIN_S (el mejor tiempo de
+# pocas ejecuciones de milisegundos es muy ruidoso) y nunca más de
+# REPEAT_BUDGET_S
+REPEAT_MIN_S = 1.0
+REPEAT_BUDGET_S = 10.0
+
+
+def _peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+@contextlib.contextmanager
+def _offline():
+    """Durante la etapa cualquier intento de conexión de red falla."""
+    import socket
+    def refuse(*args, **kwargs):
+        raise RuntimeError("La suite de benchmarks no debe usar la red.")
+    saved = (socket.socket.connect, socket.socket.connect_ex, socket.create_connection)
+    socket.socket.connect = socket.socket.connect_ex = socket.create_connection = refuse
+    try:
+        yield
+    finally:
+        socket.socket.connect, socket.socket.connect_ex, socket.create_connection = saved
+
+
+def run_stage(name, rows, repeats=3):
+    """
+    Ejecuta una etapa en este proceso: mejor tiempo de al menos `repeats`
+    ejecuciones (ver REPEAT_MIN_S y REPEAT_BUDGET_S), pico de memoria asignada en
+    una ejecución aparte con tracemalloc (que la ralentiza) y pico de RSS
+    del proceso, que incluye la preparación de los datos. Sin red: el
+    modelo y el exchange se sustituyen por StubLLMClient y el replay.
+    """
+    setup, _ = SUITE_STAGES[name]
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()), _offline():
+        fn = setup(rows, tmp)
+        times = []
+        while len(times) < max(repeats, 1) or sum(times) < REPEAT_MIN_S:
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+            if sum(times) > REPEAT_BUDGET_S:
+                break
+        tracemalloc.start()
+        fn()
+        _, alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        'stage': name,
+        'rows': rows,
+        'wall_s': min(times),
+        'runs': len(times),
+        'alloc_peak_mb': alloc_peak / (1024 * 1024),
+        'rss_peak_mb': _peak_rss_mb(),
+        'rows_per_s': rows / min(times) if min(times) > 0 else None,
+    }
+
+
+def _environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'system': platform.system(),
+    }
+
+
+def _compare(result, base, tolerance, floors):
+    """Métricas de result que empeoran más de `tolerance` respecto a base."""
+    worse = []
+    for key, floor in floors.items():
+        old, new = base.get(key), result.get(key)
+        if old is None or new is None:
+            continue
+        # el suelo absoluto evita falsas alarmas en etapas de milisegundos
+        if new > old * (1 + tolerance) and new - old > floor:
+            worse.append(f"{key} {old:.3f} -> {new:.3f} (+{(new / old - 1) * 100:.0f}%)")
+    return worse
+
+
+def bench_suite(args):
+    """
+    Todas las etapas de SUITE_STAGES con cada tamaño de --sizes, cada una en
+    un proceso nuevo (el pico de RSS es por etapa). Con --baseline compara
+    con una ejecución guardada y termina con código 1 si hay regresiones;
+    --save-baseline (o un --baseline que aún no existe) guarda esta
+    ejecución como referencia.
+    """
+    stages = args.stages.split(',') if args.stages else list(SUITE_STAGES)
+    unknown = set(stages) - set(SUITE_STAGES)
+    if unknown:
+        raise SystemExit(f"Etapas desconocidas: {sorted(unknown)}")
+    sizes = [int(x) for x in args.sizes.split(',')] if args.sizes else list(SUITE_SIZES)
+
+    baseline = {}
+    save = args.save_baseline
+    if args.baseline and not os.path.exists(args.baseline):
+        print(f"[INFO] No existe {args.baseline}: esta ejecución se guardará como referencia.")
+        save = True
+    if args.baseline and not save:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = {(r['stage'], r['rows']): r for r in saved['results']}
+        if saved.get('environment') != _environment():
+            print(f"[INFO] La referencia se tomó en otro entorno: {saved.get('environment')}")
+
+    floors = {'wall_s': 0.005, 'alloc_peak_mb': 1.0, 'rss_peak_mb': 5.0}
+    results, regressions = [], []
+    print(f"{'etapa':<20} {'filas':>9} {'tiempo ms':>11} {'asign. MB':>10} {'RSS MB':>8}  vs referencia")
+    for name in stages:
+        limit = SUITE_STAGES[name][1]
+        for rows in sizes:
+            if limit is not None and rows > limit:
+                continue
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'suite', '--stage', name,
+                 '--rows', str(rows), '--repeats', str(args.repeats)],
+                capture_output=True, text=True, env=_child_env())
+            if proc.returncode != 0:
+                error = (proc.stderr.strip().splitlines() or ['?'])[-1]
+                print(f"{name:<20} {rows:>9}  [ERROR] {error}")
+                regressions.append(f"{name}@{rows}: {error}")
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+
+            base = baseline.get((name, rows))
+            note = '' if base else '(sin referencia)'
+            if base:
+                worse = _compare(result, base, args.tolerance, floors)
+                note = f"{(result['wall_s'] / base['wall_s'] - 1) * 100:+.0f}% tiempo"
+                if worse:
+                    note += '  REGRESIÓN: ' + '; '.join(worse)
+                    regressions.append(f"{name}@{rows}: " + '; '.join(worse))
+            print(f"{name:<20} {rows:>9} {result['wall_s'] * 1000:>11.1f} "
+                  f"{result['alloc_peak_mb']:>10.1f} {result['rss_peak_mb']:>8.0f}  {note}")
+
+    if save and args.baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'environment': _environment(), 'results': results}, f, indent=1)
+        print(f"[INFO] Referencia guardada en {args.baseline}")
+    if regressions:
+        print("[ERROR] Regresiones:")
+        for line in regressions:
+            print("  " + line)
+        return 1
+    return 0
+
+
+BENCHMARKS = {
+    'atr': bench_atr,
+    'trades': bench_trades,
+    'exits': bench_exits,
+    'imports': bench_imports,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('bench', choices=sorted(BENCHMARKS) + ['suite'])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--sizes', default=None,
+                        help="suite: filas separadas por coma (por defecto 10000,100000,1000000)")
+    parser.add_argument('--stages', default=None,
+                        help=f"suite: etapas separadas por coma ({','.join(SUITE_STAGES)})")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', default='bench_baseline.json',
+                        help="suite: fichero de referencia con el que comparar "
+                             "(si no existe, se crea con esta ejecución)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="suite: guarda esta ejecución como referencia")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="suite: empeoramiento relativo admitido antes de marcar regresión")
+    parser.add_argument('--stage', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bench != 'suite':
+        BENCHMARKS[args.bench](args.rows)
+    elif args.stage:
+        # proceso hijo de la suite: una etapa y su resultado en JSON
+        print(json.dumps(run_stage(args.stage, args.rows, args.repeats)))
+    else:
+        sys.exit(bench_suite(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,178 @@
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlencode
 import hmac
 import hashlib
+import threading
+
+from latency import LatencyTracker
+
+# Código de Binance para "timestamp fuera de recvWindow"
+TIMESTAMP_OUTSIDE_RECV_WINDOW = -1021
+
+
+class ClockSync:
+    """
+    Mide el desfase entre el reloj local y el del exchange, y el RTT, a
+    partir de `fetch_server_time()` (ms). Se toma la muestra de menor RTT y
+    se asume que el servidor marcó la hora a mitad del viaje.
+
+    recvWindow se ajusta al RTT medido: rtt_multiplier * RTT, acotado entre
+    min_recv_window y max_recv_window (60000 es el máximo de Binance).
+    """
+
+    def __init__(self, fetch_server_time, interval=300.0, samples=3,
+                 min_recv_window=1000, max_recv_window=60000, rtt_multiplier=10,
+                 clock=time.time):
+        self.fetch_server_time = fetch_server_time
+        self.interval = interval
+        self.samples = samples
+        self.min_recv_window = min_recv_window
+        self.max_recv_window = max_recv_window
+        self.rtt_multiplier = rtt_multiplier
+        self.clock = clock
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.last_sync = None
+        self.latency = LatencyTracker()
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sync(self):
+        """Mide desfase y RTT. Devuelve True si obtuvo al menos una muestra."""
+        best = None
+        for _ in range(self.samples):
+            t0 = self.clock()
+            server_ms = self.fetch_server_time()
+            t1 = self.clock()
+            if server_ms is None:
+                continue
+            rtt = t1 - t0
+            self.latency.record('rtt', rtt)
+            if best is None or rtt < best[0]:
+                best = (rtt, server_ms - (t0 + t1) / 2 * 1000)
+        if best is None:
+            return False
+        with self.lock:
+            self.rtt_ms = best[0] * 1000
+            self.offset_ms = best[1]
+            self.last_sync = self.clock()
+        return True
+
+    def is_stale(self):
+        return self.last_sync is None or self.clock() - self.last_sync > self.interval
+
+    def now_ms(self):
+        """Hora del exchange estimada, en ms. Sincroniza si hace falta."""
+        if self.is_stale():
+            self.sync()
+        return int(self.clock() * 1000 + self.offset_ms)
+
+    def recv_window(self):
+        if self.rtt_ms is None:
+            return 5000
+        window = self.rtt_ms * self.rtt_multiplier
+        return int(min(max(window, self.min_recv_window), self.max_recv_window))
+
+    def metrics(self):
+        return {
+            'offset_ms': self.offset_ms,
+            'rtt_ms': self.rtt_ms,
+            'recv_window': self.recv_window(),
+            'last_sync_age_s': None if self.last_sync is None else self.clock() - self.last_sync,
+            'rtt': self.latency.stats('rtt'),
+        }
+
+    def start(self):
+        """Re-sincroniza cada `interval` segundos en un hilo daemon."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"[ERROR] No se pudo sincronizar el reloj: {e}")
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=loop, name="clock-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
 
 class BinanceHMACClient:
-    def __init__(self, api_key, secret_key, base_url="https://api.binance.com"):
+    def __init__(self, api_key, secret_key, base_url="https://api.binance.com",
+                 timeout=(3.05, 10), max_retries=3, backoff_factor=0.3,
+                 pool_maxsize=10, session=None, sync_clock=True, recv_window=None):
         """
         :param api_key: La API key que Binance te proporcionó.
         :param secret_key: La Secret Key que Binance te proporcionó.
         :param base_url: Endpoint principal de Binance (por defecto, el de producción).
+        :param timeout: (conexión, lectura) en segundos para cada petición.
+        :param max_retries: reintentos con backoff exponencial ante 429/5xx.
+            Solo se reintentan GET y DELETE: reenviar un POST de orden podría
+            duplicarla.
+        :param session: requests.Session propia (si no, se crea una con pool).
+        :param sync_clock: corrige el timestamp con el desfase medido contra
+            /api/v3/time (ver ClockSync).
+        :param recv_window: recvWindow fijo en ms; si es None se calcula a
+            partir del RTT medido (5000 sin sincronización).
         """
         self.api_key = api_key
         self.secret_key = secret_key
         self.base_url = base_url
+        self.timeout = timeout
+
+        # HMAC con la clave ya cargada: cada firma solo copia el estado
+        self._hmac = hmac.new(secret_key.encode('utf-8'), digestmod=hashlib.sha256)
+
+        # Sesión con keep-alive: reutiliza las conexiones TCP+TLS entre peticiones
+        if session is None:
+            session = requests.Session()
+            retry = Retry(
+                total=max_retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET", "DELETE"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self.session.headers.update({"X-MBX-APIKEY": self.api_key})
+
+        self.latency = LatencyTracker()
+
+        self.fixed_recv_window = recv_window
+        self.clock = ClockSync(self.get_server_time) if sync_clock else None
+
+    def _request(self, http_method, endpoint, url, **kwargs):
+        """
+        Ejecuta la petición con la sesión compartida y registra su latencia
+        por endpoint.
+        """
+        start = time.perf_counter()
+        try:
+            return self.session.request(http_method, url, timeout=self.timeout, **kwargs)
+        finally:
+            self.latency.record(f"{http_method} {endpoint}", time.perf_counter() - start)
+
+    def latency_stats(self):
+        """
+        Latencias por endpoint en ms (count, mean, p50, p95, p99, max).
+        """
+        return self.latency.summary()
+
+    def close(self):
+        self.session.close()
 
     def get_margin_account_info(self):
         endpoint = "/sapi/v1/margin/account"
@@ -22,7 +181,7 @@ class BinanceHMACClient:
     def get_symbol_price(self, symbol):
         endpoint = "/api/v3/ticker/price"
         params = {"symbol": symbol}
-        response = requests.get(self.base_url + endpoint, params=params)
+        response = self._request("GET", endpoint, self.base_url + endpoint, params=params)
         if response.status_code == 200:
             price = float(response.json()['price'])
             return price
@@ -30,25 +189,71 @@ class BinanceHMACClient:
             print("Error al obtener precio del símbolo:", response.text)
             return None
 
+    def get_server_time(self):
+        """Hora del servidor en ms, o None si falla."""
+        endpoint = "/api/v3/time"
+        response = self._request("GET", endpoint, self.base_url + endpoint)
+        if response.status_code == 200:
+            return response.json()['serverTime']
+        print("Error al obtener la hora del servidor:", response.text)
+        return None
+
     def get_timestamp(self):
+        if self.clock is not None:
+            return self.clock.now_ms()
         return int(time.time() * 1000)
 
+    def get_recv_window(self):
+        if self.fixed_recv_window is not None:
+            return self.fixed_recv_window
+        if self.clock is not None:
+            return self.clock.recv_window()
+        return 5000
+
+    def clock_metrics(self):
+        """Desfase, RTT y recvWindow actuales (None sin sincronización)."""
+        return self.clock.metrics() if self.clock is not None else None
+
     def sign_payload(self, payload: str) -> str:
         """
         Genera la firma HMAC-SHA256 del payload usando la secret key.
         Devuelve la firma en formato hexadecimal.
         """
-        return hmac.new(self.secret_key.encode('utf-8'), payload.encode('utf-8'), hashlib.sha256).hexdigest()
+        signer = self._hmac.copy()
+        signer.update(payload.encode('utf-8'))
+        return signer.hexdigest()
 
     def send_signed_request(self, http_method, endpoint, params=None):
         """
         Envía una solicitud firmada a Binance usando HMAC-SHA256.
+        Si Binance la rechaza por timestamp fuera de recvWindow (-1021), se
+        re-sincroniza el reloj y se reintenta una vez: la petición no llegó a
+        ejecutarse, así que reenviarla es seguro incluso para órdenes.
         """
-        if params is None:
-            params = {}
+        r = self._send_signed(http_method, endpoint, dict(params or {}))
+
+        if r.status_code != 200 and self.clock is not None and self._error_code(r) == TIMESTAMP_OUTSIDE_RECV_WINDOW:
+            print("[INFO] Timestamp fuera de recvWindow; re-sincronizando reloj y reintentando.")
+            self.clock.sync()
+            r = self._send_signed(http_method, endpoint, dict(params or {}))
+
+        if r.status_code != 200:
+            print("Error en petición:", r.text)
+            return None
+
+        return r.json()
+
+    @staticmethod
+    def _error_code(response):
+        try:
+            return response.json().get('code')
+        except ValueError:
+            return None
+
+    def _send_signed(self, http_method, endpoint, params):
         # Agrega timestamp y recvWindow
         params['timestamp'] = self.get_timestamp()
-        params['recvWindow'] = 5000
+        params['recvWindow'] = self.get_recv_window()
 
         # Generar el query string y la firma
         query_string = urlencode(params)
@@ -58,25 +263,20 @@ class BinanceHMACClient:
         # Construir la URL completa
         url = self.base_url + endpoint + "?" + query_string
 
-        headers = {
-            "X-MBX-APIKEY": self.api_key
-        }
+        # la API key va en las cabeceras de la sesión
+        headers = {}
 
         if http_method == "GET":
-            r = requests.get(url, headers=headers)
+            r = self._request("GET", endpoint, url, headers=headers)
         elif http_method == "POST":
             headers["Content-Type"] = "application/x-www-form-urlencoded"
-            r = requests.post(url, headers=headers)
+            r = self._request("POST", endpoint, url, headers=headers)
         elif http_method == "DELETE":
-            r = requests.delete(url, headers=headers)
+            r = self._request("DELETE", endpoint, url, headers=headers)
         else:
             raise ValueError("Método HTTP no soportado.")
 
-        if r.status_code != 200:
-            print("Error en petición:", r.text)
-            return None
-
-        return r.json()
+        return r
 
     def create_order(self, symbol, side, order_type, quantity):
         """
@@ -1,7 +1,46 @@
 # db_manager.py
 import sqlite3
+import numpy as np
 import pandas as pd
-from config import DB_NAME
+from config import DB_NAME, SYMBOL, TIMEFRAME
+from timeutils import to_epoch_ms
+
+INSERT_TRADE_SQL = """
+INSERT INTO trades
+(symbol, strategy, side, quantity, open_time, open_price,
+ close_time, close_price, fees, pnl, reason, notes)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# ts en milisegundos epoch; una fila por (symbol, timeframe, ts)
+CREATE_OHLCV_SQL = """
+CREATE TABLE IF NOT EXISTS ohlcv (
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL NOT NULL,
+    PRIMARY KEY (symbol, timeframe, ts)
+) WITHOUT ROWID
+"""
+
+UPSERT_OHLCV_SQL = """
+INSERT INTO ohlcv (symbol, timeframe, ts, open, high, low, close, volume)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (symbol, timeframe, ts) DO UPDATE SET
+    open = excluded.open,
+    high = excluded.high,
+    low = excluded.low,
+    close = excluded.close,
+    volume = excluded.volume
+"""
+
+# dtype de las filas de fetch_ohlcv_range (np.fromiter sin pasar por listas)
+OHLCV_DTYPE = np.dtype([('ts', np.int64), ('open', np.float64), ('high', np.float64),
+                        ('low', np.float64), ('close', np.float64), ('volume', np.float64)])
 
 class DBManager:
     def __init__(self, db_name=DB_NAME):
@@ -9,17 +48,6 @@ class DBManager:
         self.create_tables()
 
     def create_tables(self):
-        create_ohlcv_table = """
-        CREATE TABLE IF NOT EXISTS ohlcv (
-            ohlcv_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            open REAL NOT NULL,
-            high REAL NOT NULL,
-            low REAL NOT NULL,
-            close REAL NOT NULL,
-            volume REAL NOT NULL
-        );
-        """
         create_trades_table = """
         CREATE TABLE IF NOT EXISTS trades (
             trade_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -37,36 +65,114 @@ class DBManager:
             notes TEXT
         );
         """
-        self.conn.execute(create_ohlcv_table)
+        self.migrate_ohlcv()
+        self.conn.execute(CREATE_OHLCV_SQL)
         self.conn.execute(create_trades_table)
         self.conn.commit()
 
-    def insert_ohlcv(self, data_rows):
+    def migrate_ohlcv(self, symbol=SYMBOL, timeframe=TIMEFRAME):
         """
-        Inserta varias filas en 'ohlcv'.
-        data_rows: lista de tuplas (timestamp, open, high, low, close, volume)
+        Convierte una tabla 'ohlcv' del esquema antiguo (ohlcv_id AUTOINCREMENT,
+        timestamp TEXT) al esquema actual. Las filas antiguas no tenían símbolo
+        ni marco temporal, así que se asignan los de config. Los duplicados por
+        timestamp se quedan con la última fila insertada.
+        Las filas con un timestamp que no se puede interpretar no se migran:
+        si hay alguna, la tabla antigua se conserva como ohlcv_legacy_backup
+        en lugar de borrarse.
         """
-        query = """
-        INSERT INTO ohlcv (timestamp, open, high, low, close, volume)
-        VALUES (?, ?, ?, ?, ?, ?)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(ohlcv)")]
+        if 'ohlcv_id' not in columns:
+            return
+
+        print("[INFO] Migrando tabla ohlcv al esquema (symbol, timeframe, ts)...")
+        with self.conn:
+            self.conn.execute("ALTER TABLE ohlcv RENAME TO ohlcv_legacy")
+            self.conn.execute(CREATE_OHLCV_SQL)
+            # julianday conserva los milisegundos que strftime('%s') truncaría
+            self.conn.execute("""
+            INSERT OR REPLACE INTO ohlcv (symbol, timeframe, ts, open, high, low, close, volume)
+            SELECT ?, ?, ts, open, high, low, close, volume FROM (
+                SELECT CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000.0) AS INTEGER) AS ts,
+                       open, high, low, close, volume, ohlcv_id
+                FROM ohlcv_legacy
+            )
+            WHERE ts IS NOT NULL
+            ORDER BY ohlcv_id ASC
+            """, (symbol, timeframe))
+            dropped = self.conn.execute(
+                "SELECT COUNT(*) FROM ohlcv_legacy WHERE julianday(timestamp) IS NULL").fetchone()[0]
+            if dropped:
+                self.conn.execute("ALTER TABLE ohlcv_legacy RENAME TO ohlcv_legacy_backup")
+                print(f"[ERROR] {dropped} filas de ohlcv con timestamp inválido no se migraron; "
+                      "la tabla antigua se conserva como ohlcv_legacy_backup.")
+            else:
+                self.conn.execute("DROP TABLE ohlcv_legacy")
+
+    def insert_ohlcv(self, data_rows, symbol=SYMBOL, timeframe=TIMEFRAME):
         """
-        self.conn.executemany(query, data_rows)
+        Inserta (o actualiza si ya existen) varias filas en 'ohlcv'.
+        data_rows: lista de tuplas (timestamp, open, high, low, close, volume);
+        timestamp puede ser entero en ms, pd.Timestamp o string.
+        """
+        rows = ((symbol, timeframe, to_epoch_ms(ts), o, h, l, c, v)
+                for ts, o, h, l, c, v in data_rows)
+        self.conn.executemany(UPSERT_OHLCV_SQL, rows)
         self.conn.commit()
 
-    def fetch_ohlcv_data(self, limit=None):
+    def fetch_ohlcv_range(self, symbol=SYMBOL, timeframe=TIMEFRAME,
+                          start=None, end=None, limit=None):
         """
-        Retorna en un DataFrame los datos de 'ohlcv'. Si limit se especifica,
-        trae solo esa cantidad de filas (ordenadas ASC).
+        Velas de [start, end) ordenadas por tiempo, como dict de arrays de NumPy
+        ('ts' en ms int64 y 'open'...'volume' float64). start/end aceptan ms,
+        pd.Timestamp o string; None deja el extremo abierto.
         """
+        query = "SELECT ts, open, high, low, close, volume FROM ohlcv WHERE symbol = ? AND timeframe = ?"
+        params = [symbol, timeframe]
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(to_epoch_ms(start))
+        if end is not None:
+            query += " AND ts < ?"
+            params.append(to_epoch_ms(end))
+        query += " ORDER BY ts ASC"
         if limit:
-            query = "SELECT timestamp, open, high, low, close, volume FROM ohlcv ORDER BY ohlcv_id ASC LIMIT ?"
-            rows = self.conn.execute(query, (limit,)).fetchall()
-        else:
-            query = "SELECT timestamp, open, high, low, close, volume FROM ohlcv ORDER BY ohlcv_id ASC"
-            rows = self.conn.execute(query).fetchall()
-
-        df = pd.DataFrame(rows, columns=['timestamp','open','high','low','close','volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+            query += " LIMIT ?"
+            params.append(limit)
+
+        records = np.fromiter(self.conn.execute(query, params), dtype=OHLCV_DTYPE)
+        return {name: records[name] for name in OHLCV_DTYPE.names}
+
+    def fetch_ohlcv_timestamps(self, symbol=SYMBOL, timeframe=TIMEFRAME, start=None, end=None):
+        """
+        Solo los timestamps (ms, int64) de [start, end), p. ej. para detectar huecos.
+        """
+        query = "SELECT ts FROM ohlcv WHERE symbol = ? AND timeframe = ?"
+        params = [symbol, timeframe]
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(to_epoch_ms(start))
+        if end is not None:
+            query += " AND ts < ?"
+            params.append(to_epoch_ms(end))
+        query += " ORDER BY ts ASC"
+        return np.fromiter((row[0] for row in self.conn.execute(query, params)), dtype=np.int64)
+
+    def fetch_ohlcv_data(self, limit=None, symbol=SYMBOL, timeframe=TIMEFRAME,
+                         start=None, end=None):
+        """
+        Retorna en un DataFrame los datos de 'ohlcv' del símbolo y marco
+        temporal, opcionalmente limitados a [start, end). Si limit se
+        especifica, trae solo esa cantidad de filas (ordenadas ASC).
+        """
+        arrays = self.fetch_ohlcv_range(symbol, timeframe, start=start, end=end, limit=limit)
+        df = pd.DataFrame({
+            'timestamp': pd.to_datetime(arrays['ts'], unit='ms'),
+            'open': arrays['open'],
+            'high': arrays['high'],
+            'low': arrays['low'],
+            'close': arrays['close'],
+            'volume': arrays['volume'],
+        })
         return df
 
     def insert_trade(self, symbol, strategy, side, quantity,
@@ -76,13 +182,7 @@ class DBManager:
         """
         Inserta un registro en la tabla 'trades'.
         """
-        sql = """
-        INSERT INTO trades 
-        (symbol, strategy, side, quantity, open_time, open_price,
-         close_time, close_price, fees, pnl, reason, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        self.conn.execute(sql, (
+        self.conn.execute(INSERT_TRADE_SQL, (
             symbol, strategy, side, quantity,
             open_time, open_price,
             close_time, close_price,
@@ -90,5 +190,69 @@ class DBManager:
         ))
         self.conn.commit()
 
+    def insert_trades(self, rows, commit=True):
+        """
+        Inserta varios trades con un solo executemany.
+        rows: tuplas en el orden de las columnas de INSERT_TRADE_SQL.
+        """
+        self.conn.executemany(INSERT_TRADE_SQL, rows)
+        if commit:
+            self.conn.commit()
+
+    def trade_writer(self, batch_size=1000, persist=True):
+        return TradeWriter(self, batch_size=batch_size, persist=persist)
+
     def close(self):
         self.conn.close()
+
+
+class TradeWriter:
+    """
+    Escritura de trades por lotes: acumula filas y las vuelca con
+    executemany cada `batch_size` trades, con un único commit al cerrar
+    (una transacción por ejecución). Se usa como context manager.
+
+    Con persist=False no toca la base de datos y los trades quedan solo en
+    memoria (self.rows), p. ej. para barridos de parámetros.
+    """
+
+    def __init__(self, db=None, batch_size=1000, persist=True):
+        if persist and db is None:
+            raise ValueError("TradeWriter necesita un DBManager para persistir.")
+        self.db = db
+        self.batch_size = batch_size
+        self.persist = persist
+        self.rows = []
+        self.written = 0
+
+    def add(self, symbol, strategy, side, quantity,
+            open_time, open_price,
+            close_time, close_price,
+            fees, pnl, reason, notes=None):
+        self.rows.append((
+            symbol, strategy, side, quantity,
+            open_time, open_price,
+            close_time, close_price,
+            fees, pnl, reason, notes
+        ))
+        if self.persist and len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # sin commit: el lote queda en la transacción abierta hasta close()
+        if self.persist and self.rows:
+            self.db.insert_trades(self.rows, commit=False)
+            self.written += len(self.rows)
+            self.rows = []
+
+    def close(self):
+        if self.persist:
+            self.flush()
+            self.db.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
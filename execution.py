@@ -0,0 +1,152 @@
+# execution.py
+# Modelo de ejecución de las salidas: contra el close (original) o contra el
+# rango high/low de la vela, con reglas para velas que tocan SL y TP a la vez.
+import numpy as np
+
+from timeutils import to_epoch_ms
+
+EXIT_MODELS = ('close', 'intrabar')
+# stop_first: conservador; take_first: optimista; nearest: el nivel más
+# cercano al open se toca primero
+AMBIGUITY_RULES = ('stop_first', 'take_first', 'nearest')
+
+
+def touches(is_long, high, low, stop_price, take_price):
+    """
+    (toca_stop, toca_take) para una vela o arrays de velas.
+    """
+    if is_long:
+        return low <= stop_price, high >= take_price
+    return high >= stop_price, low <= take_price
+
+
+def fill_price(is_long, stop_first, open_price, stop_price, take_price):
+    """
+    Precio de ejecución del nivel tocado. Si la vela abre ya más allá del
+    nivel (gap), se ejecuta al open. Acepta escalares o arrays.
+    """
+    if is_long:
+        stop_fill = np.minimum(open_price, stop_price)
+        take_fill = np.maximum(open_price, take_price)
+    else:
+        stop_fill = np.maximum(open_price, stop_price)
+        take_fill = np.minimum(open_price, take_price)
+    return np.where(stop_first, stop_fill, take_fill)
+
+
+class ExecutionModel:
+    """
+    exit_model: 'close' evalúa SL/TP con el close (comportamiento original);
+        'intrabar' con el high/low y ejecuta al nivel (o al open si hay gap).
+    ambiguity: regla para una vela que toca SL y TP (ver AMBIGUITY_RULES).
+    lower_tf: DataFrame opcional de un marco temporal menor (timestamp, high,
+        low) con el que se decide qué nivel se tocó primero en las velas
+        ambiguas; la regla solo se aplica si ahí tampoco se resuelve.
+    bar_ms: duración en ms de las velas que se evalúan (para localizar sus
+        sub-velas en lower_tf).
+    """
+
+    def __init__(self, exit_model='close', ambiguity='stop_first', lower_tf=None,
+                 bar_ms=60_000):
+        if exit_model not in EXIT_MODELS:
+            raise ValueError(f"Modelo de salida inválido: {exit_model}")
+        if ambiguity not in AMBIGUITY_RULES:
+            raise ValueError(f"Regla de ambigüedad inválida: {ambiguity}")
+        self.exit_model = exit_model
+        self.ambiguity = ambiguity
+        self.bar_ms = bar_ms
+        self.lower_ts = None
+        if lower_tf is not None:
+            self.lower_ts = lower_tf['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+            self.lower_high = lower_tf['high'].to_numpy(dtype=float)
+            self.lower_low = lower_tf['low'].to_numpy(dtype=float)
+
+    @property
+    def intrabar(self):
+        return self.exit_model == 'intrabar'
+
+    def check(self, is_long, open_price, high, low, stop_price, take_price, bar_time=None):
+        """
+        Salida por SL/TP de una vela: ("StopLoss"|"TakeProfit", precio) o None.
+        """
+        stop_hit, take_hit = touches(is_long, high, low, stop_price, take_price)
+        if not (stop_hit or take_hit):
+            return None
+        if stop_hit and take_hit:
+            bar_ms = None if bar_time is None else np.array([to_epoch_ms(bar_time)], dtype=np.int64)
+            stop_first = bool(self.resolve(
+                np.array([is_long]), np.array([open_price], dtype=float),
+                np.array([stop_price], dtype=float), np.array([take_price], dtype=float),
+                bar_ms)[0])
+        else:
+            stop_first = bool(stop_hit)
+        reason = "StopLoss" if stop_first else "TakeProfit"
+        return reason, float(fill_price(is_long, stop_first, open_price, stop_price, take_price))
+
+    def resolve(self, is_long, open_price, stop_price, take_price, bar_start_ms=None):
+        """
+        Para N velas que tocan ambos niveles devuelve un array bool con True
+        si el stop se tocó primero. Orden de decisión: gap en el open,
+        primer toque en lower_tf y, si no, la regla de ambigüedad.
+        """
+        is_long = np.asarray(is_long, dtype=bool)
+        stop_first = self._rule(is_long, open_price, stop_price, take_price)
+
+        if self.lower_ts is not None and bar_start_ms is not None and len(is_long):
+            refined = self.first_touch(bar_start_ms, is_long, stop_price, take_price)
+            stop_first = np.where(refined >= 0, refined == 1, stop_first)
+
+        # gap: el open ya está más allá de un nivel
+        gap_stop = np.where(is_long, open_price <= stop_price, open_price >= stop_price)
+        gap_take = np.where(is_long, open_price >= take_price, open_price <= take_price)
+        stop_first = np.where(gap_stop, True, np.where(gap_take, False, stop_first))
+        return stop_first.astype(bool)
+
+    def _rule(self, is_long, open_price, stop_price, take_price):
+        if self.ambiguity == 'stop_first':
+            return np.ones(len(is_long), dtype=bool)
+        if self.ambiguity == 'take_first':
+            return np.zeros(len(is_long), dtype=bool)
+        return np.abs(open_price - stop_price) <= np.abs(take_price - open_price)
+
+    def first_touch(self, bar_start_ms, is_long, stop_price, take_price):
+        """
+        Primer toque en lower_tf dentro de cada vela, para todas las velas a
+        la vez: 1 si fue el stop, 0 si fue el take y -1 si no se resuelve
+        (sin sub-velas, o la primera sub-vela que toca también toca ambos).
+        """
+        n = len(bar_start_ms)
+        result = np.full(n, -1, dtype=np.int8)
+        lo = np.searchsorted(self.lower_ts, bar_start_ms, side='left')
+        hi = np.searchsorted(self.lower_ts, np.asarray(bar_start_ms) + self.bar_ms, side='left')
+        lengths = hi - lo
+        total = int(lengths.sum())
+        if total == 0:
+            return result
+
+        # índice de la vela padre y posición en lower_tf de cada sub-vela
+        parent = np.repeat(np.arange(n), lengths)
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        pos = np.repeat(lo, lengths) + offsets
+
+        high = self.lower_high[pos]
+        low = self.lower_low[pos]
+        long_ = is_long[parent]
+        stop = np.asarray(stop_price)[parent]
+        take = np.asarray(take_price)[parent]
+        stop_hit = np.where(long_, low <= stop, high >= stop)
+        take_hit = np.where(long_, high >= take, low <= take)
+
+        # primera sub-vela que toca algún nivel, por vela padre
+        key = np.where(stop_hit | take_hit, offsets, total)
+        starts = np.cumsum(lengths) - lengths
+        nonempty = lengths > 0
+        first = np.full(n, total)
+        first[nonempty] = np.minimum.reduceat(key, starts[nonempty])
+
+        found = first < total
+        idx = starts[found] + first[found]
+        only_stop = stop_hit[idx] & ~take_hit[idx]
+        only_take = take_hit[idx] & ~stop_hit[idx]
+        result[found] = np.where(only_stop, 1, np.where(only_take, 0, -1))
+        return result
@@ -0,0 +1,204 @@
+# indicators.py
+# Estado incremental de indicadores para el loop en vivo: cada vela nueva
+# actualiza el estado en O(1) en vez de recalcular todo el DataFrame.
+import math
+from collections import deque
+from config import (
+    BREAKOUT_BARS, VOL_LOOKBACK, VWAP_PERIOD,
+    RSI_PERIOD, EMA_PERIOD )
+
+NAN = float('nan')
+
+
+class _RollingSum:
+    """
+    Suma de las últimas `window` observaciones. Se re-suma con fsum cada
+    `window` inserciones para que el error de redondeo no crezca con el tiempo.
+    """
+    __slots__ = ('window', 'values', 'total', '_since_resync')
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self._since_resync = 0
+
+    def push(self, value):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            self.total = math.fsum(self.values)
+            self._since_resync = 0
+
+    def full(self):
+        return len(self.values) == self.window
+
+
+class _RollingExtreme:
+    """
+    Máximo (o mínimo) de las últimas `window` observaciones con una deque
+    monótona: cada valor entra y sale una sola vez.
+    """
+    __slots__ = ('window', 'is_max', 'items', 'count')
+
+    def __init__(self, window, is_max=True):
+        self.window = window
+        self.is_max = is_max
+        self.items = deque()
+        self.count = 0
+
+    def push(self, value):
+        idx = self.count
+        self.count += 1
+        items = self.items
+        if self.is_max:
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((idx, value))
+        if items[0][0] <= idx - self.window:
+            items.popleft()
+
+    def value(self):
+        if self.count < self.window:
+            return NAN
+        return self.items[0][1]
+
+
+class IncrementalIndicators:
+    """
+    Versión en streaming de ScalpingStrategy.compute_indicators para un marco
+    temporal. Las velas cerradas se acumulan en el estado; la vela en curso
+    (mismo timestamp que la anterior) se reemplaza sin tocar ese estado, así
+    que reenviar la vela abierta en cada ciclo no duplica datos.
+    """
+
+    def __init__(self, breakout_bars=BREAKOUT_BARS, vol_lookback=VOL_LOOKBACK,
+                 vwap_period=VWAP_PERIOD, rsi_period=RSI_PERIOD,
+                 ema_period=EMA_PERIOD, atr_period=14):
+        self.rsi_period = rsi_period
+        self.atr_period = atr_period
+        self.alpha = 2.0 / (ema_period + 1)
+
+        self.highs = _RollingExtreme(breakout_bars, is_max=True)
+        self.lows = _RollingExtreme(breakout_bars, is_max=False)
+        self.volumes = _RollingSum(vol_lookback)
+        self.vwap_pv = _RollingSum(vwap_period)
+        self.vwap_v = _RollingSum(vwap_period)
+        # el RSI de la vela en curso usa su propio delta + los (period-1) anteriores
+        self.gains = _RollingSum(max(rsi_period - 1, 1))
+        self.losses = _RollingSum(max(rsi_period - 1, 1))
+        self.trs = _RollingSum(max(atr_period - 1, 1))
+
+        self.count = 0          # velas cerradas incorporadas al estado
+        self.last_close = None
+        self.ema = None
+        self.pending = None     # vela en curso (aún no cerrada)
+
+    def seed(self, df):
+        """
+        Carga un histórico (DataFrame con timestamp, open, high, low, close, volume).
+        La última fila queda como vela en curso.
+        """
+        latest = None
+        for row in df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].itertuples(index=False):
+            latest = self.update(row._asdict())
+        return latest
+
+    def update(self, candle):
+        """
+        Incorpora una vela y devuelve los indicadores de la última vela, con
+        las mismas claves que una fila de compute_indicators.
+        """
+        if self.pending is not None:
+            if candle['timestamp'] < self.pending['timestamp']:
+                return self.peek(self.pending)
+            if candle['timestamp'] > self.pending['timestamp']:
+                self._commit(self.pending)
+        self.pending = dict(candle)
+        return self.peek(self.pending)
+
+    def latest(self):
+        if self.pending is None:
+            return None
+        return self.peek(self.pending)
+
+    def peek(self, candle):
+        """
+        Indicadores que tendría `candle` si fuese la siguiente vela, sin
+        modificar el estado.
+        """
+        high, low, close, volume = candle['high'], candle['low'], candle['close'], candle['volume']
+
+        vol_avg = self.volumes.total / self.volumes.window if self.volumes.full() else NAN
+        if self.vwap_v.full():
+            vwap = self.vwap_pv.total / self.vwap_v.total if self.vwap_v.total else NAN
+        else:
+            vwap = NAN
+
+        rsi = NAN
+        if self.last_close is not None and self.count >= self.rsi_period:
+            delta = close - self.last_close
+            gains = self.gains.total if self.rsi_period > 1 else 0.0
+            losses = self.losses.total if self.rsi_period > 1 else 0.0
+            avg_gain = (gains + max(delta, 0.0)) / self.rsi_period
+            avg_loss = (losses + max(-delta, 0.0)) / self.rsi_period
+            if avg_loss:
+                rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+            elif avg_gain:
+                rsi = 100.0
+
+        ema = close if self.ema is None else self.alpha * close + (1 - self.alpha) * self.ema
+
+        atr = NAN
+        if self.count + 1 >= self.atr_period:
+            trs = self.trs.total if self.atr_period > 1 else 0.0
+            atr = (trs + self._true_range(candle)) / self.atr_period
+
+        return {
+            'timestamp': candle['timestamp'],
+            'open': candle['open'],
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume,
+            'high_n': self.highs.value(),
+            'low_n': self.lows.value(),
+            'vol_avg': vol_avg,
+            'vwap': vwap,
+            'rsi': rsi,
+            'ema': ema,
+            'atr': atr,
+        }
+
+    def _true_range(self, candle):
+        high, low, close = candle['high'], candle['low'], candle['close']
+        return max(high - low, abs(high - close), abs(low - close))
+
+    def _commit(self, candle):
+        high, low, close, volume = candle['high'], candle['low'], candle['close'], candle['volume']
+
+        self.highs.push(high)
+        self.lows.push(low)
+        self.volumes.push(volume)
+        self.vwap_pv.push((high + low + close) / 3 * volume)
+        self.vwap_v.push(volume)
+
+        if self.last_close is not None:
+            delta = close - self.last_close
+            self.gains.push(max(delta, 0.0))
+            self.losses.push(max(-delta, 0.0))
+
+        if self.ema is None:
+            self.ema = close
+        else:
+            self.ema = self.alpha * close + (1 - self.alpha) * self.ema
+
+        self.trs.push(self._true_range(candle))
+        self.last_close = close
+        self.count += 1
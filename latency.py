@@ -0,0 +1,50 @@
+# latency.py
+# Registro de latencias por clave (endpoint, etapa, ...) con percentiles.
+import threading
+from collections import defaultdict, deque
+
+import numpy as np
+
+
+class LatencyTracker:
+    """
+    Guarda las últimas `window` latencias (en segundos) de cada clave y
+    calcula sus percentiles bajo demanda. Es seguro entre hilos.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self.lock:
+            self.samples[key].append(seconds)
+            self.counts[key] += 1
+
+    def stats(self, key):
+        """
+        {'count', 'mean', 'p50', 'p95', 'p99', 'max'} en milisegundos, o None
+        si la clave no tiene muestras.
+        """
+        with self.lock:
+            values = np.array(self.samples.get(key, ()), dtype=float)
+            count = self.counts.get(key, 0)
+        if values.size == 0:
+            return None
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+        return {
+            'count': count,
+            'mean': float(values.mean() * 1000),
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'max': float(values.max() * 1000),
+        }
+
+    def summary(self):
+        """Estadísticas de todas las claves."""
+        with self.lock:
+            keys = list(self.samples)
+        return {key: self.stats(key) for key in keys}
@@ -0,0 +1,198 @@
+# live_trader.py
+# Lógica de decisión del loop en vivo, alimentada vela a vela.
+import time
+
+from indicators import IncrementalIndicators
+from latency import LatencyTracker
+from timeutils import timeframe_to_ms
+from resampler import IncrementalResampler, resample_frame
+from position_engine import PositionEngine
+from config import SYMBOL, FEE_RATE, MAX_HOLD_MINUTES
+
+LIVE_TIMEFRAMES = ('1m', '5m', '15m')
+
+
+class LiveTrader:
+    """
+    Estado del trading en vivo (velas, indicadores y posición abierta).
+    on_candles recibe las velas cerradas y decide cuando llega una vela
+    nueva de 1m. Basta con publicar la vela del marco más corto: las de los
+    demás marcos se construyen a partir de ella con IncrementalResampler.
+    """
+
+    def __init__(self, db, strat, order_mgr, timeframes=LIVE_TIMEFRAMES,
+                 clock=time.time, verbose=True):
+        """
+        clock: fuente de la hora (un reloj virtual en replay).
+        verbose: imprime el mensaje de ciclo en cada vela.
+        """
+        self.db = db
+        self.strat = strat
+        self.order_mgr = order_mgr
+        self.timeframes = tuple(timeframes)
+        self.base_timeframe = min(self.timeframes, key=timeframe_to_ms)
+        self.resampler = IncrementalResampler(
+            [tf for tf in self.timeframes if tf != self.base_timeframe], self.base_timeframe)
+
+        # Indicadores incrementales por marco temporal: O(1) por vela
+        self.indicators = {tf: IncrementalIndicators() for tf in self.timeframes}
+        self.snapshots = {tf: None for tf in self.timeframes}
+
+        # Misma máquina de estados que el backtester; una vela = un minuto
+        self.engine = PositionEngine(fee_rate=FEE_RATE, max_hold_bars=MAX_HOLD_MINUTES)
+
+        # PnL realizado del día UTC de la vela en curso (se reinicia a medianoche)
+        self.daily_pnl = 0.0
+        self.daily_loss_limit = -5.0
+        self.day = None
+
+        self.clock = clock
+        self.verbose = verbose
+        self.start_time = clock()
+        # tiempo de decisión por vela ('on_candles'), en segundos
+        self.latency = LatencyTracker()
+
+    def seed(self, timeframe, df):
+        """Carga el histórico inicial de un marco temporal."""
+        self.snapshots[timeframe] = self.indicators[timeframe].seed(df)
+
+    def seed_history(self, df):
+        """
+        Carga el histórico inicial de todos los marcos a partir de las velas
+        del marco base (se descarta la última si aún no ha cerrado).
+        Devuelve las velas base cargadas.
+        """
+        step = timeframe_to_ms(self.base_timeframe)
+        close_ms = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64') + step
+        df = df[close_ms <= self.clock() * 1000].reset_index(drop=True)
+
+        self.seed(self.base_timeframe, df)
+        for tf in self.resampler.steps:
+            self.seed(tf, resample_frame(df, tf, self.base_timeframe))
+        # la vela en curso de cada marco mayor queda a medias en el resampler
+        self.resampler.prime(df)
+        return df
+
+    def on_candles(self, candles):
+        """
+        candles: dict {timeframe: vela} con las velas cerradas nuevas.
+        """
+        start = time.perf_counter()
+        try:
+            self._on_candles(candles)
+        finally:
+            self.latency.record('on_candles', time.perf_counter() - start)
+
+    def _on_candles(self, candles):
+        try:
+            if self.verbose:
+                elapsed_time = self.clock() - self.start_time
+                print(f"[DEBUG] Ciclo activo. Tiempo transcurrido: {elapsed_time:.0f} segundos.")
+
+            candles = dict(candles)
+            base_candle = candles.get(self.base_timeframe)
+            if base_candle is not None:
+                for tf, candle in self.resampler.update(base_candle).items():
+                    candles.setdefault(tf, candle)
+
+            for tf, candle in candles.items():
+                self.snapshots[tf] = self.indicators[tf].update(candle)
+
+            candle_1m = candles.get('1m')
+            if candle_1m is None:
+                return
+
+            current_price = candle_1m['close']
+            current_time = candle_1m['timestamp']
+            self._roll_day(current_time)
+
+            # Las salidas no dependen del modelo: se evalúan antes de pedir señal
+            if self.engine.is_open():
+                self._check_exit(current_time, current_price)
+                return
+
+            if self.daily_pnl <= self.daily_loss_limit:
+                print(f"[RISK ALERT] Pérdida diaria {self.daily_pnl} <= {self.daily_loss_limit}. No se abrirán nuevas posiciones.")
+                return
+
+            if any(snap is None for snap in self.snapshots.values()):
+                return
+
+            signal, sl_pct, tp_pct = self.strat.generate_signal_from_snapshots(
+                self.snapshots['1m'], self.snapshots['5m'], self.snapshots['15m'])
+
+            if signal == 1:
+                self._open('long', 'buy', current_time, current_price, sl_pct, tp_pct)
+            elif signal == -1:
+                self._open('short', 'sell', current_time, current_price, sl_pct, tp_pct)
+
+        except Exception as e:
+            print(f"Error en el loop principal: {e}")
+
+    def metrics(self):
+        """
+        Latencias en ms: 'on_candles' del trader y, si el proveedor de señal
+        las registra (DeadlineSignalProvider), las de decisión del modelo.
+        """
+        metrics = {'on_candles': self.latency.stats('on_candles')}
+        provider = getattr(self.strat, 'provider', None)
+        if hasattr(provider, 'metrics'):
+            metrics['signal'] = provider.metrics()
+        return metrics
+
+    @staticmethod
+    def _minute_index(current_time):
+        # índice de vela de 1m: bars_held del motor = minutos transcurridos
+        return int(current_time.value // 60_000_000_000)
+
+    @staticmethod
+    def _day_index(current_time):
+        # día UTC de la vela: con el reloj virtual del replay se reinicia igual
+        return int(current_time.value // 86_400_000_000_000)
+
+    def _roll_day(self, current_time):
+        day = self._day_index(current_time)
+        if day == self.day:
+            return
+        if self.day is not None and self.daily_pnl != 0.0:
+            print(f"[INFO] Nuevo día UTC: se reinicia la pérdida diaria (era {self.daily_pnl:.2f}).")
+        self.day = day
+        self.daily_pnl = 0.0
+
+    def _open(self, side, order_side, current_time, current_price, sl_pct, tp_pct):
+        current_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
+        quantity = self.order_mgr.calculate_position_size(current_price, side=side)
+
+        order_response = self.order_mgr.create_market_order(order_side, quantity, price=current_price)
+
+        if order_response is not None and 'orderId' in order_response:
+            position = self.engine.open(
+                side, current_price, quantity,
+                time=current_time_str,
+                index=self._minute_index(current_time),
+                stop_loss_pct=sl_pct,
+                take_profit_pct=tp_pct
+            )
+            print(f"[OPEN {side.upper()}] time={current_time_str}, price={current_price}, qty={quantity}, SL={position.stop_price}, TP={position.take_price}")
+        else:
+            print(f"[ERROR] No se pudo abrir {side.upper()}, orden rechazada.")
+
+    def _check_exit(self, current_time, current_price):
+        current_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
+        position = self.engine.position
+        reason = self.engine.exit_reason(current_price, self._minute_index(current_time))
+        if reason is None:
+            return
+
+        # la posición solo se cierra en local si el exchange acepta la orden;
+        # si no, sigue abierta y se reintenta en la siguiente vela
+        close_side = 'sell' if position.is_long else 'buy'
+        order_response = self.order_mgr.create_market_order(close_side, position.quantity, price=current_price)
+        if order_response is None or 'orderId' not in order_response:
+            print(f"[ERROR] No se pudo cerrar {position.side.upper()} ({reason}), orden rechazada. La posición sigue abierta.")
+            return
+
+        trade = self.engine.close(current_price, current_time_str, reason)
+        self.db.insert_trade(symbol=SYMBOL, strategy='Scalping_OpenAI', **trade)
+        self.daily_pnl += trade['pnl']
+        print(f"[CLOSE {trade['side'].upper()}] time={current_time_str}, price={current_price}, PnL={trade['pnl']:.2f}, reason={trade['reason']}")
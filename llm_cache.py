@@ -0,0 +1,183 @@
+# llm_cache.py
+# Cache persistente (SQLite) de respuestas del modelo, indexado por un hash
+# de los indicadores cuantizados y de la versión de modelo/prompt.
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+CREATE_LLM_CACHE_SQL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def _quantize(value, significant):
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = float(value)
+        if math.isnan(value):
+            return 'nan'
+        return float(f"{value:.{significant}g}")
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value)
+
+
+def snapshot_key(snapshots, model, prompt_version, significant=6, fields=None):
+    """
+    Hash SHA-256 de los snapshots (dicts de indicadores) con los números
+    redondeados a `significant` cifras significativas, junto con el modelo
+    y la versión del prompt.
+    fields: claves de cada snapshot que entran en la clave (las que se
+    envían al modelo); None usa el snapshot entero. Con el timestamp o el
+    OHLC crudo en la clave dos velas distintas no coincidirían nunca.
+    """
+    payload = {
+        'model': model,
+        'prompt_version': prompt_version,
+        'snapshots': [
+            {k: _quantize(v, significant) for k, v in sorted(snap.items())
+             if fields is None or k in fields}
+            for snap in snapshots
+        ],
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Respuestas de texto del modelo en una tabla SQLite.
+
+    ttl: segundos de validez de una entrada (None = sin caducidad).
+    max_entries: al superarse se eliminan las menos usadas recientemente.
+    Cuenta aciertos y fallos para metrics().
+
+    get_or_compute agrupa las peticiones simultáneas de una misma clave: la
+    primera llama al modelo y las demás esperan su respuesta (p. ej. un
+    worker de DeadlineSignalProvider que sigue en curso cuando la vela
+    siguiente vuelve a preguntar lo mismo).
+    """
+
+    def __init__(self, path='llm_cache.db', ttl=None, max_entries=10_000, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
+        # clave -> Future de la llamada en curso
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(CREATE_LLM_CACHE_SQL)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Respuesta guardada para `key`, o None si no está o caducó."""
+        now = self.clock()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.conn.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = self.clock()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO llm_cache (key, response, created_at, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET response = excluded.response, "
+                "created_at = excluded.created_at, last_used = excluded.last_used",
+                (key, response, now, now))
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        if self.ttl is not None:
+            cur = self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (self.clock() - self.ttl,))
+            self.evictions += cur.rowcount
+        if self.max_entries is not None:
+            cur = self.conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,))
+            self.evictions += cur.rowcount
+
+    def get_or_compute(self, key, compute):
+        """
+        Devuelve la respuesta cacheada o llama a compute() y la guarda. Si
+        otra llamada ya está calculando la misma clave, espera su resultado
+        (o su excepción) en lugar de llamar otra vez.
+        """
+        # la consulta y el registro de la llamada van bajo el mismo lock: quien
+        # llega después de put() ve la respuesta en la tabla
+        with self.inflight_lock:
+            response = self.get(key)
+            if response is not None:
+                return response
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            response = compute()
+            self.put(key, response)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+        finally:
+            with self.inflight_lock:
+                del self.inflight[key]
+        return response
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def metrics(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'coalesced': self.coalesced,
+            'size': len(self),
+        }
+
+    def close(self):
+        self.conn.close()
@@ -1,207 +1,274 @@
 # main.py
 import argparse
-import time
+import asyncio
 import pandas as pd
-import datetime
 
 from db_manager import DBManager
 from backtester import Backtester
-from data_fetcher import DataFetcher
+from execution import ExecutionModel, AMBIGUITY_RULES
+from timeutils import timeframe_to_ms, to_epoch_ms
 from strategy import ScalpingStrategy
-from order_manager import OrderManager
-# Importa el cliente HMAC en lugar del RSA
-from binance_connect import BinanceHMACClient
-
-from config import (
-    DB_NAME,
-    SYMBOL, TIMEFRAME,
-    STOP_LOSS_PCT, TAKE_PROFIT_PCT,
-    MAX_HOLD_MINUTES
-)
-
-def run_backtest():
+from llm_cache import LLMCache
+
+from config import DB_NAME, SYMBOL, TIMEFRAME
+
+def _archive(path):
+    if not path:
+        return None
+    from archive import OHLCVArchive
+    return OHLCVArchive(path)
+
+def run_backtest(engine='vectorized', start=None, end=None, exit_model='close',
+                 ambiguity='stop_first', lower_tf=None, archive_path=None, report=None):
     print("=== Iniciando BACKTEST (Breakout + 30min max hold) ===")
-    backtester = Backtester(strategy=ScalpingStrategy())
-    final_capital, trades_summary = backtester.run_backtest()
+    archive = _archive(archive_path)
+    lower_df = None
+    if lower_tf:
+        # velas del marco menor para resolver las velas que tocan SL y TP
+        if archive is not None:
+            lower_df = archive.load_frame(SYMBOL, lower_tf, start=start, end=end)
+        else:
+            lower_df = DBManager(DB_NAME).fetch_ohlcv_data(timeframe=lower_tf, start=start, end=end)
+    execution = ExecutionModel(exit_model, ambiguity, lower_tf=lower_df,
+                               bar_ms=timeframe_to_ms(TIMEFRAME))
+    backtester = Backtester(strategy=ScalpingStrategy(use_openai=False), execution=execution,
+                            archive=archive)
+    final_capital, trades_summary = backtester.run_backtest(engine=engine, start=start, end=end)
     print("Capital final:", final_capital)
     print("Número de trades:", len(trades_summary))
+    _print_performance(backtester.performance(), report)
     if trades_summary:
         print("=== Últimos 5 trades ===")
         for t in trades_summary[-5:]:
             print(t)
 
-def run_live_trading():
+def _print_performance(performance, report=None):
+    print("=== Métricas ===")
+    for key, value in performance.items():
+        if key != 'by_reason':
+            print(f"{key}: {value}")
+    for reason, stats in performance['by_reason'].items():
+        print(f"{reason}: {stats}")
+    if report:
+        from metrics import write_report
+        write_report(report, performance)
+        print(f"[INFO] Informe guardado en {report}")
+
+def run_portfolio(symbols, start=None, end=None, exit_model='close', ambiguity='stop_first',
+                  max_exposure=1.0, archive_path=None, report=None):
+    from portfolio import PortfolioBacktester
+    print(f"=== Iniciando BACKTEST de cartera ({len(symbols)} símbolos) ===")
+    backtester = PortfolioBacktester(symbols, execution=ExecutionModel(exit_model, ambiguity),
+                                     max_exposure=max_exposure, archive=_archive(archive_path))
+    final_capital, trades_summary = backtester.run_backtest(start=start, end=end)
+    print("Capital final:", final_capital)
+    print("Número de trades:", len(trades_summary), f"(entradas descartadas por exposición: {backtester.skipped})")
+    _print_performance(backtester.performance(), report)
+    if trades_summary:
+        by_symbol = pd.DataFrame(trades_summary).groupby('symbol')['pnl'].agg(['count', 'sum'])
+        print("=== PnL por símbolo ===")
+        print(by_symbol.sort_values('sum', ascending=False).to_string())
+
+def load_sweep_data(start=None, end=None, archive_path=None):
+    """Velas de SYMBOL/TIMEFRAME para barridos: del archivo si se indica, si no de la base."""
+    archive = _archive(archive_path)
+    if archive is not None:
+        return archive.load_frame(SYMBOL, TIMEFRAME, start=start, end=end)
+    return DBManager(DB_NAME).fetch_ohlcv_data(start=start, end=end)
+
+def build_param_sets(method='grid', samples=50):
+    """Combinaciones de sweep.DEFAULT_SPACE: rejilla completa, aleatorias o LHS."""
+    import sweep
+    if method == 'grid':
+        return sweep.grid(sweep.DEFAULT_SPACE)
+    if method == 'random':
+        return sweep.random_samples(sweep.DEFAULT_SPACE, samples)
+    return sweep.latin_hypercube(sweep.DEFAULT_SPACE, samples)
+
+def run_sweep(method='grid', samples=50, workers=None, start=None, end=None, archive_path=None,
+              report_dir=None):
+    import sweep
+    print(f"=== Iniciando BARRIDO de parámetros ({method}) ===")
+    df = load_sweep_data(start, end, archive_path)
+    if df.empty:
+        print("No hay datos en ohlcv.")
+        return
+    param_sets = build_param_sets(method, samples)
+    results = sweep.run_sweep(df, param_sets, workers=workers, report_dir=report_dir)
+    print(f"Combinaciones evaluadas: {len(results)} (guardadas en sweep_results.csv)")
+    print("=== Top 5 ===")
+    print(results.head(5).to_string(index=False))
+
+def run_walkforward(train, test, method='grid', samples=50, workers=None, mc_samples=1000,
+                    start=None, end=None, archive_path=None):
+    import walkforward
+    print(f"=== Iniciando WALK-FORWARD (train {train}, test {test}) ===")
+    df = load_sweep_data(start, end, archive_path)
+    if df.empty:
+        print("No hay datos en ohlcv.")
+        return
+    param_sets = build_param_sets(method, samples)
+    results, trades = walkforward.walk_forward(df, param_sets, train, test, workers=workers)
+    if results.empty:
+        print("No hay datos suficientes para una ventana de train + test.")
+        return
+    print(f"Ventanas: {len(results)} (guardadas en walkforward_results.csv)")
+    print(results.to_string(index=False))
+    print("Trades fuera de muestra:", len(trades))
+    if trades and mc_samples:
+        print("=== Monte Carlo (bootstrap de trades fuera de muestra) ===")
+        for key, value in walkforward.monte_carlo(trades, mc_samples, workers=workers).items():
+            print(f"{key}: {value}")
+
+def run_backfill(symbols, timeframes, start, end=None):
+    from backfill import Backfiller
+    print(f"=== Iniciando BACKFILL {symbols} {timeframes} desde {start} ===")
+    summary = Backfiller(db=DBManager(DB_NAME)).backfill(symbols, timeframes, start, end)
+    for (symbol, timeframe), written in summary.items():
+        print(f"{symbol} {timeframe}: {written} velas escritas")
+
+def run_export(symbols, timeframes, archive_path, start=None, end=None):
+    from archive import OHLCVArchive, ARCHIVE_ROOT
+    root = archive_path or ARCHIVE_ROOT
+    print(f"=== Exportando ohlcv a {root} ===")
+    archive = OHLCVArchive(root)
+    db = DBManager(DB_NAME)
+    for symbol in symbols:
+        for timeframe in timeframes:
+            written = archive.export(db, symbol, timeframe, start=start, end=end)
+            print(f"{symbol} {timeframe}: {sum(written.values())} velas en {len(written)} meses")
+
+def run_replay(start=None, end=None, use_openai=False, llm_timeout=None):
+    import replay
+    print("=== Iniciando REPLAY del loop en vivo desde ohlcv ===")
+    strat = None
+    cache = None
+    if use_openai:
+        # con cache las repeticiones del replay no vuelven a consultar al modelo
+        cache = LLMCache()
+        strat = ScalpingStrategy(llm_cache=cache, llm_timeout=llm_timeout)
+    trader = replay.replay(start=start, end=end, strat=strat)
+    if trader is not None and 'signal' in trader.metrics():
+        print("[INFO] Decisión:", trader.metrics()['signal'])
+    if cache is not None:
+        print("[INFO] Cache LLM:", cache.metrics())
+
+def run_live_trading(llm_timeout=5.0, report_every=60):
+    # solo el modo live necesita ccxt y el cliente de Binance
+    from data_fetcher import DataFetcher
+    from live_trader import LiveTrader
+    from market_data import AsyncCandlePoller
+    from order_manager import OrderManager
     print("=== Iniciando LIVE TRADING con control de riesgo ===")
 
     db = DBManager(DB_NAME)
     fetcher = DataFetcher()
-    strat = ScalpingStrategy()
+    # en vivo solo acierta si los indicadores del prompt se repiten (cuantizados)
+    strat = ScalpingStrategy(llm_cache=LLMCache(ttl=24 * 3600), llm_timeout=llm_timeout)
     order_mgr = OrderManager()
+    trader = LiveTrader(db, strat, order_mgr)
 
     print("[DEBUG] Obteniendo datos históricos iniciales...")
-    df_1m = fetcher.fetch_ohlcv(timeframe='1m', limit=100)
-    df_5m = fetcher.fetch_ohlcv(timeframe='5m', limit=100)
-    df_15m = fetcher.fetch_ohlcv(timeframe='15m', limit=100)
-
-    open_position = False
-    side = None
-    open_time = None
-    open_price = 0
-    quantity = 0
-    stop_loss_price = 0
-    take_profit_price = 0
-
-    daily_pnl = 0.0       
-    daily_loss_limit = -5.0  
-
-    start_time = time.time()
-
-    while True:
-        try:
-            elapsed_time = time.time() - start_time
-            print(f"[DEBUG] Ciclo activo. Tiempo transcurrido: {elapsed_time:.0f} segundos.")
-
-            if daily_pnl <= daily_loss_limit:
-                print(f"[RISK ALERT] Pérdida diaria {daily_pnl} <= {daily_loss_limit}. No se abrirán nuevas posiciones.")
-                time.sleep(60)
-                continue
-
-            candle_1m = fetcher.fetch_latest_candle(timeframe='1m')
-            candle_5m = fetcher.fetch_latest_candle(timeframe='5m')
-            candle_15m = fetcher.fetch_latest_candle(timeframe='15m')
-
-            if candle_1m and candle_5m and candle_15m:
-                df_1m = pd.concat([df_1m, pd.DataFrame([candle_1m])], ignore_index=True)
-                df_5m = pd.concat([df_5m, pd.DataFrame([candle_5m])], ignore_index=True)
-                df_15m = pd.concat([df_15m, pd.DataFrame([candle_15m])], ignore_index=True)
-
-                signal, sl_pct, tp_pct = strat.generate_signal(df_1m, df_5m, df_15m)
-
-                current_price = candle_1m['close']
-                current_time = candle_1m['timestamp']
-                current_time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
-
-                if not open_position:
-                    if signal == 1:
-                        side = 'long'
-                        open_time = current_time
-                        open_price = current_price
-                        quantity = order_mgr.calculate_position_size(current_price, side=side)
-                        stop_loss_price = open_price * (1 - sl_pct)
-                        take_profit_price = open_price * (1 + tp_pct)
-
-                        order_response = order_mgr.create_market_order('buy', quantity)
-
-                        if order_response is not None and 'orderId' in order_response:
-                            open_position = True
-                            side = 'long'
-                            open_time = current_time
-                            open_price = current_price
-                            print(f"[OPEN LONG] time={current_time_str}, price={open_price}, qty={quantity}, SL={stop_loss_price}, TP={take_profit_price}")
-                        else:
-                            open_position = False
-                            print("[ERROR] No se pudo abrir LONG, orden rechazada.")
-
-
-                    elif signal == -1:
-                        side = 'short'
-                        open_time = current_time
-                        open_price = current_price
-                        quantity = order_mgr.calculate_position_size(current_price, side=side)
-                        stop_loss_price = open_price * (1 + sl_pct)
-                        take_profit_price = open_price * (1 - tp_pct)
-
-                        order_response = order_mgr.create_market_order('sell', quantity)
-
-                        if order_response is not None and 'orderId' in order_response:
-                            open_position = True
-                            side = 'short'
-                            open_time = current_time
-                            open_price = current_price
-                            print(f"[OPEN SHORT] time={current_time_str}, price={open_price}, qty={quantity}, SL={stop_loss_price}, TP={take_profit_price}")
-                        else:
-                            open_position = False
-                            print("[ERROR] No se pudo abrir SHORT, orden rechazada.")
-
-                else:
-                    elapsed_minutes = (current_time - open_time).total_seconds() / 60.0
-                    close_position = False
-                    reason = None
-
-                    if side == 'long':
-                        if current_price <= stop_loss_price:
-                            reason = "StopLoss"
-                            close_position = True
-                        elif current_price >= take_profit_price:
-                            reason = "TakeProfit"
-                            close_position = True
-                        elif elapsed_minutes >= MAX_HOLD_MINUTES:
-                            reason = "TimeOut"
-                            close_position = True
-
-                        if close_position:
-                            order_mgr.create_market_order('sell', quantity)
-                            pnl_gross = (current_price - open_price) * quantity
-                            fee = abs(pnl_gross) * 0.0004
-                            pnl_net = pnl_gross - fee
-
-                    elif side == 'short':
-                        if current_price >= stop_loss_price:
-                            reason = "StopLoss"
-                            close_position = True
-                        elif current_price <= take_profit_price:
-                            reason = "TakeProfit"
-                            close_position = True
-                        elif elapsed_minutes >= MAX_HOLD_MINUTES:
-                            reason = "TimeOut"
-                            close_position = True
-
-                        if close_position:
-                            order_mgr.create_market_order('buy', quantity)
-                            pnl_gross = (open_price - current_price) * quantity
-                            fee = abs(pnl_gross) * 0.0004
-                            pnl_net = pnl_gross - fee
-
-                    if close_position:
-                        db.insert_trade(
-                            symbol=SYMBOL,
-                            strategy='Scalping_OpenAI',
-                            side=side,
-                            quantity=quantity,
-                            open_time=open_time.strftime('%Y-%m-%d %H:%M:%S'),
-                            open_price=open_price,
-                            close_time=current_time_str,
-                            close_price=current_price,
-                            fees=fee,
-                            pnl=pnl_net,
-                            reason=reason
-                        )
-                        open_position = False
-                        print(f"[CLOSE {side.upper()}] time={current_time_str}, price={current_price}, PnL={pnl_net:.2f}, reason={reason}")
-
-            else:
-                print("[DEBUG] No se recibió vela nueva.")
-
-            time.sleep(60)
-
-        except Exception as e:
-            print(f"Error en el loop principal: {e}")
-            time.sleep(10)
+    # 1500 velas de 1m = 100 velas de 15m; se completan con las guardadas en
+    # ohlcv y 5m/15m se construyen a partir de ellas
+    base = trader.base_timeframe
+    since = pd.Timestamp.now('UTC') - pd.Timedelta(minutes=1500)
+    stored = db.fetch_ohlcv_data(timeframe=base, start=since)
+    recent = fetcher.fetch_ohlcv(timeframe=base, limit=1000)
+    history = (pd.concat([stored, recent])
+               .drop_duplicates('timestamp', keep='last')
+               .sort_values('timestamp')
+               .tail(1500)
+               .reset_index(drop=True))
+    seeded = trader.seed_history(history)
+
+    # Una sola petición por vela: la de 1m; 5m y 15m se agregan en el trader
+    poller = AsyncCandlePoller(timeframes=(base,))
+    # se publican todas las velas cerradas desde el final del histórico
+    if not seeded.empty:
+        poller.last_published[base] = to_epoch_ms(seeded['timestamp'].iloc[-1])
+    def on_candles(candles):
+        trader.on_candles(candles)
+        # percentiles de latencia de decisión cada `report_every` velas
+        if trader.latency.counts['on_candles'] % report_every == 0:
+            print("[INFO] Latencias:", trader.metrics())
+
+    asyncio.run(poller.run(on_candles))
 
 
 
 def main():
-    import sys
     parser = argparse.ArgumentParser()
-    parser.add_argument('--mode', choices=['backtest','live'], default='backtest')
+    parser.add_argument('--mode', choices=['backtest','live','replay','portfolio','sweep','walkforward','backfill','export'], default='backtest')
+    parser.add_argument('--engine', choices=['vectorized','loop'], default='vectorized',
+                        help="Motor de backtest: 'vectorized' o 'loop' (referencia vela a vela)")
+    parser.add_argument('--exit-model', choices=['close','intrabar'], default='close',
+                        help="SL/TP contra el close o contra el high/low de la vela")
+    parser.add_argument('--ambiguity', choices=list(AMBIGUITY_RULES), default='stop_first',
+                        help="Qué nivel se asume primero si una vela toca SL y TP")
+    parser.add_argument('--lower-tf', default=None,
+                        help="Marco temporal menor (p. ej. 1s) para resolver velas ambiguas")
+    parser.add_argument('--replay-openai', action='store_true',
+                        help="En --mode replay, decide con OpenAI (respuestas cacheadas en llm_cache.db)")
+    parser.add_argument('--llm-timeout', type=float, default=5.0,
+                        help="Segundos máximos de espera al modelo antes de usar la señal local")
+    parser.add_argument('--sweep-method', choices=['grid','random','lhs'], default='grid')
+    parser.add_argument('--samples', type=int, default=50,
+                        help="Combinaciones a muestrear con --sweep-method random/lhs")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--train', default='14D',
+                        help="Duración de la ventana de entrenamiento en --mode walkforward")
+    parser.add_argument('--test', default='3D',
+                        help="Duración de la ventana de test (y avance) en --mode walkforward")
+    parser.add_argument('--mc-samples', type=int, default=1000,
+                        help="Secuencias del bootstrap Monte Carlo (0 lo desactiva)")
+    parser.add_argument('--start', default=None, help="Inicio del backtest o replay (p. ej. 2024-01-01)")
+    parser.add_argument('--end', default=None, help="Fin (exclusivo) del backtest o replay")
+    parser.add_argument('--symbols', default=SYMBOL,
+                        help="Símbolos separados por coma para --mode backfill/export/portfolio")
+    parser.add_argument('--timeframes', default=TIMEFRAME,
+                        help="Marcos temporales separados por coma para --mode backfill/export")
+    parser.add_argument('--max-exposure', type=float, default=1.0,
+                        help="En --mode portfolio, nominal abierto máximo como múltiplo del capital")
+    parser.add_argument('--report', default=None,
+                        help="Ruta del informe JSON de métricas (backtest/portfolio) o "
+                             "directorio de informes por combinación (sweep)")
+    parser.add_argument('--archive', default=None,
+                        help="Directorio del archivo columnar: destino de --mode export y "
+                             "origen de las velas en backtest/sweep (por defecto la tabla ohlcv)")
     args = parser.parse_args()
 
     if args.mode == 'backtest':
-        run_backtest()
+        run_backtest(engine=args.engine, start=args.start, end=args.end,
+                     exit_model=args.exit_model, ambiguity=args.ambiguity, lower_tf=args.lower_tf,
+                     archive_path=args.archive, report=args.report)
+    elif args.mode == 'portfolio':
+        run_portfolio(args.symbols.split(','), start=args.start, end=args.end,
+                      exit_model=args.exit_model, ambiguity=args.ambiguity,
+                      max_exposure=args.max_exposure, archive_path=args.archive,
+                      report=args.report)
+    elif args.mode == 'backfill':
+        if not args.start:
+            parser.error("--mode backfill requiere --start")
+        run_backfill(args.symbols.split(','), args.timeframes.split(','), args.start, args.end)
+    elif args.mode == 'sweep':
+        run_sweep(method=args.sweep_method, samples=args.samples, workers=args.workers,
+                  start=args.start, end=args.end, archive_path=args.archive,
+                  report_dir=args.report)
+    elif args.mode == 'walkforward':
+        run_walkforward(args.train, args.test, method=args.sweep_method, samples=args.samples,
+                        workers=args.workers, mc_samples=args.mc_samples,
+                        start=args.start, end=args.end, archive_path=args.archive)
+    elif args.mode == 'export':
+        run_export(args.symbols.split(','), args.timeframes.split(','), args.archive,
+                   start=args.start, end=args.end)
+    elif args.mode == 'replay':
+        run_replay(start=args.start, end=args.end, use_openai=args.replay_openai,
+                   llm_timeout=args.llm_timeout)
     elif args.mode == 'live':
-        run_live_trading()
+        run_live_trading(llm_timeout=args.llm_timeout)
     else:
-        print("Modo inválido. Usa --mode backtest o --mode live.")
+        print("Modo inválido. Usa --mode backtest, portfolio, sweep, walkforward, backfill, export, replay o live.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,146 @@
+# market_data.py
+# Capa de datos asíncrona para el loop en vivo: consulta todos los marcos
+# temporales en paralelo justo al cierre de cada vela.
+import asyncio
+import time
+
+import pandas as pd
+
+from config import SYMBOL
+from timeutils import timeframe_to_ms
+
+
+class AsyncCandlePoller:
+    """
+    Publica las velas cerradas de varios marcos temporales.
+
+    transport: objeto con `async fetch_ohlcv(symbol, timeframe, since, limit)`
+    (por defecto ccxt.async_support.binance). Se puede inyectar otro para
+    pruebas o para reproducir datos.
+    Cada ciclo se despierta al cierre de la vela más corta (+ close_delay
+    segundos), pide todos los marcos a la vez y llama a on_candles con un
+    dict {timeframe: vela} por cada instante de cierre aún no publicado, en
+    orden (varios si un ciclo se retrasó).
+    """
+
+    def __init__(self, symbol=SYMBOL, timeframes=('1m', '5m', '15m'), transport=None,
+                 close_delay=1.0, retry_delay=0.5, max_retries=5, error_delay=10.0,
+                 clock=time.time):
+        if transport is None:
+            import ccxt.async_support as ccxt_async
+            transport = ccxt_async.binance({'enableRateLimit': True})
+        self.transport = transport
+        self.symbol = symbol
+        self.timeframes = tuple(timeframes)
+        self.steps = {tf: timeframe_to_ms(tf) for tf in self.timeframes}
+        self.base_timeframe = min(self.timeframes, key=self.steps.get)
+        self.close_delay = close_delay
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        # espera tras un error del exchange o de on_candles antes de reintentar
+        self.error_delay = error_delay
+        self.clock = clock
+        self.last_published = {tf: None for tf in self.timeframes}
+        self.last_latency = None  # segundos desde el cierre hasta publicar
+
+    async def fetch_closed(self, timeframe):
+        """
+        Velas cerradas del marco temporal aún no publicadas, en orden. Se
+        piden desde la siguiente a la última publicada, así que tras un ciclo
+        lento o una reconexión llegan todas las que faltan; la primera vez
+        solo se toma la última cerrada.
+        """
+        step = self.steps[timeframe]
+        last = self.last_published[timeframe]
+        if last is None:
+            ohlcvs = await self.transport.fetch_ohlcv(self.symbol, timeframe=timeframe, limit=2)
+        else:
+            ohlcvs = await self.transport.fetch_ohlcv(self.symbol, timeframe=timeframe, since=last + step)
+        now_ms = int(self.clock() * 1000)
+        closed = [row for row in ohlcvs
+                  if row[0] + step <= now_ms and (last is None or row[0] > last)]
+        if last is None:
+            closed = closed[-1:]
+        if not closed:
+            return []
+        self.last_published[timeframe] = closed[-1][0]
+        return [{
+            'timestamp': pd.to_datetime(ts, unit='ms'),
+            'open': o,
+            'high': h,
+            'low': l,
+            'close': c,
+            'volume': v
+        } for ts, o, h, l, c, v in closed]
+
+    async def _poll(self):
+        # {cierre en ms: {timeframe: vela}}: las velas que cierran a la vez van juntas
+        results = await asyncio.gather(*(self.fetch_closed(tf) for tf in self.timeframes))
+        batches = {}
+        for tf, candles in zip(self.timeframes, results):
+            for candle in candles:
+                close_ms = candle['timestamp'].value // 1_000_000 + self.steps[tf]
+                batches.setdefault(close_ms, {})[tf] = candle
+        return batches
+
+    async def poll_once(self):
+        """
+        Pide todos los marcos temporales concurrentemente y devuelve las
+        velas cerradas nuevas como lista de dicts {timeframe: vela}, uno por
+        instante de cierre y en orden.
+        """
+        batches = await self._poll()
+        return [batches[close_ms] for close_ms in sorted(batches)]
+
+    def seconds_to_next_close(self):
+        step = self.steps[self.base_timeframe] / 1000.0
+        now = self.clock()
+        return (step - now % step) + self.close_delay
+
+    async def run(self, on_candles):
+        """
+        Bucle principal: espera al cierre de vela, publica y repite.
+        on_candles puede ser una función normal o una corrutina. Un error en
+        un ciclo (red, exchange o on_candles) se registra y se reintenta tras
+        error_delay segundos; solo la cancelación termina el bucle.
+        """
+        try:
+            while True:
+                await asyncio.sleep(self.seconds_to_next_close())
+                try:
+                    await self._cycle(on_candles)
+                except Exception as e:
+                    print(f"[ERROR] Ciclo de datos de mercado fallido: {e}. Reintento en {self.error_delay}s.")
+                    await asyncio.sleep(self.error_delay)
+        finally:
+            await self.close()
+
+    async def _cycle(self, on_candles):
+        batches = await self._poll()
+        # el exchange puede tardar un instante en cerrar la vela base
+        retries = 0
+        while (not any(self.base_timeframe in b for b in batches.values())
+               and retries < self.max_retries):
+            await asyncio.sleep(self.retry_delay)
+            for close_ms, candles in (await self._poll()).items():
+                batches.setdefault(close_ms, {}).update(candles)
+            retries += 1
+
+        if not batches:
+            print("[DEBUG] No se recibió vela nueva.")
+            return
+        if len(batches) > 1:
+            print(f"[INFO] Publicando {len(batches)} cierres pendientes en orden.")
+
+        for close_ms in sorted(batches):
+            candles = batches[close_ms]
+            if self.base_timeframe in candles:
+                self.last_latency = self.clock() - close_ms / 1000.0
+            result = on_candles(candles)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def close(self):
+        close = getattr(self.transport, 'close', None)
+        if close is not None:
+            await close()
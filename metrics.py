@@ -0,0 +1,164 @@
+# metrics.py
+# Métricas de rendimiento de un backtest: curva de capital marcada a mercado
+# vela a vela y estadísticas sobre ella, todo con operaciones de NumPy para
+# poder calcularlas en cada iteración de un barrido.
+import json
+
+import numpy as np
+
+from config import INITIAL_CAPITAL
+
+MS_PER_YEAR = 365 * 24 * 3600 * 1000  # el mercado cripto no cierra
+
+
+class TradeLedger:
+    """
+    Trades cerrados de una ejecución con las velas de apertura y cierre,
+    que la tabla trades no guarda. column es el símbolo en un panel de
+    cartera (0 con un solo símbolo).
+    """
+
+    def __init__(self):
+        self.open_index = []
+        self.close_index = []
+        self.column = []
+        self.signed_qty = []
+        self.open_price = []
+        self.pnl = []
+        self.fees = []
+        self.reason = []
+
+    def add(self, open_index, close_index, trade, column=0):
+        self.open_index.append(open_index)
+        self.close_index.append(close_index)
+        self.column.append(column)
+        qty = trade['quantity']
+        self.signed_qty.append(qty if trade['side'] == 'long' else -qty)
+        self.open_price.append(trade['open_price'])
+        self.pnl.append(trade['pnl'])
+        self.fees.append(trade['fees'])
+        self.reason.append(trade['reason'])
+
+    def __len__(self):
+        return len(self.pnl)
+
+    def arrays(self):
+        return {
+            'open_index': np.asarray(self.open_index, dtype=np.int64),
+            'close_index': np.asarray(self.close_index, dtype=np.int64),
+            'column': np.asarray(self.column, dtype=np.int64),
+            'signed_qty': np.asarray(self.signed_qty, dtype=float),
+            'open_price': np.asarray(self.open_price, dtype=float),
+            'pnl': np.asarray(self.pnl, dtype=float),
+            'fees': np.asarray(self.fees, dtype=float),
+            'reason': np.asarray(self.reason, dtype=object),
+        }
+
+
+def equity_curve(close, ledger, initial_capital=INITIAL_CAPITAL):
+    """
+    Capital marcado a mercado al close de cada vela: capital realizado más
+    el PnL bruto de las posiciones abiertas. close es 1-D o 2-D (velas x
+    símbolos, NaN sin cotizar). Devuelve (equity, in_market), con
+    in_market True en las velas con alguna posición abierta (de la vela de
+    entrada a la anterior a la de salida, cuando el PnL pasa a realizado).
+    """
+    close = np.asarray(close, dtype=float)
+    n = close.shape[0]
+    t = ledger.arrays()
+    opened, closed = t['open_index'], t['close_index']
+
+    realized = np.zeros(n + 1)
+    np.add.at(realized, closed, t['pnl'])
+    equity = initial_capital + np.cumsum(realized[:n])
+
+    open_count = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(open_count, opened, 1)
+    np.add.at(open_count, closed, -1)
+    in_market = np.cumsum(open_count[:n]) > 0
+
+    # posición y coste de entrada acumulados por símbolo: PnL latente = pos * close - coste
+    for column in np.unique(t['column']):
+        mine = t['column'] == column
+        delta = np.zeros(n + 1)
+        cost = np.zeros(n + 1)
+        np.add.at(delta, opened[mine], t['signed_qty'][mine])
+        np.add.at(delta, closed[mine], -t['signed_qty'][mine])
+        np.add.at(cost, opened[mine], t['signed_qty'][mine] * t['open_price'][mine])
+        np.add.at(cost, closed[mine], -t['signed_qty'][mine] * t['open_price'][mine])
+        position = np.cumsum(delta[:n])
+        basis = np.cumsum(cost[:n])
+        prices = close if close.ndim == 1 else close[:, column]
+        holding = position != 0
+        equity[holding] += position[holding] * prices[holding] - basis[holding]
+    return equity, in_market
+
+
+def _drawdown(equity, initial_capital):
+    """(máximo drawdown relativo, su duración máxima en velas)."""
+    curve = np.concatenate(([initial_capital], equity))
+    peak = np.maximum.accumulate(curve)
+    max_dd = float(np.max((peak - curve) / peak))
+    index = np.arange(len(curve))
+    last_peak = np.maximum.accumulate(np.where(curve >= peak, index, 0))
+    return max_dd, int(np.max(index - last_peak))
+
+
+def performance(equity, in_market, ledger, bar_ms=60_000, initial_capital=INITIAL_CAPITAL):
+    """
+    Estadísticas de una ejecución como dict de números (listo para JSON):
+    rentabilidad, drawdown marcado a mercado y su duración, Sharpe y
+    Sortino anualizados con los retornos por vela, exposición (fracción de
+    velas con posición), win rate, profit factor y desglose por motivo de
+    cierre.
+    """
+    t = ledger.arrays()
+    final_equity = float(equity[-1]) if len(equity) else float(initial_capital)
+    report = {
+        'final_equity': final_equity,
+        'total_return': final_equity / initial_capital - 1.0,
+        'bars': int(len(equity)),
+    }
+
+    curve = np.concatenate(([initial_capital], equity))
+    returns = np.diff(curve) / curve[:-1]
+    scale = np.sqrt(MS_PER_YEAR / bar_ms)
+    mean = returns.mean() if len(returns) else 0.0
+    std = returns.std() if len(returns) else 0.0
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2)) if len(returns) else 0.0
+    report['sharpe'] = float(mean / std * scale) if std > 0 else 0.0
+    report['sortino'] = float(mean / downside * scale) if downside > 0 else 0.0
+    report['max_drawdown'], report['max_drawdown_bars'] = _drawdown(equity, initial_capital)
+    report['exposure'] = float(in_market.mean()) if len(in_market) else 0.0
+
+    pnl = t['pnl']
+    wins = pnl > 0
+    gains = float(pnl[wins].sum())
+    losses = float(-pnl[pnl < 0].sum())
+    report['trades'] = int(len(pnl))
+    report['win_rate'] = float(wins.mean()) if len(pnl) else 0.0
+    report['profit_factor'] = gains / losses if losses > 0 else None
+    report['avg_pnl'] = float(pnl.mean()) if len(pnl) else 0.0
+    report['fees'] = float(t['fees'].sum())
+
+    by_reason = {}
+    if len(pnl):
+        reasons, inverse = np.unique(t['reason'].astype(str), return_inverse=True)
+        counts = np.bincount(inverse)
+        won = np.bincount(inverse, weights=wins)
+        total = np.bincount(inverse, weights=pnl)
+        for k, reason in enumerate(reasons):
+            by_reason[str(reason)] = {'trades': int(counts[k]),
+                                      'win_rate': float(won[k] / counts[k]),
+                                      'pnl': float(total[k])}
+    report['by_reason'] = by_reason
+    return report
+
+
+def write_report(path, report, **extra):
+    """
+    Guarda el informe (más los campos de extra, p. ej. los parámetros) como
+    JSON compacto en una sola línea.
+    """
+    with open(path, 'w') as f:
+        json.dump({**extra, **report}, f, separators=(',', ':'), default=float)
@@ -3,10 +3,134 @@ from config import API_KEY, SECRET_KEY, SYMBOL, INVESTMENT_AMOUNT, ALLOW_CROSS_M
 import numpy as np
 from binance_connect import BinanceHMACClient
 import math
+import threading
+import time
+
+
+class AccountStateCache:
+    """
+    Copia en memoria de los saldos spot y de margen. Se refresca desde la API
+    en segundo plano y se ajusta con cada orden ejecutada, para que las
+    salidas no tengan que consultar la cuenta antes de enviar la orden.
+    """
+
+    def __init__(self, client, max_age=30.0, include_margin=ALLOW_CROSS_MARGIN):
+        self.client = client
+        self.max_age = max_age
+        self.include_margin = include_margin
+        self.spot = {}
+        self.margin = {}
+        self.updated_at = None
+        # número de fills aplicados: un refresh que se solapa con un fill
+        # no sobrescribe los saldos (la foto de la API puede no incluirlo)
+        self.fill_seq = 0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """
+        Recarga los saldos desde la API. Devuelve True si lo consiguió. Si
+        entre la consulta y la escritura se aplicó algún fill se descarta la
+        respuesta (podría ser anterior a la orden) y se conserva el cache
+        ajustado, que se corrige en el siguiente refresh.
+        """
+        with self.lock:
+            seq = self.fill_seq
+        account_info = self.client.get_account_info()
+        if account_info is None:
+            return False
+        spot = {b["asset"]: float(b["free"]) for b in account_info.get("balances", [])}
+
+        margin = None
+        if self.include_margin:
+            margin_info = self.client.get_margin_account_info()
+            if margin_info is not None:
+                margin = {a["asset"]: float(a["free"]) for a in margin_info.get("userAssets", [])}
+
+        with self.lock:
+            if self.fill_seq != seq:
+                print("[INFO] Fill durante el refresh de la cuenta; se descarta la respuesta.")
+                return False
+            self.spot = spot
+            if margin is not None:
+                self.margin = margin
+            self.updated_at = time.monotonic()
+        return True
+
+    def is_fresh(self):
+        return self.updated_at is not None and time.monotonic() - self.updated_at <= self.max_age
+
+    def ensure_fresh(self):
+        # si el hilo de fondo no llegó a tiempo se consulta de forma síncrona
+        if not self.is_fresh():
+            self.refresh()
+
+    def spot_free(self, asset):
+        with self.lock:
+            return self.spot.get(asset, 0.0)
+
+    def margin_free(self, asset):
+        with self.lock:
+            return self.margin.get(asset, 0.0)
+
+    def apply_fill(self, order_response, base_asset, quote_asset, margin=False):
+        """
+        Ajusta los saldos con la respuesta de una orden (executedQty y
+        cummulativeQuoteQty) y descuenta las comisiones de `fills`
+        (commission en commissionAsset, que puede ser la base, la quote o
+        BNB). Sin `fills` (respuesta ACK/RESULT) el siguiente refresh las
+        corrige.
+        """
+        if not order_response or 'executedQty' not in order_response:
+            return
+        base_qty = float(order_response['executedQty'])
+        quote_qty = float(order_response.get('cummulativeQuoteQty', 0.0))
+        sign = 1 if order_response.get('side') == 'BUY' else -1
+        with self.lock:
+            balances = self.margin if margin else self.spot
+            balances[base_asset] = balances.get(base_asset, 0.0) + sign * base_qty
+            balances[quote_asset] = balances.get(quote_asset, 0.0) - sign * quote_qty
+            for fill in order_response.get('fills', ()):
+                asset = fill.get('commissionAsset')
+                if asset:
+                    balances[asset] = balances.get(asset, 0.0) - float(fill.get('commission', 0.0))
+            self.fill_seq += 1
+
+    def start(self, interval=10.0):
+        """Refresca los saldos cada `interval` segundos en un hilo daemon."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[ERROR] No se pudo refrescar la cuenta: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="account-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
 
 class OrderManager:
-    def __init__(self):
-        self.client = BinanceHMACClient(api_key=API_KEY, secret_key=SECRET_KEY)
+    def __init__(self, client=None, refresh_interval=10.0, max_age=30.0, background_refresh=True):
+        """
+        refresh_interval / max_age: cada cuánto se refrescan los saldos en
+        segundo plano y la antigüedad máxima aceptada antes de consultar la
+        API en la propia orden.
+        """
+        self.client = client if client is not None else BinanceHMACClient(api_key=API_KEY, secret_key=SECRET_KEY)
+        self.account = AccountStateCache(self.client, max_age=max_age)
+        if background_refresh:
+            self.account.start(refresh_interval)
+            # el desfase de reloj se mide fuera del camino de las órdenes
+            if getattr(self.client, 'clock', None) is not None:
+                self.client.clock.start()
 
     def calculate_position_size(self, current_price, side='long'):
         usd_to_invest = 5.0  # <--- ahora mínimo 5 USD para LONG y SHORT
@@ -21,43 +145,52 @@ class OrderManager:
         return qty
 
 
-    def create_market_order(self, side, quantity):
+    def create_market_order(self, side, quantity, price=None):
+        """
+        Envía una orden de mercado. Los saldos se leen del cache de cuenta;
+        `price` (p. ej. el último cierre) evita pedir el precio a la API
+        cuando hay que comprobar el margen.
+        """
         symbol = SYMBOL.replace("/", "")
         base_asset, quote_asset = SYMBOL.split('/')
 
         if side.lower() in ["buy", "long"]:
             binance_side = "BUY"
-            return self.client.create_order(symbol, binance_side, "MARKET", quantity)
+            response = self.client.create_order(symbol, binance_side, "MARKET", quantity)
+            self.account.apply_fill(response, base_asset, quote_asset)
+            return response
 
         elif side.lower() in ["sell", "short"]:
             binance_side = "SELL"
 
-            # Verifica claramente saldo spot primero
-            account_info_spot = self.client.get_account_info()
-            spot_balance = next((float(b["free"]) for b in account_info_spot.get("balances", [])
-                                 if b["asset"] == base_asset), 0.0)
+            # Verifica claramente saldo spot primero (desde el cache)
+            self.account.ensure_fresh()
+            spot_balance = self.account.spot_free(base_asset)
 
             if spot_balance >= quantity:
                 print("[INFO] Usando saldo Spot suficiente para vender.")
-                return self.client.create_order(symbol, binance_side, "MARKET", quantity)
+                response = self.client.create_order(symbol, binance_side, "MARKET", quantity)
+                self.account.apply_fill(response, base_asset, quote_asset)
+                return response
 
             elif ALLOW_CROSS_MARGIN:
                 print("[INFO] Intentando Cross Margin por saldo spot insuficiente.")
 
-                price = self.client.get_symbol_price(symbol)
+                if price is None:
+                    price = self.client.get_symbol_price(symbol)
                 if price is None:
                     print("[ERROR] No se obtuvo el precio actual del símbolo.")
                     return None
 
                 required_margin = quantity * price
-                margin_info = self.client.get_margin_account_info()
-                margin_balance_usdt = next((float(asset["free"]) for asset in margin_info.get("userAssets", [])
-                                            if asset["asset"] == quote_asset), 0.0)
+                margin_balance_usdt = self.account.margin_free(quote_asset)
 
                 print(f"[DEBUG] Margen disponible (USDT): {margin_balance_usdt}, Margen requerido: {required_margin:.2f} USDT")
 
                 if margin_balance_usdt >= required_margin:
-                    return self.client.create_margin_order(symbol, binance_side, "MARKET", quantity, isIsolated="FALSE")
+                    response = self.client.create_margin_order(symbol, binance_side, "MARKET", quantity, isIsolated="FALSE")
+                    self.account.apply_fill(response, base_asset, quote_asset, margin=True)
+                    return response
                 else:
                     print(f"[ERROR] Margen insuficiente: disponible {margin_balance_usdt} USDT, necesario {required_margin:.2f} USDT.")
                     return None
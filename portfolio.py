@@ -0,0 +1,276 @@
+# portfolio.py
+# Backtest de cartera: la estrategia de breakout sobre varios símbolos
+# alineados en un índice temporal común (arrays 2-D velas x símbolos), con
+# un capital compartido y un límite de exposición.
+import heapq
+import time
+
+import numpy as np
+
+from timeutils import timeframe_to_ms
+from backtester import find_exit
+from db_manager import DBManager, TradeWriter
+from execution import ExecutionModel
+from metrics import TradeLedger, equity_curve, performance
+from position_engine import PositionEngine, exit_levels
+from strategy import ScalpingStrategy
+from config import (
+    TIMEFRAME,
+    INITIAL_CAPITAL, FEE_RATE,
+    MAX_HOLD_MINUTES
+)
+
+PANEL_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def align_panel(series, timeframe=TIMEFRAME):
+    """
+    series: {symbol: dict de arrays como DBManager.fetch_ohlcv_range}.
+    Devuelve el panel: dict con 'ts' (ms, rejilla regular de `timeframe`),
+    'symbols' y 'open'...'volume' como arrays 2-D (velas x símbolos).
+
+    Antes de la primera vela y después de la última de cada símbolo quedan
+    NaN (sin cotizar); los huecos intermedios se rellenan con velas planas
+    al close anterior y volumen 0, para que las salidas no salten velas.
+    """
+    symbols = [s for s, arrays in series.items() if len(arrays['ts'])]
+    step = timeframe_to_ms(timeframe)
+    if not symbols:
+        panel = {'ts': np.empty(0, dtype=np.int64), 'symbols': []}
+        panel.update({c: np.empty((0, 0)) for c in PANEL_COLUMNS})
+        return panel
+
+    t0 = min(int(series[s]['ts'][0]) for s in symbols) // step * step
+    t1 = max(int(series[s]['ts'][-1]) for s in symbols)
+    rows = (t1 - t0) // step + 1
+    panel = {'ts': t0 + np.arange(rows, dtype=np.int64) * step, 'symbols': symbols}
+    for column in PANEL_COLUMNS:
+        panel[column] = np.full((rows, len(symbols)), np.nan)
+
+    for j, symbol in enumerate(symbols):
+        arrays = series[symbol]
+        index = (np.asarray(arrays['ts'], dtype=np.int64) - t0) // step
+        for column in PANEL_COLUMNS:
+            panel[column][index, j] = arrays[column]
+
+        first, last = int(index[0]), int(index[-1]) + 1
+        close = panel['close'][first:last, j]
+        missing = np.isnan(close)
+        if missing.any():
+            # posición de la última vela real anterior a cada hueco
+            prev = np.maximum.accumulate(np.where(missing, 0, np.arange(len(close))))
+            filled = close[prev]
+            for column in ('open', 'high', 'low', 'close'):
+                panel[column][first:last, j][missing] = filled[missing]
+            panel['volume'][first:last, j][missing] = 0.0
+    return panel
+
+
+def load_panel(symbols, timeframe=TIMEFRAME, start=None, end=None, archive=None, db=None):
+    """
+    Panel de [start, end) para `symbols`, leído del archivo columnar si se
+    indica (OHLCVArchive) o de la tabla ohlcv.
+    """
+    if archive is None and db is None:
+        db = DBManager()
+    series = {}
+    for symbol in symbols:
+        if archive is not None:
+            series[symbol] = archive.load_range(symbol, timeframe, start=start, end=end)
+        else:
+            series[symbol] = db.fetch_ohlcv_range(symbol, timeframe, start=start, end=end)
+    return align_panel(series, timeframe)
+
+
+class PortfolioBacktester:
+    """
+    Mismas reglas por símbolo que Backtester (entrada al close de la vela de
+    la señal, salida por StopLoss/TakeProfit/TimeOut según el modelo de
+    ejecución, una posición por símbolo), pero con un capital común:
+
+    stop_loss_pct / take_profit_pct: None (por defecto) usa los niveles de
+        cada señal, como Backtester; un valor los fija para todas.
+    position_fraction: fracción del capital realizado que se asigna a cada
+        entrada (0.1 como el backtester de un símbolo).
+    max_exposure: tope de la suma del nominal de entrada de las posiciones
+        abiertas, como múltiplo del capital; las entradas que lo superan se
+        descartan (se cuentan en self.skipped).
+    block_size: símbolos por bloque al calcular los indicadores, para
+        limitar la memoria con paneles grandes.
+
+    En cada vela se liquidan primero las salidas y luego se procesan las
+    entradas, en orden de símbolo.
+    """
+
+    def __init__(self, symbols=None, strategy=None, db=None, persist=True,
+                 stop_loss_pct=None, take_profit_pct=None,
+                 max_hold_bars=MAX_HOLD_MINUTES, execution=None,
+                 position_fraction=0.1, max_exposure=1.0, block_size=32,
+                 archive=None, timeframe=TIMEFRAME):
+        self.symbols = list(symbols) if symbols else []
+        self.strategy = strategy if strategy else ScalpingStrategy(use_openai=False)
+        self._db = db
+        self.persist = persist
+        self.archive = archive
+        self.timeframe = timeframe
+        self.initial_capital = INITIAL_CAPITAL
+        self.fee_rate = FEE_RATE
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.max_hold_bars = max_hold_bars
+        self.execution = execution if execution is not None else ExecutionModel()
+        if self.execution.lower_ts is not None:
+            raise ValueError("lower_tf no está soportado en el backtest de cartera.")
+        self.position_fraction = position_fraction
+        self.max_exposure = max_exposure
+        self.block_size = block_size
+        self.skipped = 0
+        self.ledger = TradeLedger()
+        self.equity = np.empty(0)
+        self.in_market = np.empty(0, dtype=bool)
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = DBManager()
+        return self._db
+
+    def signals(self, panel):
+        """
+        (signals int8, sl_pct, tp_pct) como arrays velas x símbolos,
+        calculados por bloques de símbolos.
+        """
+        rows, width = panel['close'].shape
+        signals = np.zeros((rows, width), dtype=np.int8)
+        sl_pct = np.empty((rows, width))
+        tp_pct = np.empty((rows, width))
+        for j0 in range(0, width, self.block_size):
+            j1 = min(j0 + self.block_size, width)
+            block = {c: panel[c][:, j0:j1] for c in ('high', 'low', 'close', 'volume')}
+            signals[:, j0:j1], sl_pct[:, j0:j1], tp_pct[:, j0:j1] = \
+                self.strategy.generate_signals_panel(block)
+        # como el backtester de un símbolo, la primera vela no abre
+        if rows:
+            signals[0] = 0
+        if self.stop_loss_pct is not None:
+            sl_pct[:] = self.stop_loss_pct
+        if self.take_profit_pct is not None:
+            tp_pct[:] = self.take_profit_pct
+        return signals, sl_pct, tp_pct
+
+    def run_backtest(self, panel=None, start=None, end=None):
+        """
+        Ejecuta el backtest sobre `panel` (ver align_panel) o, si no se pasa,
+        sobre los símbolos del constructor en [start, end).
+        Devuelve (capital, trades_summary) con el símbolo en cada trade.
+        """
+        if panel is None:
+            panel = load_panel(self.symbols, self.timeframe, start=start, end=end,
+                               archive=self.archive,
+                               db=None if self.archive is not None else self.db)
+        if len(panel['ts']) == 0:
+            print("No hay datos en ohlcv.")
+            return self.initial_capital, []
+
+        self.ledger = TradeLedger()
+        writer = self.db.trade_writer() if self.persist else TradeWriter(persist=False)
+        with writer:
+            capital, trades_summary = self._simulate(panel, *self.signals(panel), writer)
+        self.equity, self.in_market = equity_curve(panel['close'], self.ledger,
+                                                   self.initial_capital)
+        return capital, trades_summary
+
+    def performance(self):
+        """Métricas de la última ejecución sobre la curva de capital de la cartera."""
+        return performance(self.equity, self.in_market, self.ledger,
+                           timeframe_to_ms(self.timeframe), self.initial_capital)
+
+    def _simulate(self, panel, signals, sl_pct, tp_pct, writer):
+        symbols = panel['symbols']
+        ts = panel['ts']
+        close = panel['close']
+        intrabar = self.execution.intrabar
+        if intrabar:
+            open_, high, low = panel['open'], panel['high'], panel['low']
+        else:
+            high = low = close
+        rows, width = close.shape
+        horizon = max(self.max_hold_bars, 1)
+
+        # velas con datos de cada símbolo (después solo hay NaN)
+        valid = ~np.isnan(close)
+        n_valid = np.where(valid.any(axis=0), rows - np.argmax(valid[::-1], axis=0), 0)
+
+        # un motor por símbolo para SL/TP y el PnL; el capital es común
+        engines = [PositionEngine(fee_rate=self.fee_rate, max_hold_bars=self.max_hold_bars,
+                                  capital=0.0, execution=self.execution) for _ in symbols]
+        busy_until = np.full(width, -1, dtype=np.int64)
+        pending = []  # (close_index, símbolo, reason, nominal)
+        capital = self.initial_capital
+        exposure = 0.0
+        trades_summary = []
+        self.skipped = 0
+
+        def bar_time(i):
+            # time.gmtime es mucho más barato que pd.Timestamp por trade
+            return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(ts[i]) // 1000))
+
+        def settle(close_index, j, reason, notional):
+            nonlocal capital, exposure
+            engine = engines[j]
+            price = close[close_index, j]
+            if reason != "TimeOut" and intrabar:
+                p = engine.position
+                reason, price = self.execution.check(
+                    p.is_long, open_[close_index, j], high[close_index, j],
+                    low[close_index, j], p.stop_price, p.take_price)
+            elif reason is None:
+                # empate contra el close (stop == take): gana el StopLoss, como en check_exit
+                reason = "StopLoss"
+            open_index = engine.position.open_index
+            trade = engine.close(float(price), bar_time(close_index), reason)
+            self.ledger.add(open_index, close_index, trade, column=j)
+            capital += trade['pnl']
+            exposure -= notional
+            writer.add(symbol=symbols[j], strategy='Scalping_Breakout', **trade)
+            trades_summary.append({
+                'symbol': symbols[j],
+                'open_time': trade['open_time'],
+                'close_time': trade['close_time'],
+                'side': trade['side'],
+                'pnl': trade['pnl'],
+                'reason': trade['reason']
+            })
+
+        entry_rows, entry_cols = np.nonzero(signals)
+        for t, j in zip(entry_rows.tolist(), entry_cols.tolist()):
+            while pending and pending[0][0] <= t:
+                settle(*heapq.heappop(pending))
+            if busy_until[j] >= t:
+                continue
+            notional = capital * self.position_fraction
+            if exposure + notional > self.max_exposure * capital:
+                self.skipped += 1
+                continue
+
+            price = float(close[t, j])
+            is_long = signals[t, j] == 1
+            sl, tp = float(sl_pct[t, j]), float(tp_pct[t, j])
+            stop_price, take_price = exit_levels(is_long, price, sl, tp)
+            found = find_exit(is_long, t, stop_price, take_price,
+                              high[:, j], low[:, j], horizon, n_valid[j])
+            engines[j].open('long' if is_long else 'short', price, notional / price,
+                            time=bar_time(t), index=t, stop_loss_pct=sl, take_profit_pct=tp)
+            exposure += notional
+            if found is None:
+                # sigue abierta al final de los datos: ocupa exposición y no se liquida
+                busy_until[j] = rows
+                continue
+            close_index, reason = found
+            busy_until[j] = close_index
+            heapq.heappush(pending, (close_index, j, reason, notional))
+
+        while pending:
+            settle(*heapq.heappop(pending))
+
+        return capital, trades_summary
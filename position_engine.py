@@ -0,0 +1,155 @@
+# position_engine.py
+# Máquina de estados de una posición (apertura -> SL/TP/TimeOut -> cierre)
+# compartida por el backtester y el trading en vivo.
+from config import (
+    INITIAL_CAPITAL, FEE_RATE,
+    STOP_LOSS_PCT, TAKE_PROFIT_PCT,
+    MAX_HOLD_MINUTES
+)
+
+
+def check_exit(is_long, price, stop_price, take_price, bars_held, max_hold_bars):
+    """
+    Motivo de cierre para el precio actual, o None si la posición sigue.
+    El orden de prioridad es StopLoss, TakeProfit y TimeOut.
+    """
+    if is_long:
+        if price <= stop_price:
+            return "StopLoss"
+        if price >= take_price:
+            return "TakeProfit"
+    else:
+        if price >= stop_price:
+            return "StopLoss"
+        if price <= take_price:
+            return "TakeProfit"
+    if bars_held >= max_hold_bars:
+        return "TimeOut"
+    return None
+
+
+def exit_levels(is_long, price, stop_loss_pct, take_profit_pct):
+    """(stop_price, take_price) de una entrada a `price`."""
+    if is_long:
+        return price * (1 - stop_loss_pct), price * (1 + take_profit_pct)
+    return price * (1 + stop_loss_pct), price * (1 - take_profit_pct)
+
+
+class Position:
+    __slots__ = ('side', 'is_long', 'quantity', 'open_price', 'open_time',
+                 'open_index', 'stop_price', 'take_price')
+
+    def __init__(self, side, quantity, open_price, open_time, open_index,
+                 stop_price, take_price):
+        self.side = side
+        self.is_long = side == 'long'
+        self.quantity = quantity
+        self.open_price = open_price
+        self.open_time = open_time
+        self.open_index = open_index
+        self.stop_price = stop_price
+        self.take_price = take_price
+
+
+class PositionEngine:
+    """
+    Una posición como máximo, alimentada vela a vela con on_bar. El tamaño de
+    la posición lo decide quien llama; el motor calcula SL/TP, detecta la
+    salida y liquida el PnL neto de comisiones sobre `capital`.
+
+    Los trades cerrados se devuelven como dict con las columnas de la tabla
+    trades (side, quantity, open_time, open_price, close_time, close_price,
+    fees, pnl, reason).
+    """
+    __slots__ = ('fee_rate', 'stop_loss_pct', 'take_profit_pct', 'max_hold_bars',
+                 'capital', 'position', 'execution')
+
+    def __init__(self, fee_rate=FEE_RATE, stop_loss_pct=STOP_LOSS_PCT,
+                 take_profit_pct=TAKE_PROFIT_PCT, max_hold_bars=MAX_HOLD_MINUTES,
+                 capital=INITIAL_CAPITAL, execution=None):
+        self.fee_rate = fee_rate
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.max_hold_bars = max_hold_bars
+        self.capital = capital
+        self.position = None
+        # ExecutionModel de execution.py; None equivale a salidas al close
+        self.execution = execution
+
+    def is_open(self):
+        return self.position is not None
+
+    def open(self, side, price, quantity, time=None, index=0,
+             stop_loss_pct=None, take_profit_pct=None):
+        """
+        Abre una posición. stop_loss_pct / take_profit_pct permiten niveles por
+        señal; por defecto se usan los del motor.
+        """
+        sl_pct = self.stop_loss_pct if stop_loss_pct is None else stop_loss_pct
+        tp_pct = self.take_profit_pct if take_profit_pct is None else take_profit_pct
+        stop_price, take_price = exit_levels(side == 'long', price, sl_pct, tp_pct)
+        self.position = Position(side, quantity, price, time, index, stop_price, take_price)
+        return self.position
+
+    def on_bar(self, price, index, time=None):
+        """
+        Evalúa la salida con el precio de la vela `index`. Devuelve el trade
+        cerrado o None.
+        """
+        reason = self.exit_reason(price, index)
+        if reason is None:
+            return None
+        return self.close(price, time, reason)
+
+    def exit_reason(self, price, index):
+        """
+        Motivo de cierre con el precio de la vela `index`, sin cerrar la
+        posición (p. ej. para enviar antes la orden), o None.
+        """
+        p = self.position
+        if p is None:
+            return None
+        return check_exit(p.is_long, price, p.stop_price, p.take_price,
+                          index - p.open_index, self.max_hold_bars)
+
+    def on_bar_ohlc(self, open_price, high, low, close, index, time=None, bar_time=None):
+        """
+        Como on_bar, pero con la vela completa: si el modelo de ejecución es
+        intrabar, SL/TP se evalúan con high/low y se ejecutan al nivel. El
+        TimeOut sigue cerrando al close.
+        """
+        p = self.position
+        if p is None:
+            return None
+        if self.execution is None or not self.execution.intrabar:
+            return self.on_bar(close, index, time)
+        hit = self.execution.check(p.is_long, open_price, high, low,
+                                   p.stop_price, p.take_price, bar_time)
+        if hit is not None:
+            reason, price = hit
+            return self.close(price, time, reason)
+        if index - p.open_index >= self.max_hold_bars:
+            return self.close(close, time, "TimeOut")
+        return None
+
+    def close(self, price, time, reason):
+        p = self.position
+        if p.is_long:
+            pnl_gross = (price - p.open_price) * p.quantity
+        else:
+            pnl_gross = (p.open_price - price) * p.quantity
+        fee = abs(pnl_gross) * self.fee_rate
+        pnl_net = pnl_gross - fee
+        self.capital += pnl_net
+        self.position = None
+        return {
+            'side': p.side,
+            'quantity': p.quantity,
+            'open_time': p.open_time,
+            'open_price': p.open_price,
+            'close_time': time,
+            'close_price': price,
+            'fees': fee,
+            'pnl': pnl_net,
+            'reason': reason,
+        }
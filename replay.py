@@ -0,0 +1,221 @@
+# replay.py
+# Reproduce velas de la tabla ohlcv a través del mismo camino que el trading
+# en vivo (AsyncCandlePoller -> LiveTrader -> order manager), con un reloj
+# virtual y un order manager simulado: sin red y sin esperar a cada vela.
+import asyncio
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from db_manager import DBManager
+from live_trader import LiveTrader, LIVE_TIMEFRAMES
+from market_data import AsyncCandlePoller
+from order_manager import OrderManager
+from strategy import ScalpingStrategy
+from timeutils import timeframe_to_ms, to_epoch_ms
+from config import DB_NAME, SYMBOL, INITIAL_CAPITAL, FEE_RATE
+
+
+class VirtualClock:
+    """Reloj en segundos epoch que solo avanza cuando se le indica."""
+
+    def __init__(self, start):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class ReplayTransport:
+    """
+    Sustituto de ccxt para AsyncCandlePoller: devuelve las velas guardadas
+    cuya apertura es anterior a la hora del reloj virtual (desde `since` si
+    se indica), como haría el exchange (la última puede estar aún abierta).
+    """
+
+    def __init__(self, data, clock):
+        self.data = data  # {timeframe: dict de arrays}
+        self.clock = clock
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        arrays = self.data[timeframe]
+        now_ms = int(self.clock.time() * 1000)
+        end = int(np.searchsorted(arrays['ts'], now_ms, side='right'))
+        if since is not None:
+            begin = min(int(np.searchsorted(arrays['ts'], since, side='left')), end)
+            if limit:
+                end = min(end, begin + limit)
+        else:
+            begin = max(end - (limit or end), 0)
+        return [
+            [int(arrays['ts'][i]), float(arrays['open'][i]), float(arrays['high'][i]),
+             float(arrays['low'][i]), float(arrays['close'][i]), float(arrays['volume'][i])]
+            for i in range(begin, end)
+        ]
+
+    def frame(self, timeframe, end_ms, bars):
+        """
+        Las últimas `bars` velas ya cerradas en end_ms, como DataFrame (para
+        el seed).
+        """
+        arrays = self.data[timeframe]
+        end = int(np.searchsorted(arrays['ts'], end_ms - timeframe_to_ms(timeframe), side='right'))
+        begin = max(end - bars, 0)
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(arrays['ts'][begin:end], unit='ms'),
+            'open': arrays['open'][begin:end],
+            'high': arrays['high'][begin:end],
+            'low': arrays['low'][begin:end],
+            'close': arrays['close'][begin:end],
+            'volume': arrays['volume'][begin:end],
+        })
+
+
+class OfflineClient:
+    """
+    Cliente del exchange para el OrderManager base en replay: la cuenta no se
+    consulta nunca (sin refresco en segundo plano) y no hay órdenes reales.
+    """
+    clock = None
+
+    def get_account_info(self):
+        return None
+
+    def get_margin_account_info(self):
+        return None
+
+
+class SimulatedOrderManager(OrderManager):
+    """
+    Mismo interfaz que OrderManager (calculate_position_size,
+    create_market_order) pero ejecuta al precio indicado, con comisión
+    FEE_RATE y un deslizamiento opcional en puntos básicos.
+    """
+
+    def __init__(self, quote_balance=INITIAL_CAPITAL, fee_rate=FEE_RATE, slippage_bps=0.0):
+        super().__init__(client=OfflineClient(), background_refresh=False)
+        self.fee_rate = fee_rate
+        self.slippage_bps = slippage_bps
+        self.base_balance = 0.0
+        self.quote_balance = quote_balance
+        self.orders = []
+        self._ids = itertools.count(1)
+
+    def create_market_order(self, side, quantity, price=None):
+        if price is None:
+            print("[ERROR] La orden simulada necesita precio.")
+            return None
+        is_buy = side.lower() in ["buy", "long"]
+        slip = self.slippage_bps / 10_000
+        fill = price * (1 + slip) if is_buy else price * (1 - slip)
+        quote = fill * quantity
+        commission = quote * self.fee_rate
+        if is_buy:
+            self.base_balance += quantity
+            self.quote_balance -= quote + commission
+        else:
+            self.base_balance -= quantity
+            self.quote_balance += quote - commission
+        response = {
+            'orderId': next(self._ids),
+            'status': 'FILLED',
+            'side': 'BUY' if is_buy else 'SELL',
+            'executedQty': str(quantity),
+            'cummulativeQuoteQty': str(quote),
+            'fills': [{'price': str(fill), 'qty': str(quantity), 'commission': str(commission),
+                       'commissionAsset': SYMBOL.split('/')[1]}],
+        }
+        self.orders.append(response)
+        return response
+
+
+class MemoryTrades:
+    """Recoge los trades de LiveTrader sin escribir en la tabla trades."""
+
+    def __init__(self):
+        self.trades = []
+
+    def insert_trade(self, **trade):
+        self.trades.append(trade)
+
+
+async def run_replay(trader, poller, clock, end_ms):
+    """
+    Avanza el reloj virtual de cierre en cierre hasta end_ms, publicando
+    las velas al trader. Registra en trader.latency el tiempo de consulta
+    ('poll') y de vela a decisión ('tick_to_decision').
+    """
+    cycles = 0
+    while True:
+        wait = poller.seconds_to_next_close()
+        # la siguiente vela base cierra después de end_ms: fin de los datos
+        if (clock.time() + wait - poller.close_delay) * 1000 > end_ms:
+            break
+        clock.advance(wait)
+        start = time.perf_counter()
+        batches = await poller.poll_once()
+        polled = time.perf_counter()
+        if not batches:
+            continue
+        for candles in batches:
+            trader.on_candles(candles)
+        done = time.perf_counter()
+        trader.latency.record('poll', polled - start)
+        trader.latency.record('tick_to_decision', done - start)
+        cycles += 1
+    return cycles
+
+
+def replay(start=None, end=None, symbol=SYMBOL, timeframes=LIVE_TIMEFRAMES,
+           strat=None, order_mgr=None, seed_bars=1500, db=None, verbose=False):
+    """
+    Reproduce [start, end) de la tabla ohlcv a través del LiveTrader.
+    Como en vivo, solo se publican las velas del marco más corto; el resto
+    los construye el LiveTrader. seed_bars son las velas base previas a
+    start que se cargan como histórico.
+    Devuelve el LiveTrader (trades en trader.db.trades, latencias en
+    trader.latency) tras imprimir un resumen.
+    """
+    db = db if db is not None else DBManager(DB_NAME)
+    base = min(timeframes, key=timeframe_to_ms)
+    step = timeframe_to_ms(base)
+    data = {base: db.fetch_ohlcv_range(symbol, base, end=end)}
+    base_ts = data[base]['ts']
+    if len(base_ts) == 0:
+        print("No hay datos en ohlcv.")
+        return None
+
+    start_ms = to_epoch_ms(start) if start is not None else int(base_ts[min(seed_bars, len(base_ts) - 1)])
+    end_ms = to_epoch_ms(end) if end is not None else int(base_ts[-1]) + step
+
+    clock = VirtualClock(start_ms / 1000.0)
+    transport = ReplayTransport(data, clock)
+    poller = AsyncCandlePoller(symbol=symbol, timeframes=(base,), transport=transport,
+                               clock=clock.time)
+    trader = LiveTrader(MemoryTrades(), strat or ScalpingStrategy(use_openai=False),
+                        order_mgr or SimulatedOrderManager(), timeframes,
+                        clock=clock.time, verbose=verbose)
+    seed_df = transport.frame(base, start_ms, seed_bars)
+    trader.seed_history(seed_df)
+    # las velas del seed no se vuelven a publicar
+    if not seed_df.empty:
+        poller.last_published[base] = to_epoch_ms(seed_df['timestamp'].iloc[-1])
+
+    wall_start = time.perf_counter()
+    cycles = asyncio.run(run_replay(trader, poller, clock, end_ms))
+    wall = time.perf_counter() - wall_start
+
+    trades = trader.db.trades
+    pnl = sum(t['pnl'] for t in trades)
+    print(f"[INFO] Replay: {cycles} ciclos en {wall:.2f}s, {len(trades)} trades, PnL={pnl:.4f}")
+    for key in ('poll', 'tick_to_decision'):
+        stats = trader.latency.stats(key)
+        if stats:
+            print(f"[INFO] {key}: p50={stats['p50']:.3f}ms p95={stats['p95']:.3f}ms "
+                  f"p99={stats['p99']:.3f}ms max={stats['max']:.3f}ms")
+    return trader
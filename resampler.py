@@ -0,0 +1,129 @@
+# resampler.py
+# Velas de N minutos construidas a partir de las de 1m: en bloque para el
+# histórico guardado y de forma incremental para el flujo en vivo.
+import numpy as np
+import pandas as pd
+
+from timeutils import timeframe_to_ms, to_epoch_ms
+
+
+def resample_arrays(arrays, step_ms):
+    """
+    Agrega velas (dict de arrays como fetch_ohlcv_range) a velas de step_ms,
+    alineadas a múltiplos de step_ms como las de Binance.
+    """
+    bucket = arrays['ts'] // step_ms * step_ms
+    ts, first = np.unique(bucket, return_index=True)
+    last = np.append(first[1:], len(bucket)) - 1
+    return {
+        'ts': ts,
+        'open': arrays['open'][first],
+        'high': np.maximum.reduceat(arrays['high'], first),
+        'low': np.minimum.reduceat(arrays['low'], first),
+        'close': arrays['close'][last],
+        'volume': np.add.reduceat(arrays['volume'], first),
+    }
+
+
+def resample_frame(df, timeframe, base_timeframe='1m', complete_only=True):
+    """
+    DataFrame OHLCV de `base_timeframe` -> DataFrame de `timeframe`.
+    complete_only descarta la última vela si aún no ha cerrado (su cierre
+    es posterior al de la última vela base).
+    """
+    step = timeframe_to_ms(timeframe)
+    base_step = timeframe_to_ms(base_timeframe)
+    ts = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    arrays = resample_arrays({
+        'ts': ts,
+        'open': df['open'].to_numpy(dtype=float),
+        'high': df['high'].to_numpy(dtype=float),
+        'low': df['low'].to_numpy(dtype=float),
+        'close': df['close'].to_numpy(dtype=float),
+        'volume': df['volume'].to_numpy(dtype=float),
+    }, step)
+    if complete_only and len(ts) and arrays['ts'][-1] + step > ts[-1] + base_step:
+        arrays = {name: values[:-1] for name, values in arrays.items()}
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(arrays['ts'], unit='ms'),
+        'open': arrays['open'],
+        'high': arrays['high'],
+        'low': arrays['low'],
+        'close': arrays['close'],
+        'volume': arrays['volume'],
+    })
+
+
+def align_to_base(base_df, higher_df, timeframe, base_timeframe='1m'):
+    """
+    Para cada vela base, índice en higher_df de la última vela de
+    `timeframe` ya cerrada cuando cierra la vela base (-1 si no hay
+    ninguna). Evita usar información del futuro al combinar marcos.
+    """
+    base_close = (base_df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+                  + timeframe_to_ms(base_timeframe))
+    higher_close = (higher_df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+                    + timeframe_to_ms(timeframe))
+    return np.searchsorted(higher_close, base_close, side='right') - 1
+
+
+class IncrementalResampler:
+    """
+    Construye las velas de `timeframes` a medida que llegan las velas
+    cerradas de base_timeframe. update() devuelve {timeframe: vela} con las
+    velas que se cierran: en cuanto llega la última vela base del periodo,
+    o al empezar el siguiente periodo si esa vela faltó.
+    """
+
+    def __init__(self, timeframes, base_timeframe='1m'):
+        self.base_ms = timeframe_to_ms(base_timeframe)
+        self.steps = {tf: timeframe_to_ms(tf) for tf in timeframes}
+        self.current = {tf: None for tf in self.steps}
+        self.emitted = {tf: False for tf in self.steps}
+        self.last_ts = None
+
+    def prime(self, df):
+        """Procesa histórico base sin devolver velas (para arrancar en vivo)."""
+        for row in df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].itertuples(index=False):
+            self.update(row._asdict())
+
+    def update(self, candle):
+        ts = to_epoch_ms(candle['timestamp'])
+        if self.last_ts is not None and ts <= self.last_ts:
+            return {}
+        self.last_ts = ts
+
+        closed = {}
+        for tf, step in self.steps.items():
+            bucket = ts // step * step
+            bar = self.current[tf]
+            if bar is not None and bar['ts'] != bucket:
+                if not self.emitted[tf]:
+                    closed[tf] = self._candle(bar)
+                bar = None
+            if bar is None:
+                bar = {'ts': bucket, 'open': candle['open'], 'high': candle['high'],
+                       'low': candle['low'], 'close': candle['close'], 'volume': candle['volume']}
+                self.emitted[tf] = False
+            else:
+                bar['high'] = max(bar['high'], candle['high'])
+                bar['low'] = min(bar['low'], candle['low'])
+                bar['close'] = candle['close']
+                bar['volume'] += candle['volume']
+            self.current[tf] = bar
+
+            if ts + self.base_ms >= bucket + step:
+                closed[tf] = self._candle(bar)
+                self.emitted[tf] = True
+        return closed
+
+    @staticmethod
+    def _candle(bar):
+        return {
+            'timestamp': pd.to_datetime(bar['ts'], unit='ms'),
+            'open': bar['open'],
+            'high': bar['high'],
+            'low': bar['low'],
+            'close': bar['close'],
+            'volume': bar['volume'],
+        }
@@ -0,0 +1,225 @@
+# signal_providers.py
+# Proveedores de señal a partir de los indicadores de la última vela de cada
+# marco temporal. El de OpenAI importa el paquete y crea el cliente solo al
+# primer uso: el backtest y los workers del barrido no lo cargan nunca.
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import pandas as pd
+
+from latency import LatencyTracker
+from llm_cache import snapshot_key
+
+OPENAI_MODEL = "gpt-4o-2024-11-20"
+# Subir al cambiar el texto del prompt: invalida las respuestas cacheadas
+PROMPT_VERSION = 2
+# Campos de cada snapshot que se envían al modelo; la clave del cache usa
+# exactamente estos (sin timestamp ni OHLC crudo, que cambian en cada vela)
+PROMPT_FIELDS = ('close', 'volume', 'high_n', 'low_n', 'vol_avg', 'vwap', 'rsi', 'ema', 'atr')
+
+
+def prompt_snapshot(snap):
+    """Los campos de PROMPT_FIELDS de un snapshot."""
+    return {k: snap[k] for k in PROMPT_FIELDS if k in snap}
+
+
+class SignalProvider(ABC):
+    """
+    Interfaz: decide(snap_1m, snap_5m, snap_15m) -> (signal, sl_pct, tp_pct),
+    con snapshots como los dicts de compute_indicators / IncrementalIndicators.
+    """
+
+    @abstractmethod
+    def decide(self, snap_1m, snap_5m, snap_15m):
+        """Señal (1 long, -1 short, 0 nada) y SL/TP en tanto por uno."""
+
+
+class RuleSignalProvider(SignalProvider):
+    """Regla de breakout local de la estrategia, sobre el snapshot de 1m."""
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+
+    def decide(self, snap_1m, snap_5m, snap_15m):
+        return self.strategy.generate_signal_rules(pd.DataFrame([snap_1m]))
+
+
+class OpenAISignalProvider(SignalProvider):
+    """
+    Decisión del modelo de OpenAI.
+
+    client: cliente con la interfaz de OpenAI (chat.completions.create); si
+    es None se crea al primer uso con OPENAI_API_KEY (o api_key).
+    cache: LLMCache opcional; snapshots con los mismos PROMPT_FIELDS (tras
+    cuantizar) reutilizan la respuesta guardada en lugar de consultar de
+    nuevo, aunque sean de velas distintas.
+    """
+
+    def __init__(self, client=None, cache=None, model=OPENAI_MODEL, api_key=None):
+        self._client = client
+        self.cache = cache
+        self.model = model
+        self.api_key = api_key
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            api_key = self.api_key
+            if api_key is None:
+                from config import OPENAI_API_KEY
+                api_key = OPENAI_API_KEY
+            self._client = OpenAI(api_key=api_key)
+        return self._client
+
+    def messages(self, snap_1m, snap_5m, snap_15m):
+        snap_1m, snap_5m, snap_15m = (prompt_snapshot(s) for s in (snap_1m, snap_5m, snap_15m))
+        return [
+            {"role": "system", "content": """
+            Eres un trader experto en scalping del par DOGE/USDT.
+            
+            Recibirás datos técnicos de los marcos temporales de 1, 5 y 15 minutos.
+            
+            Debes responder exactamente en este formato (sin añadir explicaciones, comentarios ni variaciones en el formato):
+            
+            Dirección inmediata: LONG | SHORT | NO_OP
+            STOP LOSS (%): valor%
+            TAKE PROFIT (%): valor%
+            
+            Ejemplo respuesta válida:
+            Dirección inmediata: LONG
+            STOP LOSS (%): 0.15%
+            TAKE PROFIT (%): 0.30%
+            
+            Usa un punto (.) como separador decimal. No uses paréntesis ni caracteres adicionales.
+            """},
+            {"role": "user", "content": f"""
+            Indicadores técnicos última vela:
+
+            Marco Temporal: 1 minuto:
+            {snap_1m}
+
+            Marco Temporal: 5 minutos:
+            {snap_5m}
+
+            Marco Temporal: 15 minutos:
+            {snap_15m}
+
+            Responde ahora con tu decisión.
+            """}
+        ]
+
+    def complete(self, messages):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0.0
+        )
+        return response.choices[0].message.content.strip()
+
+    def decide(self, snap_1m, snap_5m, snap_15m):
+        messages = self.messages(snap_1m, snap_5m, snap_15m)
+        if self.cache is None:
+            action_text = self.complete(messages)
+        else:
+            key = snapshot_key((snap_1m, snap_5m, snap_15m), self.model, PROMPT_VERSION,
+                               fields=PROMPT_FIELDS)
+            action_text = self.cache.get_or_compute(key, lambda: self.complete(messages))
+        print("[DEBUG] Respuesta OpenAI:", action_text)
+
+        signal, sl_pct, tp_pct = self.parse_response(action_text)
+        print("[DEBUG] Señal OpenAI:", signal, "SL:", sl_pct, "TP:", tp_pct)
+        return signal, sl_pct, tp_pct
+
+    @staticmethod
+    def parse_response(action_text):
+        """(signal, sl_pct, tp_pct) a partir del texto de respuesta."""
+        lines = action_text.split('\n')
+
+        action_map = {'LONG': 1, 'SHORT': -1, 'NO_OP': 0}
+
+        action = 0
+        stop_loss_pct = 0.002
+        take_profit_pct = 0.003
+
+        for line in lines:
+            if "Dirección inmediata" in line:
+                direction = line.split(":")[-1].strip()
+                action = action_map.get(direction, 0)
+            elif "STOP LOSS (%)" in line:
+                sl_value = line.split(":")[-1].strip().replace('%', '')
+                stop_loss_pct = float(sl_value) / 100
+            elif "TAKE PROFIT (%)" in line:
+                tp_value = line.split(":")[-1].strip().replace('%', '')
+                take_profit_pct = float(tp_value) / 100
+
+        return action, stop_loss_pct, take_profit_pct
+
+
+class DeadlineSignalProvider(SignalProvider):
+    """
+    Ejecuta `primary` en un hilo aparte y espera como mucho `timeout`
+    segundos; si no responde a tiempo (o falla) decide `fallback`. Una
+    respuesta tardía no se descarta del todo: si primary usa LLMCache queda
+    guardada para la próxima vez. Si ya hay `max_workers` llamadas
+    pendientes no se encola otra (esperaría detrás de ellas): se usa
+    directamente el fallback.
+
+    latency registra 'decision' (hasta tener señal, con o sin fallback) y
+    'primary' (llamadas de primary que terminaron dentro del plazo).
+    """
+
+    def __init__(self, primary, fallback, timeout=5.0, max_workers=2):
+        self.primary = primary
+        self.fallback = fallback
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="signal-provider")
+        self.max_workers = max_workers
+        self.pending = set()
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.busy = 0
+
+    def decide(self, snap_1m, snap_5m, snap_15m):
+        self.calls += 1
+        start = time.perf_counter()
+        self.pending = {f for f in self.pending if not f.done()}
+        if len(self.pending) >= self.max_workers:
+            self.busy += 1
+            result = self.fallback.decide(snap_1m, snap_5m, snap_15m)
+            self.latency.record('decision', time.perf_counter() - start)
+            return result
+
+        future = self.executor.submit(self.primary.decide, snap_1m, snap_5m, snap_15m)
+        self.pending.add(future)
+        try:
+            result = future.result(timeout=self.timeout)
+            self.latency.record('primary', time.perf_counter() - start)
+        except FutureTimeout:
+            self.timeouts += 1
+            print(f"[INFO] Sin respuesta en {self.timeout}s; se usa la señal local.")
+            result = self.fallback.decide(snap_1m, snap_5m, snap_15m)
+        except Exception as e:
+            self.errors += 1
+            print(f"[ERROR] Falló el proveedor de señal ({e}); se usa la señal local.")
+            result = self.fallback.decide(snap_1m, snap_5m, snap_15m)
+        self.latency.record('decision', time.perf_counter() - start)
+        return result
+
+    def metrics(self):
+        return {
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'busy': self.busy,
+            'fallback_rate': (self.timeouts + self.errors + self.busy) / self.calls if self.calls else 0.0,
+            'decision': self.latency.stats('decision'),
+            'primary': self.latency.stats('primary'),
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,28 +1,96 @@
 # strategy.py optimizado con integración OpenAI usando múltiples marcos temporales
 import pandas as pd
 import numpy as np
-from openai import OpenAI
 from config import (
     BREAKOUT_BARS, VOL_LOOKBACK, VWAP_PERIOD,
-    RSI_PERIOD, EMA_PERIOD, OPENAI_API_KEY )
+    RSI_PERIOD, EMA_PERIOD,
+    STOP_LOSS_PCT, TAKE_PROFIT_PCT )
+from signal_providers import (
+    OPENAI_MODEL, OpenAISignalProvider, RuleSignalProvider, DeadlineSignalProvider )
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-class ScalpingStrategy:
-    def __init__(self):
-        pass
+def _cached(cache, key, compute):
+    """
+    Memoiza una columna de indicador en `cache` (dict) bajo `key`. El cache
+    solo es válido para un mismo DataFrame de entrada.
+    """
+    if cache is None:
+        return compute()
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
 
-    def compute_indicators(self, df):
+class ScalpingStrategy:
+    def __init__(self, use_openai=True, rsi_overbought=70, rsi_oversold=30,
+                 sl_atr_mult=1.0, tp_atr_mult=1.5,
+                 breakout_bars=BREAKOUT_BARS, vol_lookback=VOL_LOOKBACK,
+                 vwap_period=VWAP_PERIOD, rsi_period=RSI_PERIOD,
+                 ema_period=EMA_PERIOD, llm_client=None, llm_cache=None,
+                 model=OPENAI_MODEL, signal_provider=None, llm_timeout=None):
+        """
+        use_openai: si es False, generate_signal usa la regla de breakout local
+        (generate_signals) en lugar de consultar a OpenAI.
+        Los periodos de los indicadores toman por defecto los valores de config.
+        llm_client, llm_cache, model: se pasan al OpenAISignalProvider, que
+        se crea (e importa openai) solo cuando se pide la primera señal.
+        signal_provider: SignalProvider propio; sustituye a los anteriores.
+        llm_timeout: plazo máximo en segundos para la respuesta del modelo;
+        si vence se usa la regla local (ver DeadlineSignalProvider).
+        """
+        self.use_openai = use_openai
+        self.llm_client = llm_client
+        self.llm_cache = llm_cache
+        self.model = model
+        self.llm_timeout = llm_timeout
+        self._provider = signal_provider
+        self.rsi_overbought = rsi_overbought
+        self.rsi_oversold = rsi_oversold
+        self.sl_atr_mult = sl_atr_mult
+        self.tp_atr_mult = tp_atr_mult
+        self.breakout_bars = breakout_bars
+        self.vol_lookback = vol_lookback
+        self.vwap_period = vwap_period
+        self.rsi_period = rsi_period
+        self.ema_period = ema_period
+
+    @property
+    def provider(self):
+        if self._provider is None:
+            if self.use_openai:
+                self._provider = OpenAISignalProvider(self.llm_client, self.llm_cache, self.model)
+                if self.llm_timeout is not None:
+                    self._provider = DeadlineSignalProvider(
+                        self._provider, RuleSignalProvider(self), self.llm_timeout)
+            else:
+                self._provider = RuleSignalProvider(self)
+        return self._provider
+
+    def compute_indicators(self, df, cache=None):
+        """
+        Añade las columnas de indicadores. Si se pasa `cache` (dict), las
+        columnas se reutilizan entre llamadas con los mismos periodos sobre el
+        mismo DataFrame, p. ej. en un barrido de parámetros.
+        """
         df = df.copy()
-        df['high_n'] = df['high'].rolling(BREAKOUT_BARS).max().shift(1)
-        df['low_n'] = df['low'].rolling(BREAKOUT_BARS).min().shift(1)
-        df['vol_avg'] = df['volume'].rolling(VOL_LOOKBACK).mean().shift(1)
-        typical_price = (df['high'] + df['low'] + df['close']) / 3
-        df['vwap'] = ((typical_price * df['volume']).rolling(VWAP_PERIOD).sum() /
-                      df['volume'].rolling(VWAP_PERIOD).sum()).shift(1)
-        df['rsi'] = self.compute_rsi(df['close'], RSI_PERIOD)
-        df['ema'] = df['close'].ewm(span=EMA_PERIOD, adjust=False).mean()
-        df['atr'] = self.compute_atr(df)
+        df['high_n'] = _cached(cache, ('high_n', self.breakout_bars),
+                               lambda: df['high'].rolling(self.breakout_bars).max().shift(1))
+        df['low_n'] = _cached(cache, ('low_n', self.breakout_bars),
+                              lambda: df['low'].rolling(self.breakout_bars).min().shift(1))
+        df['vol_avg'] = _cached(cache, ('vol_avg', self.vol_lookback),
+                                lambda: df['volume'].rolling(self.vol_lookback).mean().shift(1))
+
+        def vwap():
+            typical_price = (df['high'] + df['low'] + df['close']) / 3
+            return ((typical_price * df['volume']).rolling(self.vwap_period).sum() /
+                    df['volume'].rolling(self.vwap_period).sum()).shift(1)
+
+        df['vwap'] = _cached(cache, ('vwap', self.vwap_period), vwap)
+        df['rsi'] = _cached(cache, ('rsi', self.rsi_period),
+                            lambda: self.compute_rsi(df['close'], self.rsi_period))
+        df['ema'] = _cached(cache, ('ema', self.ema_period),
+                            lambda: df['close'].ewm(span=self.ema_period, adjust=False).mean())
+        df['atr'] = _cached(cache, ('atr', 14), lambda: self.compute_atr(df))
         return df
 
     def compute_rsi(self, series, period):
@@ -35,87 +103,146 @@ class ScalpingStrategy:
         rsi = 100 - (100 / (1 + rs))
         return rsi
 
-    def compute_atr(self, df, period=14):
-        df = df.copy()
-        df['tr'] = df.apply(lambda row: max(
-            row['high'] - row['low'],
-            abs(row['high'] - row['close']),
-            abs(row['low'] - row['close'])
-        ), axis=1)
-        atr = df['tr'].rolling(period).mean()
-        return atr
+    def compute_atr(self, df, period=14, method='sma', use_prev_close=False):
+        """
+        ATR calculado sobre arrays, sin copiar el DataFrame.
+        method: 'sma' (media móvil, comportamiento original), 'rma' (Wilder)
+        o 'ema'.
+        use_prev_close: si es True el rango verdadero usa el cierre anterior
+        (definición estándar); por defecto usa el cierre de la misma vela,
+        como la versión original.
+        df también puede ser un dict de arrays 2-D (ver
+        compute_indicators_panel).
+        """
+        high = np.asarray(df['high'], dtype=float)
+        low = np.asarray(df['low'], dtype=float)
+        close = np.asarray(df['close'], dtype=float)
+
+        if use_prev_close:
+            ref = np.empty_like(close)
+            ref[0] = np.nan
+            ref[1:] = close[:-1]
+        else:
+            ref = close
+
+        # fmax ignora el NaN de la primera vela cuando se usa el cierre anterior
+        tr = np.fmax(high - low, np.fmax(np.abs(high - ref), np.abs(low - ref)))
+        # 2-D (velas x símbolos) en modo cartera: una columna por símbolo
+        tr = pd.Series(tr, index=df.index) if tr.ndim == 1 else pd.DataFrame(tr)
+
+        if method == 'sma':
+            return tr.rolling(period).mean()
+        elif method == 'rma':
+            return tr.ewm(alpha=1.0 / period, adjust=False, min_periods=period).mean()
+        elif method == 'ema':
+            return tr.ewm(span=period, adjust=False, min_periods=period).mean()
+        raise ValueError(f"Método de ATR inválido: {method}")
 
     def generate_signal_openai(self, df_1m, df_5m, df_15m):
         df_1m = self.compute_indicators(df_1m)
         df_5m = self.compute_indicators(df_5m)
         df_15m = self.compute_indicators(df_15m)
 
-        messages = [
-            {"role": "system", "content": """
-            Eres un trader experto en scalping del par DOGE/USDT.
-            
-            Recibirás datos técnicos de los marcos temporales de 1, 5 y 15 minutos.
-            
-            Debes responder exactamente en este formato (sin añadir explicaciones, comentarios ni variaciones en el formato):
-            
-            Dirección inmediata: LONG | SHORT | NO_OP
-            STOP LOSS (%): valor%
-            TAKE PROFIT (%): valor%
-            
-            Ejemplo respuesta válida:
-            Dirección inmediata: LONG
-            STOP LOSS (%): 0.15%
-            TAKE PROFIT (%): 0.30%
-            
-            Usa un punto (.) como separador decimal. No uses paréntesis ni caracteres adicionales.
-            """},
-            {"role": "user", "content": f"""
-            Indicadores técnicos última vela:
-
-            Marco Temporal: 1 minuto:
-            {df_1m.iloc[-1].to_dict()}
-
-            Marco Temporal: 5 minutos:
-            {df_5m.iloc[-1].to_dict()}
-
-            Marco Temporal: 15 minutos:
-            {df_15m.iloc[-1].to_dict()}
-
-            Responde ahora con tu decisión.
-            """}
-        ]
-
-        response = client.chat.completions.create(
-            model="gpt-4o-2024-11-20",
-            messages=messages,
-            temperature=0.0
-        )
-
-        action_text = response.choices[0].message.content.strip()
-        print("[DEBUG] Respuesta OpenAI:", action_text)
-
-        lines = action_text.split('\n')
-
-        action_map = {'LONG': 1, 'SHORT': -1, 'NO_OP': 0}
-
-        action = 0
-        stop_loss_pct = 0.002
-        take_profit_pct = 0.003
-
-        for line in lines:
-            if "Dirección inmediata" in line:
-                direction = line.split(":")[-1].strip()
-                action = action_map.get(direction, 0)
-            elif "STOP LOSS (%)" in line:
-                sl_value = line.split(":")[-1].strip().replace('%', '')
-                stop_loss_pct = float(sl_value) / 100
-            elif "TAKE PROFIT (%)" in line:
-                tp_value = line.split(":")[-1].strip().replace('%', '')
-                take_profit_pct = float(tp_value) / 100
-
-        return action, stop_loss_pct, take_profit_pct
-
-    def generate_signal(self, df_1m, df_5m, df_15m):
-        signal, sl_pct, tp_pct = self.generate_signal_openai(df_1m, df_5m, df_15m)
-        print("[DEBUG] Señal OpenAI:", signal, "SL:", sl_pct, "TP:", tp_pct)
-        return signal, sl_pct, tp_pct
\ No newline at end of file
+        return self.ask_openai(df_1m.iloc[-1].to_dict(),
+                               df_5m.iloc[-1].to_dict(),
+                               df_15m.iloc[-1].to_dict())
+
+    def ask_openai(self, snap_1m, snap_5m, snap_15m):
+        """
+        Consulta al proveedor de señal con los indicadores de la última vela
+        de cada marco temporal (dicts con las columnas de compute_indicators).
+        """
+        return self.provider.decide(snap_1m, snap_5m, snap_15m)
+
+    def generate_signals(self, df):
+        """
+        Señales de breakout para todas las velas en una sola pasada vectorizada.
+        LONG: cierre sobre high_n con volumen > vol_avg, precio sobre vwap y ema
+        y RSI por debajo de sobrecompra. SHORT es el caso simétrico.
+        Devuelve (signals int8, sl_pct, tp_pct); SL/TP salen del ATR y usan los
+        valores de config mientras el ATR no está disponible.
+        """
+        if 'atr' not in df.columns:
+            df = self.compute_indicators(df)
+
+        columns = {name: df[name].to_numpy(dtype=float)
+                   for name in ('close', 'volume', 'high_n', 'low_n', 'vol_avg',
+                                'vwap', 'rsi', 'ema', 'atr')}
+        return self.signal_arrays(columns)
+
+    def signal_arrays(self, ind):
+        """
+        Regla de breakout sobre arrays (1-D o 2-D) de close, volume y los
+        indicadores: (signals int8, sl_pct, tp_pct) con la misma forma.
+        """
+        close = ind['close']
+        # las comparaciones con NaN dan False: sin señal durante el calentamiento
+        volume_ok = ind['volume'] > ind['vol_avg']
+        long_mask = ((close > ind['high_n']) & volume_ok & (close > ind['vwap']) &
+                     (close > ind['ema']) & (ind['rsi'] < self.rsi_overbought))
+        short_mask = ((close < ind['low_n']) & volume_ok & (close < ind['vwap']) &
+                      (close < ind['ema']) & (ind['rsi'] > self.rsi_oversold))
+
+        signals = np.zeros(close.shape, dtype=np.int8)
+        signals[long_mask] = 1
+        signals[short_mask] = -1
+
+        atr_pct = ind['atr'] / close
+        sl_pct = np.where(np.isnan(atr_pct), STOP_LOSS_PCT, atr_pct * self.sl_atr_mult)
+        tp_pct = np.where(np.isnan(atr_pct), TAKE_PROFIT_PCT, atr_pct * self.tp_atr_mult)
+
+        return signals, sl_pct, tp_pct
+
+    def compute_indicators_panel(self, panel):
+        """
+        compute_indicators para varios símbolos a la vez. panel: dict con
+        arrays 2-D (velas x símbolos) 'high', 'low', 'close' y 'volume'.
+        Devuelve un dict con los indicadores en arrays de la misma forma;
+        cada indicador es una sola operación de pandas sobre todas las
+        columnas. Los NaN iniciales (símbolo aún sin cotizar) dan NaN igual
+        que el calentamiento de compute_indicators.
+        """
+        high = pd.DataFrame(panel['high'])
+        low = pd.DataFrame(panel['low'])
+        close = pd.DataFrame(panel['close'])
+        volume = pd.DataFrame(panel['volume'])
+
+        typical_price = (high + low + close) / 3
+        vwap = ((typical_price * volume).rolling(self.vwap_period).sum() /
+                volume.rolling(self.vwap_period).sum()).shift(1)
+        return {
+            'high_n': high.rolling(self.breakout_bars).max().shift(1).to_numpy(),
+            'low_n': low.rolling(self.breakout_bars).min().shift(1).to_numpy(),
+            'vol_avg': volume.rolling(self.vol_lookback).mean().shift(1).to_numpy(),
+            'vwap': vwap.to_numpy(),
+            'rsi': self.compute_rsi(close, self.rsi_period).to_numpy(),
+            'ema': close.ewm(span=self.ema_period, adjust=False).mean().to_numpy(),
+            'atr': self.compute_atr(panel).to_numpy(),
+        }
+
+    def generate_signals_panel(self, panel):
+        """generate_signals para un panel (ver compute_indicators_panel)."""
+        ind = self.compute_indicators_panel(panel)
+        ind['close'] = np.asarray(panel['close'], dtype=float)
+        ind['volume'] = np.asarray(panel['volume'], dtype=float)
+        return self.signal_arrays(ind)
+
+    def generate_signal_rules(self, df_1m):
+        """
+        Señal offline de la última vela, sin red ni API key.
+        """
+        signals, sl_pct, tp_pct = self.generate_signals(df_1m)
+        return int(signals[-1]), float(sl_pct[-1]), float(tp_pct[-1])
+
+    def generate_signal_from_snapshots(self, snap_1m, snap_5m, snap_15m):
+        """
+        Igual que generate_signal pero a partir de los indicadores ya calculados
+        (p. ej. por IncrementalIndicators), sin recalcular sobre el histórico.
+        """
+        return self.provider.decide(snap_1m, snap_5m, snap_15m)
+
+    def generate_signal(self, df_1m, df_5m=None, df_15m=None):
+        if not self.use_openai:
+            return self.generate_signal_rules(df_1m)
+
+        return self.generate_signal_openai(df_1m, df_5m, df_15m)
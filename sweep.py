@@ -0,0 +1,219 @@
+# sweep.py
+# Barrido de parámetros del backtester en paralelo.
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtester import Backtester
+from metrics import write_report
+from strategy import ScalpingStrategy
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# Parámetros que recibe cada clase; el resto de claves se rechaza.
+STRATEGY_PARAMS = ('breakout_bars', 'vol_lookback', 'vwap_period', 'rsi_period',
+                   'ema_period', 'rsi_overbought', 'rsi_oversold',
+                   'sl_atr_mult', 'tp_atr_mult')
+BACKTEST_PARAMS = ('stop_loss_pct', 'take_profit_pct', 'max_hold_bars')
+
+# Espacio por defecto para main.py --mode sweep. Para muestreo aleatorio o
+# Latin hypercube se usan los extremos de cada lista como rango.
+DEFAULT_SPACE = {
+    'breakout_bars': [10, 20, 30],
+    'vol_lookback': [10, 20],
+    'rsi_period': [7, 14],
+    'stop_loss_pct': [0.002, 0.004],
+    'take_profit_pct': [0.003, 0.006],
+    'max_hold_bars': [15, 30, 60],
+}
+
+
+def grid(space):
+    """
+    Producto cartesiano de un dict {parametro: [valores]}.
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def _scale(low, high, u):
+    # los extremos enteros producen valores enteros (periodos, barras)
+    value = low + u * (high - low)
+    if isinstance(low, (int, np.integer)) and isinstance(high, (int, np.integer)):
+        return int(round(value))
+    return float(value)
+
+
+def _bounds(values):
+    if isinstance(values, tuple) and len(values) == 2:
+        return values
+    return min(values), max(values)
+
+
+def random_samples(space, n, seed=None):
+    """
+    n combinaciones uniformes dentro de los rangos (min, max) de cada parámetro.
+    """
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(n):
+        samples.append({name: _scale(*_bounds(values), rng.random())
+                        for name, values in space.items()})
+    return samples
+
+
+def latin_hypercube(space, n, seed=None):
+    """
+    n combinaciones por Latin hypercube: cada parámetro cubre sus n estratos
+    una vez, con el orden de los estratos barajado por parámetro.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, values in space.items():
+        u = (rng.permutation(n) + rng.random(n)) / n
+        low, high = _bounds(values)
+        columns[name] = [_scale(low, high, x) for x in u]
+    return [{name: columns[name][i] for name in space} for i in range(n)]
+
+
+class SharedOHLCV:
+    """
+    Copia las columnas OHLCV (y el timestamp en ms) a un bloque de memoria
+    compartida de forma (6, n). Los workers lo abren por nombre y construyen
+    su DataFrame sobre ese mismo buffer, de solo lectura.
+    """
+
+    def __init__(self, df):
+        self.shape = (1 + len(OHLCV_COLUMNS), len(df))
+        nbytes = int(np.prod(self.shape)) * np.dtype(np.float64).itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        block = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        # ms epoch cabe exacto en float64
+        block[0] = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        for i, column in enumerate(OHLCV_COLUMNS, start=1):
+            block[i] = df[column].to_numpy(dtype=np.float64)
+        self.name = self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach_ohlcv(name, shape):
+    """
+    Abre un bloque creado por SharedOHLCV y devuelve (shm, DataFrame) sin copiar
+    las columnas numéricas. Hay que mantener viva la referencia a shm.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    block.flags.writeable = False
+    frame = {'timestamp': pd.to_datetime(block[0].astype(np.int64), unit='ms')}
+    for i, column in enumerate(OHLCV_COLUMNS, start=1):
+        frame[column] = block[i]
+    return shm, pd.DataFrame(frame, copy=False)
+
+
+# Estado por proceso worker: el DataFrame compartido y el cache de indicadores,
+# que reutiliza columnas entre combinaciones con los mismos periodos.
+_worker = {}
+
+
+def _init_worker(name, shape, report_dir=None):
+    shm, df = attach_ohlcv(name, shape)
+    _worker['shm'] = shm
+    _worker['df'] = df
+    _worker['cache'] = {}
+    _worker['report_dir'] = report_dir
+
+
+def params_id(params):
+    """Identificador corto y estable de una combinación (nombre de su informe)."""
+    blob = json.dumps(params, sort_keys=True, default=float)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:12]
+
+
+def run_params(params, df, indicator_cache=None, rows=None, with_trades=False,
+               report_path=None):
+    """
+    Ejecuta un backtest vectorizado sin persistencia para una combinación.
+    rows: (inicio, fin) de las filas de df a evaluar (una ventana de
+    walk-forward). Los indicadores son causales, así que se calculan una vez
+    sobre todo df y se guardan en indicator_cache; cada ventana toma su
+    tramo de ahí (compute_indicators los alinea por índice) en lugar de
+    recalcularlos con un calentamiento nuevo.
+    with_trades: añade al resultado la lista de trades ('trades_summary').
+    report_path: si se indica, guarda ahí el informe completo de métricas
+    (metrics.performance) en JSON junto con los parámetros.
+    """
+    unknown = set(params) - set(STRATEGY_PARAMS) - set(BACKTEST_PARAMS)
+    if unknown:
+        raise ValueError(f"Parámetros desconocidos: {sorted(unknown)}")
+
+    strategy = ScalpingStrategy(use_openai=False,
+                                **{k: v for k, v in params.items() if k in STRATEGY_PARAMS})
+    if rows is not None:
+        indicator_cache = {} if indicator_cache is None else indicator_cache
+        strategy.compute_indicators(df, cache=indicator_cache)
+        df = df.iloc[rows[0]:rows[1]]
+    backtester = Backtester(strategy=strategy, persist=False,
+                            **{k: v for k, v in params.items() if k in BACKTEST_PARAMS})
+    capital, trades_summary = backtester.run_backtest(engine='vectorized', df=df,
+                                                      indicator_cache=indicator_cache)
+    report = backtester.performance()
+    if report_path:
+        write_report(report_path, report, params=params)
+    result = {
+        **params,
+        'final_capital': float(capital),
+        'trades': len(trades_summary),
+        'max_drawdown': report['max_drawdown'],
+        'sharpe': report['sharpe'],
+        'sortino': report['sortino'],
+        'exposure': report['exposure'],
+        'win_rate': report['win_rate'],
+    }
+    if with_trades:
+        result['trades_summary'] = trades_summary
+    return result
+
+
+def _run_in_worker(params):
+    report_dir = _worker['report_dir']
+    report_path = os.path.join(report_dir, params_id(params) + '.json') if report_dir else None
+    return run_params(params, _worker['df'], _worker['cache'], report_path=report_path)
+
+
+def run_sweep(df, param_sets, workers=None, output='sweep_results.csv', report_dir=None):
+    """
+    Ejecuta todas las combinaciones en un ProcessPoolExecutor y devuelve la
+    tabla de resultados ordenada por capital final (también se guarda en
+    `output` si no es None). Con report_dir cada combinación deja además su
+    informe de métricas en <report_dir>/<params_id>.json.
+    """
+    workers = workers or os.cpu_count() or 1
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+    shared = SharedOHLCV(df)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.name, shared.shape, report_dir)) as pool:
+            # chunks para que cada worker reutilice su cache de indicadores
+            chunksize = max(1, len(param_sets) // (workers * 4))
+            rows = list(pool.map(_run_in_worker, param_sets, chunksize=chunksize))
+    finally:
+        shared.close()
+
+    results = pd.DataFrame(rows)
+    if not results.empty:
+        results = results.sort_values(['final_capital', 'max_drawdown'],
+                                      ascending=[False, True]).reset_index(drop=True)
+        results.insert(0, 'rank', range(1, len(results) + 1))
+    if output:
+        results.to_csv(output, index=False)
+    return results
@@ -0,0 +1,22 @@
+# conftest.py
+# Los módulos del proyecto están en la raíz del repositorio (y config.py,
+# que no se versiona, también): se añade al path para importarlos.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# mismas velas sintéticas que los benchmarks
+from benchmark import synthetic_ohlcv  # noqa: E402
+
+
+@pytest.fixture
+def ohlcv_db(tmp_path):
+    """DBManager sobre una base temporal con 4000 velas sintéticas de 1m."""
+    from db_manager import DBManager
+    df = synthetic_ohlcv(4000, seed=3)
+    db = DBManager(str(tmp_path / 'ohlcv.db'))
+    db.insert_ohlcv(df.itertuples(index=False))
+    return db, df
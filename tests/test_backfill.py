@@ -0,0 +1,67 @@
+# test_backfill.py
+from conftest import synthetic_ohlcv
+from backfill import Backfiller
+from db_manager import DBManager
+from timeutils import to_epoch_ms
+
+STEP = 60_000
+
+
+class FakeExchange:
+    """fetch_ohlcv al estilo ccxt sobre una lista de velas en memoria."""
+
+    rateLimit = 0
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.requests = []
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        self.requests.append(since)
+        return [row for row in self.rows if row[0] >= since][:limit]
+
+
+def _rows(n):
+    df = synthetic_ohlcv(n, seed=7)
+    return [[to_epoch_ms(ts), o, h, l, c, v] for ts, o, h, l, c, v in df.itertuples(index=False)]
+
+
+def _backfiller(tmp_path, rows):
+    exchange = FakeExchange(rows)
+    db = DBManager(str(tmp_path / 'backfill.db'))
+    return Backfiller(exchange=exchange, db=db, max_concurrency=2, page_limit=500), exchange, db
+
+
+def test_resume_only_fetches_missing_ranges(tmp_path):
+    rows = _rows(3000)
+    backfiller, exchange, db = _backfiller(tmp_path, rows)
+    # ya guardado: [0, 1000) y [1100, 2000); falta el hueco y el tramo final
+    db.insert_ohlcv(rows[:1000] + rows[1100:2000])
+
+    summary = backfiller.backfill(['DOGE/USDT'], ['1m'], rows[0][0], rows[-1][0] + STEP)
+
+    # el tramo final empieza en la última vela guardada (pudo guardarse abierta)
+    assert min(exchange.requests) == rows[1000][0]
+    assert rows[1999][0] in exchange.requests
+    assert all(since >= rows[1000][0] for since in exchange.requests)
+    assert summary[('DOGE/USDT', '1m')] == 100 + 1001
+    assert db.fetch_ohlcv_timestamps().tolist() == [row[0] for row in rows]
+
+
+def test_deleted_gap_is_refetched_and_complete_range_is_skipped(tmp_path):
+    rows = _rows(2000)
+    backfiller, exchange, db = _backfiller(tmp_path, rows)
+    end = rows[-1][0] + STEP
+    backfiller.backfill(['DOGE/USDT'], ['1m'], rows[0][0], end)
+
+    db.conn.execute("DELETE FROM ohlcv WHERE ts >= ? AND ts < ?", (rows[500][0], rows[600][0]))
+    db.conn.commit()
+    exchange.requests.clear()
+    summary = backfiller.backfill(['DOGE/USDT'], ['1m'], rows[0][0], end)
+    assert exchange.requests == [rows[500][0]]
+    assert summary[('DOGE/USDT', '1m')] == 100
+    assert len(db.fetch_ohlcv_timestamps()) == 2000
+
+    exchange.requests.clear()
+    assert backfiller.backfill(['DOGE/USDT'], ['1m'], rows[0][0], end) == {('DOGE/USDT', '1m'): 0}
+    assert exchange.requests == []
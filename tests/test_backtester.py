@@ -0,0 +1,49 @@
+# test_backtester.py
+import numpy as np
+import pytest
+
+from conftest import synthetic_ohlcv
+from backtester import Backtester
+from execution import ExecutionModel
+from portfolio import PortfolioBacktester, align_panel
+from strategy import ScalpingStrategy
+
+
+def _flat_df():
+    # precios en ticks de 0.0001: muchas velas repiten el close de la entrada
+    df = synthetic_ohlcv(3000, seed=5)
+    for column in ('open', 'high', 'low', 'close'):
+        df[column] = df[column].round(4)
+    return df
+
+
+def _run(df, exit_model, engine):
+    backtester = Backtester(strategy=ScalpingStrategy(use_openai=False), persist=False,
+                            stop_loss_pct=0.0, take_profit_pct=0.0,
+                            execution=ExecutionModel(exit_model))
+    return backtester.run_backtest(engine=engine, df=df)
+
+
+@pytest.mark.parametrize('exit_model', ['close', 'intrabar'])
+def test_zero_sl_tp_ties_match_between_engines(exit_model):
+    # con SL = TP = 0 cada salida toca los dos niveles a la vez
+    df = _flat_df()
+    loop_capital, loop_trades = _run(df, exit_model, 'loop')
+    capital, trades = _run(df, exit_model, 'vectorized')
+    assert trades
+    assert [t['reason'] for t in trades] == [t['reason'] for t in loop_trades]
+    assert None not in {t['reason'] for t in trades}
+    assert capital == pytest.approx(loop_capital)
+
+
+@pytest.mark.parametrize('exit_model', ['close', 'intrabar'])
+def test_zero_sl_tp_ties_in_portfolio(exit_model):
+    df = _flat_df()
+    arrays = {'ts': df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64),
+              **{c: df[c].to_numpy() for c in ('open', 'high', 'low', 'close', 'volume')}}
+    portfolio = PortfolioBacktester(['DOGE/USDT'], persist=False, stop_loss_pct=0.0,
+                                    take_profit_pct=0.0, execution=ExecutionModel(exit_model))
+    capital, trades = portfolio.run_backtest(panel=align_panel({'DOGE/USDT': arrays}))
+    assert trades
+    assert None not in {t['reason'] for t in trades}
+    assert capital == pytest.approx(_run(df, exit_model, 'loop')[0])
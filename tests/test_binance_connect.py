@@ -0,0 +1,99 @@
+# test_binance_connect.py
+import hashlib
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from binance_connect import BinanceHMACClient
+
+
+class StubBinance(BaseHTTPRequestHandler):
+    """Responde como la API de Binance y anota cada petición recibida."""
+
+    protocol_version = 'HTTP/1.1'   # keep-alive
+
+    def _reply(self):
+        path = urlsplit(self.path).path
+        self.server.requests.append((self.command, self.path, self.client_address,
+                                     self.headers.get('X-MBX-APIKEY')))
+        failures = self.server.failures
+        if failures.get(path):
+            failures[path] -= 1
+            status, body = 503, {'code': -1003, 'msg': 'busy'}
+        elif path == '/api/v3/ticker/price':
+            status, body = 200, {'symbol': 'DOGEUSDT', 'price': '0.1234'}
+        else:
+            status, body = 200, {'ok': True}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    # un proxy del entorno no debe interceptar las peticiones al stub local
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubBinance)
+    server.requests = []
+    server.failures = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, **kwargs):
+    host, port = server.server_address
+    return BinanceHMACClient('key', 'secret', base_url=f'http://{host}:{port}',
+                             sync_clock=False, backoff_factor=0, **kwargs)
+
+
+def test_requests_reuse_one_keep_alive_connection(stub):
+    client = _client(stub)
+    for _ in range(5):
+        assert client.get_symbol_price('DOGEUSDT') == pytest.approx(0.1234)
+    assert client.get_account_info() == {'ok': True}
+    client.close()
+
+    # mismo puerto de origen en todas: una sola conexión TCP
+    assert len({address for _, _, address, _ in stub.requests}) == 1
+    assert {api_key for _, _, _, api_key in stub.requests} == {'key'}
+    assert client.latency_stats()['GET /api/v3/ticker/price']['count'] == 5
+
+
+def test_signature_covers_the_query_string(stub):
+    client = _client(stub, recv_window=2500)
+    client.create_order('DOGEUSDT', 'BUY', 'MARKET', 100)
+
+    method, path, _, _ = stub.requests[-1]
+    query = urlsplit(path).query
+    payload, signature = query.rsplit('&signature=', 1)
+    expected = hmac.new(b'secret', payload.encode(), hashlib.sha256).hexdigest()
+    assert method == 'POST'
+    assert signature == expected
+    assert parse_qs(payload)['recvWindow'] == ['2500']
+
+
+def test_get_is_retried_but_orders_are_not(stub):
+    client = _client(stub)
+    stub.failures['/api/v3/ticker/price'] = 2
+    assert client.get_symbol_price('DOGEUSDT') == pytest.approx(0.1234)
+    assert len(stub.requests) == 3
+
+    stub.requests.clear()
+    stub.failures['/api/v3/order'] = 1
+    assert client.create_order('DOGEUSDT', 'BUY', 'MARKET', 100) is None
+    assert len(stub.requests) == 1
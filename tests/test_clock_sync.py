@@ -0,0 +1,119 @@
+# test_clock_sync.py
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from binance_connect import BinanceHMACClient, ClockSync
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeExchange:
+    """
+    Sesión falsa: /api/v3/time tarda `rtts` (uno por llamada) y las
+    peticiones firmadas fuera de recvWindow se rechazan con -1021.
+    """
+
+    def __init__(self, clock, offset_ms, rtts=(0.02,)):
+        self.clock = clock
+        self.offset_ms = offset_ms
+        self.rtts = list(rtts)
+        self.headers = {}
+        self.signed = []
+        self.time_calls = 0
+        self.reject_signed = False
+
+    def server_ms(self):
+        return self.clock.now * 1000 + self.offset_ms
+
+    def fetch_server_time(self):
+        rtt = self.rtts[self.time_calls % len(self.rtts)]
+        self.time_calls += 1
+        self.clock.now += rtt / 2
+        server_ms = self.server_ms()
+        self.clock.now += rtt / 2
+        return server_ms
+
+    def request(self, method, url, timeout=None, **kwargs):
+        path = urlsplit(url).path
+        if path == '/api/v3/time':
+            return _response(200, {'serverTime': int(self.fetch_server_time())})
+        params = {key: int(value[0]) for key, value in parse_qs(urlsplit(url).query).items()
+                  if key in ('timestamp', 'recvWindow')}
+        self.signed.append(params)
+        if self.reject_signed or abs(params['timestamp'] - self.server_ms()) > params['recvWindow']:
+            return _response(400, {'code': -1021, 'msg': 'Timestamp outside of recvWindow.'})
+        return _response(200, {'ok': True})
+
+    def close(self):
+        pass
+
+
+def _response(status, body):
+    return SimpleNamespace(status_code=status, json=lambda: body, text=str(body))
+
+
+def test_sync_uses_lowest_rtt_sample():
+    clock = FakeClock()
+    exchange = FakeExchange(clock, offset_ms=-750.0, rtts=(0.3, 0.01, 0.2))
+    sync = ClockSync(exchange.fetch_server_time, samples=3, clock=clock)
+
+    assert sync.sync()
+    assert sync.offset_ms == pytest.approx(-750.0)
+    assert sync.rtt_ms == pytest.approx(10.0, rel=1e-3)
+    # 10 x RTT acotado por abajo a min_recv_window
+    assert sync.recv_window() == 1000
+    assert sync.now_ms() == int(clock.now * 1000 - 750.0)
+
+
+def test_stale_clock_resyncs_on_next_timestamp():
+    clock = FakeClock()
+    exchange = FakeExchange(clock, offset_ms=0.0)
+    sync = ClockSync(exchange.fetch_server_time, interval=300.0, samples=1, clock=clock)
+    sync.now_ms()
+    assert exchange.time_calls == 1
+
+    clock.now += 100
+    sync.now_ms()
+    assert exchange.time_calls == 1
+    clock.now += 300
+    exchange.offset_ms = 2000.0
+    assert sync.now_ms() == pytest.approx(clock.now * 1000 + 2000.0, abs=1)
+    assert exchange.time_calls == 2
+
+
+def test_timestamp_outside_recv_window_resyncs_and_retries_once():
+    clock = FakeClock()
+    exchange = FakeExchange(clock, offset_ms=0.0)
+    client = BinanceHMACClient('key', 'secret', session=exchange)
+    client.clock.clock = clock
+    client.clock.samples = 1
+    client.clock.sync()
+
+    # el reloj del exchange se adelanta 10 s antes de la siguiente orden
+    exchange.offset_ms = 10_000.0
+    assert client.create_order('DOGEUSDT', 'BUY', 'MARKET', 100) == {'ok': True}
+    assert len(exchange.signed) == 2
+    assert exchange.time_calls == 2
+    # entre los dos envíos solo pasa el RTT de la re-sincronización (20 ms)
+    assert exchange.signed[1]['timestamp'] - exchange.signed[0]['timestamp'] == pytest.approx(10_020, abs=1)
+
+
+def test_persistent_rejection_is_not_retried_forever():
+    clock = FakeClock()
+    exchange = FakeExchange(clock, offset_ms=0.0)
+    client = BinanceHMACClient('key', 'secret', session=exchange)
+    client.clock.clock = clock
+    client.clock.samples = 1
+    client.clock.sync()
+
+    exchange.reject_signed = True
+    assert client.create_order('DOGEUSDT', 'BUY', 'MARKET', 100) is None
+    assert len(exchange.signed) == 2
@@ -0,0 +1,44 @@
+# test_db_manager.py
+import sqlite3
+
+from db_manager import DBManager
+
+LEGACY_OHLCV_SQL = """
+CREATE TABLE ohlcv (
+    ohlcv_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    open REAL NOT NULL, high REAL NOT NULL, low REAL NOT NULL,
+    close REAL NOT NULL, volume REAL NOT NULL
+)
+"""
+
+
+def _legacy_db(path, timestamps):
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_OHLCV_SQL)
+    conn.executemany("INSERT INTO ohlcv (timestamp, open, high, low, close, volume) "
+                     "VALUES (?, 1, 1, 1, 1, 1)", [(ts,) for ts in timestamps])
+    conn.commit()
+    conn.close()
+
+
+def _tables(db):
+    return {row[0] for row in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_migration_drops_legacy_table_when_all_rows_migrate(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    _legacy_db(path, ['2024-01-01 00:00:00', '2024-01-01 00:01:00'])
+    db = DBManager(path)
+    assert len(db.fetch_ohlcv_range()['ts']) == 2
+    assert 'ohlcv_legacy_backup' not in _tables(db)
+
+
+def test_migration_keeps_backup_when_rows_are_dropped(tmp_path, capsys):
+    path = str(tmp_path / 'legacy.db')
+    _legacy_db(path, ['2024-01-01 00:00:00', 'not a date', '2024-01-01 00:02:00'])
+    db = DBManager(path)
+    assert len(db.fetch_ohlcv_range()['ts']) == 2
+    assert 'ohlcv_legacy_backup' in _tables(db)
+    assert db.conn.execute("SELECT COUNT(*) FROM ohlcv_legacy_backup").fetchone()[0] == 3
+    assert '1 filas' in capsys.readouterr().out
@@ -0,0 +1,42 @@
+# test_indicators.py
+import numpy as np
+
+from conftest import synthetic_ohlcv
+from indicators import IncrementalIndicators
+from strategy import ScalpingStrategy
+
+
+def _apply_atr(df, period=14):
+    # versión original de compute_atr: rango verdadero fila a fila con apply
+    tr = df.apply(lambda row: max(
+        row['high'] - row['low'],
+        abs(row['high'] - row['close']),
+        abs(row['low'] - row['close'])
+    ), axis=1)
+    return tr.rolling(period).mean()
+
+
+def test_array_atr_matches_row_by_row_sma():
+    df = synthetic_ohlcv(5000, seed=11)
+    atr = ScalpingStrategy(use_openai=False).compute_atr(df)
+    np.testing.assert_allclose(atr.to_numpy(), _apply_atr(df).to_numpy(),
+                               rtol=1e-12, equal_nan=True)
+
+
+def test_incremental_indicators_match_compute_indicators():
+    df = synthetic_ohlcv(3000, seed=12)
+    expected = ScalpingStrategy(use_openai=False).compute_indicators(df)
+
+    incremental = IncrementalIndicators()
+    rows = []
+    for candle in df.to_dict('records'):
+        # la vela en curso llega antes a medio formar y luego se reemplaza
+        incremental.update({**candle, 'high': candle['open'], 'low': candle['open'],
+                            'close': candle['open'], 'volume': 1.0})
+        rows.append(incremental.update(candle))
+
+    assert [row['timestamp'] for row in rows] == list(df['timestamp'])
+    for column in ('open', 'high', 'low', 'close', 'volume',
+                   'high_n', 'low_n', 'vol_avg', 'vwap', 'rsi', 'ema', 'atr'):
+        np.testing.assert_allclose([row[column] for row in rows], expected[column].to_numpy(),
+                                   rtol=1e-9, equal_nan=True, err_msg=column)
@@ -0,0 +1,84 @@
+# test_live_trader.py
+# Reglas de riesgo del LiveTrader sobre velas sintéticas, sin red.
+from conftest import synthetic_ohlcv
+from live_trader import LiveTrader
+from replay import MemoryTrades, SimulatedOrderManager
+from signal_providers import SignalProvider
+from strategy import ScalpingStrategy
+
+SEED_BARS = 120
+
+
+class FixedSignal(SignalProvider):
+    """Devuelve siempre `signal`; por defecto con SL/TP lejanos (no se cierra sola)."""
+
+    def __init__(self, signal=0, level_pct=0.5):
+        self.signal = signal
+        self.level_pct = level_pct
+
+    def decide(self, snap_1m, snap_5m, snap_15m):
+        return self.signal, self.level_pct, self.level_pct
+
+
+class RejectingOrderManager(SimulatedOrderManager):
+    """Rechaza las órdenes mientras reject sea True."""
+
+    reject = False
+
+    def create_market_order(self, side, quantity, price=None):
+        if self.reject:
+            return None
+        return super().create_market_order(side, quantity, price=price)
+
+
+def _trader(df, provider, order_mgr=None):
+    clock = df['timestamp'].iloc[SEED_BARS].value / 1e9
+    trader = LiveTrader(MemoryTrades(), ScalpingStrategy(use_openai=False, signal_provider=provider),
+                        order_mgr or SimulatedOrderManager(), clock=lambda: clock, verbose=False)
+    trader.seed_history(df.iloc[:SEED_BARS])
+    return trader
+
+
+def _candle(df, i):
+    return {'1m': df.iloc[i].to_dict()}
+
+
+def test_daily_loss_limit_resets_at_utc_midnight():
+    # la vela SEED_BARS + 10 es la de las 00:00 del día siguiente
+    df = synthetic_ohlcv(SEED_BARS + 11, start='2024-01-01 21:50')
+    provider = FixedSignal()
+    trader = _trader(df, provider)
+
+    trader.on_candles(_candle(df, SEED_BARS))
+    trader.daily_pnl = trader.daily_loss_limit - 1.0
+    provider.signal = 1
+    for i in range(SEED_BARS + 1, SEED_BARS + 10):
+        trader.on_candles(_candle(df, i))
+    assert not trader.engine.is_open()
+
+    trader.on_candles(_candle(df, SEED_BARS + 10))
+    assert df['timestamp'].iloc[SEED_BARS + 10].hour == 0
+    assert trader.daily_pnl == 0.0
+    assert trader.engine.is_open()
+
+
+def test_rejected_exit_order_keeps_position_open():
+    df = synthetic_ohlcv(SEED_BARS + 4, start='2024-01-01 10:00')
+    # SL/TP mínimos: la siguiente vela siempre toca uno de los dos
+    order_mgr = RejectingOrderManager()
+    trader = _trader(df, FixedSignal(1, level_pct=1e-9), order_mgr)
+
+    trader.on_candles(_candle(df, SEED_BARS))
+    assert trader.engine.is_open()
+
+    order_mgr.reject = True
+    trader.on_candles(_candle(df, SEED_BARS + 1))
+    assert trader.engine.is_open()
+    assert trader.db.trades == []
+    assert trader.daily_pnl == 0.0
+
+    order_mgr.reject = False
+    trader.on_candles(_candle(df, SEED_BARS + 2))
+    assert not trader.engine.is_open()
+    assert len(trader.db.trades) == 1
+    assert len(order_mgr.orders) == 2
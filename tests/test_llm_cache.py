@@ -0,0 +1,45 @@
+# test_llm_cache.py
+import threading
+import time
+
+import pandas as pd
+
+from llm_cache import LLMCache, snapshot_key
+from signal_providers import PROMPT_FIELDS
+
+
+def test_concurrent_misses_call_compute_once(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm_cache.db'))
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return 'Dirección inmediata: NO_OP'
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+    first.start()
+    started.wait()
+    second = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+    second.start()
+    first.join()
+    second.join()
+
+    assert len(calls) == 1
+    assert results == ['Dirección inmediata: NO_OP'] * 2
+    assert cache.metrics()['coalesced'] == 1
+    assert cache.get_or_compute('k', compute) == 'Dirección inmediata: NO_OP'
+    assert len(calls) == 1
+
+
+def test_key_ignores_fields_outside_the_prompt():
+    snap = {'timestamp': pd.Timestamp('2024-01-01 00:00'), 'open': 0.1, 'high': 0.11,
+            'low': 0.09, 'close': 0.1, 'volume': 500.0, 'high_n': 0.105, 'low_n': 0.095,
+            'vol_avg': 450.0, 'vwap': 0.1, 'rsi': 55.0, 'ema': 0.1, 'atr': 0.001}
+    later = dict(snap, timestamp=pd.Timestamp('2024-01-01 00:07'), open=0.098, high=0.102)
+    key = snapshot_key((snap,) * 3, 'model', 1, fields=PROMPT_FIELDS)
+    assert key == snapshot_key((later,) * 3, 'model', 1, fields=PROMPT_FIELDS)
+    assert key != snapshot_key((dict(snap, rsi=60.0),) * 3, 'model', 1, fields=PROMPT_FIELDS)
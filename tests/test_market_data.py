@@ -0,0 +1,69 @@
+# test_market_data.py
+import asyncio
+
+import pytest
+
+from market_data import AsyncCandlePoller
+
+MINUTE_MS = 60_000
+
+
+class FlakyTransport:
+    """Velas de 1m hasta la hora del reloj; las primeras `failures` llamadas fallan."""
+
+    def __init__(self, clock, failures=0):
+        self.clock = clock
+        self.failures = failures
+        self.calls = 0
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("red caída")
+        now_ms = int(self.clock() * 1000)
+        last = now_ms // MINUTE_MS * MINUTE_MS
+        start = since if since is not None else last - (limit or 2) * MINUTE_MS
+        return [[ts, 1.0, 1.0, 1.0, 1.0, 1.0] for ts in range(start, last + 1, MINUTE_MS)]
+
+
+def _poller(transport, clock):
+    return AsyncCandlePoller(timeframes=('1m',), transport=transport, close_delay=0.0,
+                             retry_delay=0.0, max_retries=0, error_delay=0.0, clock=clock)
+
+
+def test_run_survives_transport_and_callback_errors():
+    # el reloj está a 10 ms del cierre: cada ciclo espera muy poco
+    now = [1_704_067_200.0 - 0.01]
+    clock = lambda: now[0]
+    transport = FlakyTransport(clock, failures=1)
+    poller = _poller(transport, clock)
+    published = []
+
+    def on_candles(candles):
+        published.append(candles['1m']['timestamp'])
+        now[0] += 60.0
+        if len(published) == 1:
+            raise ValueError("fallo en el callback")
+        if len(published) == 3:
+            raise asyncio.CancelledError
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(poller.run(on_candles))
+    assert transport.calls >= 4
+    assert len(published) == 3
+
+
+def test_poll_once_publishes_every_missed_candle_in_order():
+    now = [1_704_067_200.0 + 1.0]
+    clock = lambda: now[0]
+    poller = _poller(FlakyTransport(clock), clock)
+
+    first = asyncio.run(poller.poll_once())
+    assert len(first) == 1
+    # un ciclo lento: pasan tres velas antes de la siguiente consulta
+    now[0] += 180.0
+    batches = asyncio.run(poller.poll_once())
+    stamps = [b['1m']['timestamp'].value // 1_000_000 for b in batches]
+    last = first[0]['1m']['timestamp'].value // 1_000_000
+    assert stamps == [last + MINUTE_MS, last + 2 * MINUTE_MS, last + 3 * MINUTE_MS]
+    assert asyncio.run(poller.poll_once()) == []
@@ -0,0 +1,66 @@
+# test_order_manager.py
+import pytest
+
+from order_manager import AccountStateCache
+
+
+class SlowAccountClient:
+    """Devuelve una foto de la cuenta tomada antes de `during_fetch`."""
+
+    def __init__(self, balances, during_fetch=None):
+        self.balances = balances
+        self.during_fetch = during_fetch
+
+    def get_account_info(self):
+        snapshot = {'balances': [{'asset': a, 'free': str(v)} for a, v in self.balances.items()]}
+        if self.during_fetch is not None:
+            self.during_fetch()
+        return snapshot
+
+    def get_margin_account_info(self):
+        return None
+
+
+FILL = {'side': 'BUY', 'executedQty': '50', 'cummulativeQuoteQty': '5.0'}
+
+
+def test_fill_during_refresh_is_not_lost():
+    client = SlowAccountClient({'DOGE': 0.0, 'USDT': 100.0})
+    account = AccountStateCache(client, include_margin=False)
+    assert account.refresh()
+
+    client.during_fetch = lambda: account.apply_fill(FILL, 'DOGE', 'USDT')
+    assert not account.refresh()
+    assert account.spot_free('DOGE') == 50.0
+    assert account.spot_free('USDT') == 95.0
+
+    # la siguiente foto ya incluye el fill
+    client.balances = {'DOGE': 50.0, 'USDT': 94.99}
+    client.during_fetch = None
+    assert account.refresh()
+    assert account.spot_free('USDT') == 94.99
+
+
+def test_fill_commissions_are_deducted_per_asset():
+    account = AccountStateCache(SlowAccountClient({}), include_margin=False)
+    account.spot = {'DOGE': 0.0, 'USDT': 100.0, 'BNB': 1.0}
+    account.apply_fill({**FILL, 'fills': [
+        {'price': '0.1', 'qty': '30', 'commission': '0.03', 'commissionAsset': 'DOGE'},
+        {'price': '0.1', 'qty': '20', 'commission': '0.0001', 'commissionAsset': 'BNB'},
+    ]}, 'DOGE', 'USDT')
+    assert account.spot_free('DOGE') == pytest.approx(49.97)
+    assert account.spot_free('USDT') == pytest.approx(95.0)
+    assert account.spot_free('BNB') == pytest.approx(0.9999)
+
+    account.apply_fill({'side': 'SELL', 'executedQty': '49', 'cummulativeQuoteQty': '4.9',
+                        'fills': [{'commission': '0.0049', 'commissionAsset': 'USDT'}]},
+                       'DOGE', 'USDT')
+    assert account.spot_free('DOGE') == pytest.approx(0.97)
+    assert account.spot_free('USDT') == pytest.approx(99.8951)
+
+
+def test_simulated_order_manager_has_base_attributes():
+    from replay import SimulatedOrderManager
+    order_mgr = SimulatedOrderManager()
+    assert order_mgr.account.client is not None
+    assert order_mgr.create_market_order('buy', 10, price=0.1)['status'] == 'FILLED'
@@ -0,0 +1,108 @@
+# test_signal_providers.py
+import threading
+
+import pytest
+
+from signal_providers import DeadlineSignalProvider, SignalProvider
+
+SNAP = {'close': 0.1}
+PRIMARY = (1, 0.002, 0.003)
+FALLBACK = (0, 0.002, 0.003)
+
+
+class FixedProvider:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def decide(self, snap_1m, snap_5m, snap_15m):
+        self.calls += 1
+        return self.result
+
+
+class SlowProvider:
+    """No responde hasta que se llama a release() (o falla si error)."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.released = threading.Event()
+        self.finished = threading.Event()
+
+    def decide(self, snap_1m, snap_5m, snap_15m):
+        self.released.wait(5)
+        self.finished.set()
+        if self.error is not None:
+            raise self.error
+        return PRIMARY
+
+    def release(self):
+        self.released.set()
+
+
+@pytest.fixture
+def make_provider():
+    providers = []
+
+    def make(primary, timeout=0.05, max_workers=2):
+        fallback = FixedProvider(FALLBACK)
+        provider = DeadlineSignalProvider(primary, fallback, timeout=timeout, max_workers=max_workers)
+        providers.append((provider, primary))
+        return provider, fallback
+
+    yield make
+    for provider, primary in providers:
+        if isinstance(primary, SlowProvider):
+            primary.release()
+        provider.close()
+
+
+def test_primary_answer_within_deadline(make_provider):
+    provider, fallback = make_provider(FixedProvider(PRIMARY), timeout=5.0)
+    assert provider.decide(SNAP, SNAP, SNAP) == PRIMARY
+    assert fallback.calls == 0
+    metrics = provider.metrics()
+    assert (metrics['timeouts'], metrics['errors'], metrics['busy']) == (0, 0, 0)
+    assert metrics['primary']['count'] == 1
+
+
+def test_slow_primary_falls_back_and_counts_timeout(make_provider):
+    slow = SlowProvider()
+    provider, fallback = make_provider(slow)
+    assert provider.decide(SNAP, SNAP, SNAP) == FALLBACK
+    assert fallback.calls == 1
+    metrics = provider.metrics()
+    assert metrics['timeouts'] == 1
+    assert metrics['fallback_rate'] == 1.0
+    assert metrics['primary'] is None
+
+    # la respuesta tardía termina en segundo plano sin afectar a la siguiente
+    slow.release()
+    assert slow.finished.wait(5)
+    assert provider.decide(SNAP, SNAP, SNAP) == PRIMARY
+    assert provider.metrics()['timeouts'] == 1
+
+
+def test_failing_primary_falls_back_and_counts_error(make_provider):
+    failing = SlowProvider(error=RuntimeError('boom'))
+    failing.release()
+    provider, fallback = make_provider(failing, timeout=5.0)
+    assert provider.decide(SNAP, SNAP, SNAP) == FALLBACK
+    assert provider.metrics()['errors'] == 1
+
+
+def test_busy_workers_use_fallback_without_queueing(make_provider):
+    slow = SlowProvider()
+    provider, fallback = make_provider(slow, max_workers=1)
+    assert provider.decide(SNAP, SNAP, SNAP) == FALLBACK
+    assert provider.decide(SNAP, SNAP, SNAP) == FALLBACK
+    metrics = provider.metrics()
+    assert (metrics['calls'], metrics['timeouts'], metrics['busy']) == (2, 1, 1)
+    assert fallback.calls == 2
+
+
+def test_signal_provider_requires_decide():
+    class Incomplete(SignalProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,16 @@
+# test_walkforward.py
+import pytest
+
+from walkforward import trade_returns
+
+
+def test_trade_returns_restart_capital_each_window():
+    trades = [{'pnl': 10.0, 'window': 0}, {'pnl': -5.0, 'window': 0},
+              {'pnl': 2.0, 'window': 1}, {'pnl': 3.0, 'window': 1}]
+    returns = trade_returns(trades, initial_capital=1000.0)
+    assert returns == pytest.approx([10 / 1000, -5 / 1010, 2 / 1000, 3 / 1002])
+
+
+def test_trade_returns_single_run_compounds():
+    returns = trade_returns([{'pnl': 10.0}, {'pnl': -5.0}], initial_capital=1000.0)
+    assert returns == pytest.approx([10 / 1000, -5 / 1010])
@@ -0,0 +1,21 @@
+# timeutils.py
+# Conversión de timestamps y marcos temporales a milisegundos epoch.
+import numpy as np
+import pandas as pd
+
+TIMEFRAME_UNITS_MS = {'s': 1_000, 'm': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+
+def to_epoch_ms(ts):
+    """
+    Convierte un timestamp (pd.Timestamp, datetime64, str o entero en ms) a
+    milisegundos epoch.
+    """
+    if isinstance(ts, (int, np.integer)):
+        return int(ts)
+    return pd.Timestamp(ts).value // 1_000_000
+
+
+def timeframe_to_ms(timeframe):
+    """'1m' -> 60000, '4h' -> 14400000, ..."""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS_MS[timeframe[-1]]
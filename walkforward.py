@@ -0,0 +1,182 @@
+# walkforward.py
+# Robustez de la estrategia: walk-forward (optimiza en una ventana de
+# entrenamiento y evalúa en la siguiente de test) y bootstrap Monte Carlo de
+# la secuencia de trades, en paralelo con un ProcessPoolExecutor.
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sweep import SharedOHLCV, _init_worker, _worker, run_params
+from config import INITIAL_CAPITAL
+
+
+def rolling_windows(timestamps, train, test, step=None):
+    """
+    Ventanas consecutivas de [train | test] sobre la serie de timestamps.
+    train, test y step son duraciones de pandas ('30D', '12h'...); step
+    (por defecto test) es el avance entre ventanas. Devuelve una lista de
+    (train_lo, train_hi, test_lo, test_hi) en filas, con el extremo final
+    exclusivo. Solo se incluyen ventanas de test completas.
+    """
+    ts = pd.DatetimeIndex(timestamps)
+    if len(ts) == 0:
+        return []
+    train, test = pd.Timedelta(train), pd.Timedelta(test)
+    step = pd.Timedelta(step) if step else test
+    windows = []
+    start = ts[0]
+    while start + train + test <= ts[-1]:
+        bounds = ts.searchsorted([start, start + train, start + train + test], side='left')
+        train_lo, train_hi, test_hi = (int(b) for b in bounds)
+        if train_hi > train_lo and test_hi > train_hi:
+            windows.append((train_lo, train_hi, train_hi, test_hi))
+        start += step
+    return windows
+
+
+def _run_window(task):
+    params, rows, with_trades = task
+    return run_params(params, _worker['df'], _worker['cache'], rows=rows, with_trades=with_trades)
+
+
+def _best(results, objective):
+    # mismo criterio que la tabla del barrido: objetivo y, a igualdad, menor drawdown
+    return max(results, key=lambda r: (r[objective], -r['max_drawdown']))
+
+
+def walk_forward(df, param_sets, train, test, step=None, objective='final_capital',
+                 workers=None, output='walkforward_results.csv'):
+    """
+    Para cada ventana de rolling_windows evalúa todas las combinaciones en
+    el tramo de entrenamiento, elige la mejor según `objective` (columna de
+    run_params) y la ejecuta en el tramo de test siguiente.
+
+    Todas las (ventana, combinación) se reparten entre los workers de un
+    mismo pool; cada worker calcula los indicadores de cada periodo una
+    sola vez sobre todo el histórico compartido y los reutiliza en todas
+    las ventanas (ver run_params).
+
+    Devuelve (tabla por ventana, trades de test concatenados, cada uno con
+    el número de su ventana en 'window').
+    """
+    windows = rolling_windows(df['timestamp'], train, test, step)
+    if not windows or not param_sets:
+        return pd.DataFrame(), []
+
+    workers = workers or os.cpu_count() or 1
+    shared = SharedOHLCV(df)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.name, shared.shape)) as pool:
+            tasks = [(params, (lo, hi), False) for lo, hi, _, _ in windows for params in param_sets]
+            chunksize = max(1, len(tasks) // (workers * 4))
+            train_results = list(pool.map(_run_window, tasks, chunksize=chunksize))
+
+            best = []
+            for w in range(len(windows)):
+                block = train_results[w * len(param_sets):(w + 1) * len(param_sets)]
+                best.append(_best(block, objective))
+
+            tasks = [({k: r[k] for k in param_sets[0]}, (lo, hi), True)
+                     for r, (_, _, lo, hi) in zip(best, windows)]
+            test_results = list(pool.map(_run_window, tasks))
+    finally:
+        shared.close()
+
+    timestamps = df['timestamp']
+    rows = []
+    test_trades = []
+    for w, (window, fit, result) in enumerate(zip(windows, best, test_results)):
+        train_lo, train_hi, test_lo, test_hi = window
+        trades = result.pop('trades_summary')
+        # cada ventana de test empieza con INITIAL_CAPITAL (ver trade_returns)
+        for trade in trades:
+            trade['window'] = w
+        test_trades.extend(trades)
+        rows.append({
+            'train_start': timestamps.iloc[train_lo],
+            'test_start': timestamps.iloc[test_lo],
+            'test_end': timestamps.iloc[test_hi - 1],
+            **{k: fit[k] for k in param_sets[0]},
+            f'train_{objective}': fit[objective],
+            'test_final_capital': result['final_capital'],
+            'test_trades': result['trades'],
+            'test_max_drawdown': result['max_drawdown'],
+            'test_sharpe': result['sharpe'],
+        })
+
+    results = pd.DataFrame(rows)
+    if output:
+        results.to_csv(output, index=False)
+    return results, test_trades
+
+
+def trade_returns(trades_summary, initial_capital=INITIAL_CAPITAL):
+    """
+    Rentabilidad de cada trade sobre el capital que había al abrirlo, para
+    que el bootstrap no dependa del tamaño de la cuenta en cada momento.
+    Los trades de walk_forward llevan su ventana en 'window' y cada ventana
+    de test parte de initial_capital, así que el capital se acumula solo
+    dentro de cada ventana (sin 'window' se trata como una sola ejecución).
+    """
+    pnl = np.array([t['pnl'] for t in trades_summary], dtype=float)
+    if len(pnl) == 0:
+        return pnl
+    window = np.array([t.get('window', 0) for t in trades_summary])
+    before = np.cumsum(pnl) - pnl  # PnL acumulado antes de cada trade
+    first = np.r_[True, window[1:] != window[:-1]]
+    # primer trade de la ventana de cada trade
+    start = np.maximum.accumulate(np.where(first, np.arange(len(pnl)), 0))
+    return pnl / (initial_capital + before - before[start])
+
+
+def _bootstrap(task):
+    """(capital final, máximo drawdown) de n secuencias remuestreadas."""
+    returns, n, seed = task
+    rng = np.random.default_rng(seed)
+    paths = np.cumprod(1.0 + returns[rng.integers(0, len(returns), size=(n, len(returns)))], axis=1)
+    peak = np.maximum.accumulate(np.maximum(paths, 1.0), axis=1)
+    return paths[:, -1], np.max((peak - paths) / peak, axis=1)
+
+
+def monte_carlo(trades_summary, samples=1000, workers=None, seed=None,
+                initial_capital=INITIAL_CAPITAL, percentiles=(5, 50, 95),
+                batch_size=250, max_cells=20_000_000):
+    """
+    Bootstrap de la secuencia de trades: `samples` secuencias del mismo
+    número de trades, remuestreando con reemplazo sus rentabilidades
+    (trade_returns). Se generan en lotes de batch_size secuencias (menos si
+    superan max_cells rentabilidades, para acotar la memoria), cada uno con
+    su semilla derivada de `seed`, y los lotes se reparten entre workers: el
+    resultado con una misma semilla no depende del número de workers.
+
+    Devuelve un dict con los percentiles del capital final y del máximo
+    drawdown y la probabilidad de acabar en pérdidas.
+    """
+    returns = trade_returns(trades_summary, initial_capital)
+    if len(returns) == 0:
+        return {}
+
+    workers = workers or os.cpu_count() or 1
+    batch = max(1, min(batch_size, max_cells // len(returns)))
+    sizes = [min(batch, samples - start) for start in range(0, samples, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(returns, n, s) for n, s in zip(sizes, seeds)]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_bootstrap, tasks))
+    else:
+        parts = [_bootstrap(task) for task in tasks]
+
+    final = initial_capital * np.concatenate([p[0] for p in parts])
+    drawdown = np.concatenate([p[1] for p in parts])
+    summary = {'samples': samples, 'trades': len(returns),
+               'prob_loss': float(np.mean(final < initial_capital))}
+    for p in percentiles:
+        summary[f'final_capital_p{p}'] = float(np.percentile(final, p))
+    for p in percentiles:
+        summary[f'max_drawdown_p{p}'] = float(np.percentile(drawdown, p))
+    return summary